@@ -0,0 +1,69 @@
+"""
+Process-local caches for near-immutable configuration rows.
+
+Every gunicorn worker keeps the cached value in memory together with the
+version stamp it was loaded under. The stamp is the identity of a small file
+per cache, shared by all workers on the host (under CACHE_STAMP_DIR);
+invalidating a cache replaces that file, and each worker notices the new
+stamp with a single stat() call on its next read and reloads the value.
+"""
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """
+    Caches the result of loader() until invalidate() is called in any worker,
+    or for at most max_age seconds in case the stamp file cannot be written.
+    """
+
+    def __init__(self, name, loader, max_age=300):
+        self.name = name
+        self.loader = loader
+        self.max_age = max_age
+        self._entry = None  # (version, loaded_at, value)
+
+    def _stamp_path(self):
+        stamp_dir = getattr(settings, 'CACHE_STAMP_DIR', tempfile.gettempdir())
+        return os.path.join(stamp_dir, f'django_pos_{self.name}.stamp')
+
+    def _current_version(self):
+        try:
+            stat = os.stat(self._stamp_path())
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def get(self):
+        version = self._current_version()
+        now = time.monotonic()
+        entry = self._entry
+        if entry is not None and entry[0] == version and now - entry[1] < self.max_age:
+            return entry[2]
+
+        value = self.loader()
+        self._entry = (version, now, value)
+        return value
+
+    def invalidate(self):
+        """
+        Drop this worker's cached value and bump the shared stamp so every
+        other worker reloads it on its next read.
+        """
+        self._entry = None
+        path = self._stamp_path()
+        try:
+            # Replacing the file changes its inode, which is reliable even on
+            # filesystems with coarse modification times
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'w') as stamp:
+                stamp.write(str(time.time_ns()))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not update cache stamp {path}: {e}")
@@ -0,0 +1,31 @@
+"""
+Cached access to the Company configuration (name, tax ID, address, logo and
+IGTF percentage), invalidated across workers by the signals in core.signals.
+"""
+from decimal import Decimal
+
+from .cache import VersionedCache
+from .models import Company
+
+_company = VersionedCache('company', lambda: Company.objects.order_by('pk').first())
+
+
+def invalidate():
+    _company.invalidate()
+
+
+def get_company():
+    """
+    Return the configured Company, or None if it has not been set up yet.
+    """
+    return _company.get()
+
+
+def get_igtf_percentage():
+    company = get_company()
+    return company.igtf_percentage if company else Decimal(0)
+
+
+def get_logo_url():
+    company = get_company()
+    return company.logo.url if company and company.logo else ''
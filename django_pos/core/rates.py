@@ -0,0 +1,32 @@
+"""
+Process-local cache of the current exchange rate, invalidated across workers
+by the signals in core.signals.
+"""
+from .cache import VersionedCache
+from .models import ExchangeRate
+
+_latest_rate = VersionedCache('exchange_rate', lambda: ExchangeRate.objects.order_by('-date').first())
+
+
+def invalidate():
+    _latest_rate.invalidate()
+
+
+def get_latest_rate():
+    """
+    Return the most recent ExchangeRate, or None if none is configured.
+    """
+    return _latest_rate.get()
+
+
+def has_rate_for(date):
+    """
+    Whether an exchange rate has been registered for the given date.
+    """
+    latest_rate = get_latest_rate()
+    if latest_rate is None or latest_rate.date < date:
+        return False
+    if latest_rate.date == date:
+        return True
+    # Only reached when rates were registered ahead of time
+    return ExchangeRate.objects.filter(date=date).exists()
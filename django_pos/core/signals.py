@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import company, rates
+from .models import Company, ExchangeRate
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def invalidate_exchange_rate_cache(sender, **kwargs):
+    # Drop it right away for this worker and again once the change is
+    # visible to the others
+    rates.invalidate()
+    transaction.on_commit(rates.invalidate)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_cache(sender, **kwargs):
+    company.invalidate()
+    transaction.on_commit(company.invalidate)
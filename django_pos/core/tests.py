@@ -0,0 +1,76 @@
+import tempfile
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import company, rates
+from .models import Company, ExchangeRate
+
+
+class ExchangeRateCacheTestCase(TestCase):
+
+    def setUp(self):
+        override = override_settings(CACHE_STAMP_DIR=tempfile.mkdtemp())
+        override.enable()
+        self.addCleanup(override.disable)
+        rates.invalidate()
+
+    def test_latest_rate_is_served_from_memory(self):
+        rate = ExchangeRate.objects.create(date=timezone.now().date(), rate_usd_ves=Decimal('38.5'))
+        self.assertEqual(rates.get_latest_rate(), rate)
+
+        with CaptureQueriesContext(connection) as reads:
+            rates.get_latest_rate()
+            self.assertTrue(rates.has_rate_for(timezone.now().date()))
+        self.assertEqual(len(reads), 0)
+
+    def test_saving_a_rate_invalidates_the_cache(self):
+        today = timezone.now().date()
+        rate = ExchangeRate.objects.create(date=today, rate_usd_ves=Decimal('38.5'))
+        self.assertEqual(rates.get_latest_rate().rate_usd_ves, Decimal('38.5'))
+
+        rate.rate_usd_ves = Decimal('40.1')
+        rate.save()
+        self.assertEqual(rates.get_latest_rate().rate_usd_ves, Decimal('40.1'))
+
+        rate.delete()
+        self.assertIsNone(rates.get_latest_rate())
+        self.assertFalse(rates.has_rate_for(today))
+
+    def test_stamp_change_from_another_worker_is_picked_up(self):
+        ExchangeRate.objects.create(date=timezone.now().date(), rate_usd_ves=Decimal('38.5'))
+        rates.get_latest_rate()
+
+        # Simulate another worker writing a rate: the row changes without this
+        # process' signal handler running, only the shared stamp is bumped
+        ExchangeRate.objects.update(rate_usd_ves=Decimal('41.0'))
+        self.assertEqual(rates.get_latest_rate().rate_usd_ves, Decimal('38.5'))
+        saved_entry = rates._latest_rate._entry
+        rates.invalidate()
+        rates._latest_rate._entry = saved_entry
+        self.assertEqual(rates.get_latest_rate().rate_usd_ves, Decimal('41.0'))
+
+
+class CompanyCacheTestCase(TestCase):
+
+    def setUp(self):
+        override = override_settings(CACHE_STAMP_DIR=tempfile.mkdtemp())
+        override.enable()
+        self.addCleanup(override.disable)
+        company.invalidate()
+
+    def test_company_settings_are_cached_until_saved(self):
+        self.assertEqual(company.get_igtf_percentage(), Decimal(0))
+        settings_row = Company.objects.create(name='Bodega', tax_id='J-1234', address='Caracas', igtf_percentage=Decimal('3.00'))
+
+        self.assertEqual(company.get_company(), settings_row)
+        with CaptureQueriesContext(connection) as reads:
+            self.assertEqual(company.get_igtf_percentage(), Decimal('3.00'))
+            self.assertEqual(company.get_logo_url(), '')
+        self.assertEqual(len(reads), 0)
+
+        settings_row.igtf_percentage = Decimal('2.00')
+        settings_row.save()
+        self.assertEqual(company.get_igtf_percentage(), Decimal('2.00'))
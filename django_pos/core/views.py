@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from . import company as company_settings, rates
 from .models import PaymentMethod, Company, ExchangeRate
 from .forms import PaymentMethodForm, CompanyForm
 from django.utils import timezone
@@ -11,7 +12,7 @@ from django.db import IntegrityError
 @admin_required
 @login_required(login_url="/accounts/login/")
 def company_view(request):
-    company = Company.objects.first()
+    company = company_settings.get_company()
     context = {
         "active_icon": "company",
         "company": company,
@@ -45,7 +46,7 @@ def company_update_view(request):
 @login_required(login_url="/accounts/login/")
 def exchange_rate_modal_view(request):
     today = timezone.now().date()
-    exchange_rate_exists = ExchangeRate.objects.filter(date=today).exists()
+    exchange_rate_exists = rates.has_rate_for(today)
 
     if request.method == 'POST':
         rate = request.POST.get('rate_usd_ves')
@@ -82,12 +83,12 @@ def exchange_rate_list_view(request):
     return render(request, "core/exchange_rates.html", context=context)
 
 def get_latest_exchange_rate_api(request):
-    try:
-        latest_rate = ExchangeRate.objects.latest('date')
+    latest_rate = rates.get_latest_rate()
+    if latest_rate:
         data = {
             'rate_usd_ves': latest_rate.rate_usd_ves
         }
-    except ExchangeRate.DoesNotExist:
+    else:
         data = {
             'rate_usd_ves': 0 # Or some other default
         }
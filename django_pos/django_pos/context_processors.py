@@ -1,7 +1,7 @@
-from core.models import ExchangeRate
+from core import rates
 from django.utils import timezone
 
 def exchange_rate_context(request):
     today = timezone.now().date()
-    exchange_rate_exists = ExchangeRate.objects.filter(date=today).exists()
+    exchange_rate_exists = rates.has_rate_for(today)
     return {'exchange_rate_exists': exchange_rate_exists}
@@ -0,0 +1,109 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum, F, FloatField
+from django.db.models.functions import Coalesce
+from django.test import RequestFactory
+from django.utils import timezone
+
+from customers.models import Customer
+from products.models import Category, Product
+from sales.models import Sale, SaleDetail
+from sales.rollups import rebuild_rollups
+from pos.views import index, _monthly_earnings, _top_products
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_dashboard_stats(year):
+    """
+    The dashboard queries as they were before the grouped rewrite: one
+    aggregate per month, one for the year and an unbounded top-products scan.
+    """
+    monthly_earnings = []
+    for month in range(1, 13):
+        monthly_earnings.append(Sale.objects.filter(date_added__year=year, date_added__month=month).aggregate(
+            total_variable=Coalesce(Sum(F('grand_total')), 0.0, output_field=FloatField())).get('total_variable'))
+    Sale.objects.filter(date_added__year=year).aggregate(total_variable=Coalesce(
+        Sum(F('grand_total')), 0.0, output_field=FloatField())).get('total_variable')
+    list(Product.objects.annotate(quantity_sum=Sum('saledetail__quantity')).order_by('-quantity_sum')[:3])
+    return monthly_earnings
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway data set and report dashboard latency before and after the grouped "
+            "queries. Everything runs in a transaction that is rolled back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--details', type=int, default=1_000_000, help="Number of sale details to seed.")
+        parser.add_argument('--lines-per-sale', type=int, default=5)
+        parser.add_argument('--products', type=int, default=2_000)
+        parser.add_argument('--years', type=int, default=3, help="Spread the sales over this many years.")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._seed(options)
+                self._measure(options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Seeded data rolled back.")
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        rng = random.Random(42)
+        category = Category.objects.create(name='Benchmark', description='Benchmark', status='ACTIVE', prefix='BMK')
+        products = Product.objects.bulk_create([
+            Product(sku=f'BMK{i:06d}', name=f'Benchmark product {i}', description='', status='ACTIVE',
+                    category=category, price_usd=Decimal('1.00'), stock=0)
+            for i in range(options['products'])
+        ])
+        customer = Customer.objects.create(first_name='Benchmark')
+
+        now = timezone.now()
+        span = timedelta(days=365 * options['years']).total_seconds()
+        sales_count = options['details'] // options['lines_per_sale']
+        batch = 5_000
+        for offset in range(0, sales_count, batch):
+            sales = Sale.objects.bulk_create([
+                Sale(customer=customer, date_added=now - timedelta(seconds=rng.random() * span),
+                     sub_total=Decimal('5.00'), grand_total=Decimal('5.00'))
+                for _ in range(min(batch, sales_count - offset))
+            ])
+            SaleDetail.objects.bulk_create([
+                SaleDetail(sale=sale, product=rng.choice(products), price=Decimal('1.00'),
+                           quantity=1, total_detail=Decimal('1.00'))
+                for sale in sales for _ in range(options['lines_per_sale'])
+            ], batch_size=batch)
+            self.stdout.write(f"\rSeeded {offset + len(sales)}/{sales_count} sales", ending='')
+        self.stdout.write(f"\nSeeding took {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        rebuild_rollups(timezone.localdate() - timedelta(days=365 * options['years'] + 1), timezone.localdate())
+        self.stdout.write(f"Rebuilding daily rollups took {time.perf_counter() - started:.1f}s")
+
+    def _measure(self, repeat):
+        year = timezone.now().year
+        request = RequestFactory().get('/')
+        request.user = User(username='benchmark', is_superuser=True)
+
+        def best_of(label, func):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(f"{label:<28} best {min(timings) * 1000:9.1f} ms   "
+                              f"median {sorted(timings)[len(timings) // 2] * 1000:9.1f} ms")
+
+        best_of("before (per-month queries)", lambda: legacy_dashboard_stats(year))
+        best_of("after (daily rollups)", lambda: (_monthly_earnings(year), list(_top_products(year))))
+        best_of("dashboard view", lambda: index(request))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from pos.models import IdempotencyKey
+from pos.views import idempotency_cutoff
+
+
+class Command(BaseCommand):
+    help = "Delete stored idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS."
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=idempotency_cutoff()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired idempotency keys."))
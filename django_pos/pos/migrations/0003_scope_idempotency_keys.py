@@ -0,0 +1,49 @@
+# Generated by Django 4.1.5 on 2026-10-18 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def delete_unscoped_keys(apps, schema_editor):
+    # Keys stored so far have no user or scope to fill the new non-null columns
+    # with. They are only honoured for IDEMPOTENCY_KEY_TTL_HOURS anyway, so they
+    # are dropped rather than given a made-up owner; a retry of a submission
+    # made before the upgrade is then processed as a new one.
+    apps.get_model('pos', 'IdempotencyKey').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pos', '0002_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_unscoped_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='key',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='scope',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='fingerprint',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('user', 'scope', 'key'), name='pos_idempotency_key_unique'),
+        ),
+    ]
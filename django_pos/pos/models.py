@@ -19,4 +19,28 @@ class OrderDetail(models.Model):
     discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
 
     def __str__(self):
-        return f"{self.quantity} of {self.product.name} for Order #{self.order.id}"
\ No newline at end of file
+        return f"{self.quantity} of {self.product.name} for Order #{self.order.id}"
+
+class IdempotencyKey(models.Model):
+    """
+    Stores the response of a POS submission under the client-generated key so
+    that retries of the same submission are answered without reprocessing it.
+    Keys are scoped to the user and to what was submitted ('sale' or 'order'),
+    whichever endpoint it was sent to, and the fingerprint of the request body
+    tells a retry from a different submission reusing the key.
+    Rows older than IDEMPOTENCY_KEY_TTL_HOURS are ignored and purged.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    scope = models.CharField(max_length=20)
+    key = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='pos_idempotency_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} from {self.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
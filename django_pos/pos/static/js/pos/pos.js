@@ -10,6 +10,9 @@ const PosApp = {
         currentPayments: [],
         loadedOrderId: null,
         selectedPaymentMethod: null,
+        // {key, body} of the last sale/order submitted, for retries
+        pendingSale: null,
+        pendingOrder: null,
     },
 
     // --- DOM ELEMENTS ---
@@ -117,6 +120,13 @@ const PosApp = {
         });
 
         this.dom.searchInput.addEventListener('input', (e) => this.fetchProducts(e.target.value));
+        // Scanners type the whole code and press Enter
+        this.dom.searchInput.addEventListener('keydown', (e) => {
+            if (e.key === 'Enter') {
+                e.preventDefault();
+                this.scanProduct(e.target.value);
+            }
+        });
 
         if (this.dom.panelSwitcherBtn) {
             this.dom.panelSwitcherBtn.addEventListener('click', () => this.togglePanels());
@@ -192,6 +202,26 @@ const PosApp = {
     },
 
 
+    scanProduct: async function(code) {
+        code = code.trim();
+        if (!code) return;
+        try {
+            const url = JSON.parse(document.getElementById('product_lookup_api_url').textContent);
+            const response = await fetch(`${url}?code=${encodeURIComponent(code)}`);
+            if (!response.ok) return; // Not a code; the search results stay
+            const data = await response.json();
+            if (!this.state.products.some(p => p.id === data.product.id)) {
+                this.state.products.push(data.product);
+            }
+            this.addToCart(data.product.id);
+            this.dom.searchInput.value = '';
+            this.fetchProducts();
+        } catch (error) {
+            console.error('Error scanning product:', error);
+        }
+    },
+
+
     fetchCustomers: async function(search = '') {
         try {
             const url = JSON.parse(document.getElementById('get_customers_api_url').textContent);
@@ -258,17 +288,11 @@ const PosApp = {
             })),
         };
 
+        this.state.pendingOrder = this.submissionKey(this.state.pendingOrder, orderData);
+
         try {
             const url = JSON.parse(document.getElementById('save_order_url').textContent);
-            const response = await fetch(url, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': this.getCSRFToken(),
-                    'X-Requested-With': 'XMLHttpRequest',
-                },
-                body: JSON.stringify(orderData),
-            });
+            const response = await this.postWithRetry(url, orderData, this.state.pendingOrder.key);
 
             const data = await response.json();
 
@@ -831,16 +855,10 @@ const PosApp = {
             loaded_order_id: this.state.loadedOrderId,
         };
 
+        this.state.pendingSale = this.submissionKey(this.state.pendingSale, saleData);
+
         try {
-            const response = await fetch(window.location.pathname, { // Post to the same URL
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': this.getCSRFToken(),
-                    'X-Requested-With': 'XMLHttpRequest',
-                },
-                body: JSON.stringify(saleData),
-            });
+            const response = await this.postWithRetry(window.location.pathname, saleData, this.state.pendingSale.key); // Post to the same URL
 
             const data = await response.json();
 
@@ -877,6 +895,8 @@ const PosApp = {
         this.state.selectedCustomer = null;
         this.state.loadedOrderId = null;
         this.state.selectedPaymentMethod = null;
+        this.state.pendingSale = null;
+        this.state.pendingOrder = null;
         this.dom.customerBtnText.textContent = 'Customer';
         this.renderCart();
         this.renderPaymentLines();
@@ -897,6 +917,49 @@ const PosApp = {
     },
 
     // --- UTILS ---
+    generateIdempotencyKey: function() {
+        if (window.crypto && window.crypto.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        // crypto.randomUUID is only available in secure contexts
+        return Date.now().toString(36) + '-' + Math.random().toString(36).substring(2) + Math.random().toString(36).substring(2);
+    },
+
+    submissionKey: function(pending, payload) {
+        // Resubmitting the same cart keeps its key so retries are not
+        // duplicated; any change to the cart, payments or customer is a new
+        // submission and gets a new key
+        const body = JSON.stringify(payload);
+        if (pending && pending.body === body) {
+            return pending;
+        }
+        return {key: this.generateIdempotencyKey(), body: body};
+    },
+
+    postWithRetry: async function(url, payload, idempotencyKey, attempts = 4) {
+        // Network failures are retried with the same key; the server replays
+        // the stored response if the first attempt was already processed.
+        for (let attempt = 1; ; attempt++) {
+            try {
+                return await fetch(url, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': this.getCSRFToken(),
+                        'X-Requested-With': 'XMLHttpRequest',
+                        'X-Idempotency-Key': idempotencyKey,
+                    },
+                    body: JSON.stringify(payload),
+                });
+            } catch (error) {
+                if (attempt >= attempts) {
+                    throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 500 * attempt));
+            }
+        }
+    },
+
     getCookie: function(name) {
         let cookieValue = null;
         if (document.cookie && document.cookie !== '') {
@@ -1,15 +1,23 @@
+import threading
+import time
+from datetime import timedelta
 from decimal import Decimal
-from django.test import TestCase, RequestFactory
+from unittest import skipUnless
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.contrib.auth.models import User
 from django.utils import timezone
 
 from products.models import Product, Category, Supplier, InventoryMovement
+from products.stock import InsufficientStock
 from customers.models import Customer
-from sales.models import Sale, Payment
+from sales.models import Sale, Payment, CreditPayment
 from core.models import ExchangeRate, PaymentMethod
 
 # Import the function to be tested
-from .views import _process_sale_data
+from .views import _exchange_rates_for_dates, _process_sale_data, _monthly_earnings, _top_products
 
 class ProcessSaleTestCase(TestCase):
 
@@ -149,3 +157,385 @@ class ProcessSaleTestCase(TestCase):
         self.assertEqual(payment.amount, grand_total)
 
         self.assertTrue(InventoryMovement.objects.filter(product=self.product, movement_type='out').exists(), "InventoryMovement should be created")
+
+    def _build_cart_sale_data(self, products):
+        grand_total = sum((p.price_usd for p in products), Decimal('0'))
+        return {
+            'customer': self.customer.id,
+            'sub_total': str(grand_total),
+            'grand_total': str(grand_total),
+            'tax_amount': '0',
+            'tax_percentage': '0',
+            'amount_change': '0',
+            'total_ves': '0',
+            'igtf_amount': '0',
+            'is_credit': False,
+            'payments': [
+                {
+                    'payment_method_id': self.payment_method.id,
+                    'amount': str(grand_total),
+                    'reference': ''
+                }
+            ],
+            'products': [
+                {
+                    'id': p.id,
+                    'quantity': 1,
+                    'price': str(p.price_usd),
+                    'total_product': str(p.price_usd)
+                } for p in products
+            ]
+        }
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        """
+        Verify that committing a sale costs the same number of queries for a
+        single-line cart and for a 40-line cart.
+        """
+        products = [self.product] + [
+            Product.objects.create(
+                name=f'Bulk Product {i}',
+                description='A product for testing',
+                status='ACTIVE',
+                category=self.category,
+                supplier=self.supplier,
+                price_usd=Decimal('1.00'),
+                stock=5
+            ) for i in range(39)
+        ]
+        request = self.factory.post('/pos/')
+        request.user = self.user
+        # Warm the exchange rate cache so both measured sales take the same path
+        _process_sale_data(request, self._build_cart_sale_data(products))
+
+        with CaptureQueriesContext(connection) as small_cart:
+            _process_sale_data(request, self._build_cart_sale_data(products[:1]))
+        with CaptureQueriesContext(connection) as large_cart:
+            _process_sale_data(request, self._build_cart_sale_data(products))
+
+        self.assertEqual(len(large_cart), len(small_cart))
+        self.assertEqual(InventoryMovement.objects.filter(movement_type='out').count(), 81)
+        self.assertEqual(Product.objects.get(id=products[1].id).stock, 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+
+    def test_sale_exceeding_stock_is_rejected(self):
+        """
+        Verify that a sale that would drive stock below zero is rejected and
+        leaves no trace behind.
+        """
+        sale_data = self._build_cart_sale_data([self.product])
+        sale_data['products'][0]['quantity'] = 11
+        request = self.factory.post('/pos/')
+        request.user = self.user
+
+        with self.assertRaises(InsufficientStock):
+            _process_sale_data(request, sale_data)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(InventoryMovement.objects.exists())
+
+    def test_category_allowing_negative_stock_can_oversell(self):
+        """
+        Verify that categories flagged with allow_negative_stock accept sales
+        beyond the available stock.
+        """
+        self.category.allow_negative_stock = True
+        self.category.save()
+        sale_data = self._build_cart_sale_data([self.product])
+        sale_data['products'][0]['quantity'] = 12
+        request = self.factory.post('/pos/')
+        request.user = self.user
+
+        _process_sale_data(request, sale_data)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, -2)
+
+
+    def test_replayed_idempotency_key_does_not_duplicate_sale(self):
+        """
+        Verify that resubmitting a sale with the same idempotency key returns
+        the stored response without creating a second sale or deducting stock.
+        """
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        sale_data = self._build_cart_sale_data([self.product])
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest', 'HTTP_X_IDEMPOTENCY_KEY': 'register-1-sale-42'}
+
+        first = self.client.post(reverse('pos:pos'), sale_data, content_type='application/json', **headers)
+        with CaptureQueriesContext(connection) as replay:
+            second = self.client.post(reverse('pos:pos'), sale_data, content_type='application/json', **headers)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertFalse([q for q in replay.captured_queries if not q['sql'].startswith('SELECT')])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertEqual(InventoryMovement.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+
+
+    def test_idempotency_keys_are_scoped_and_fingerprinted(self):
+        """
+        Verify that a key used for an order does not answer a sale, and that
+        reusing a sale's key for a different cart is refused.
+        """
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest', 'HTTP_X_IDEMPOTENCY_KEY': 'register-1-cart-7'}
+        order = {'customer': self.customer.id,
+                 'products': [{'id': self.product.id, 'quantity': 1, 'price': '100.00'}]}
+        response = self.client.post(reverse('pos:save_order'), order, content_type='application/json', **headers)
+        self.assertEqual(response.json()['message'], 'Order saved successfully!')
+
+        sale_data = self._build_cart_sale_data([self.product])
+        response = self.client.post(reverse('pos:pos'), sale_data, content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Sale.objects.count(), 1)
+
+        sale_data['products'][0]['quantity'] = 2
+        response = self.client.post(reverse('pos:pos'), sale_data, content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+
+
+    def test_sale_key_is_honoured_across_endpoints(self):
+        """
+        Verify that a sale posted to the POS and retried through the offline
+        sync with the same key is not booked twice.
+        """
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        sale_data = self._build_cart_sale_data([self.product])
+        first = self.client.post(reverse('pos:pos'), sale_data, content_type='application/json',
+                                 HTTP_X_REQUESTED_WITH='XMLHttpRequest', HTTP_X_IDEMPOTENCY_KEY='register-1-sale-43')
+        self.assertEqual(first.status_code, 200)
+
+        retried = dict(sale_data, date_added=timezone.now().isoformat(), idempotency_key='register-1-sale-43')
+        response = self.client.post(reverse('pos:sync_sales'), {'sales': [retried]}, content_type='application/json',
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        result = response.json()['results'][0]
+        self.assertEqual((result['status'], result['message']), ('success', first.json()['message']))
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+
+
+    def test_sync_offline_sales_reports_per_sale_results(self):
+        """
+        Verify that a batch of offline sales is committed with its own dates and
+        exchange rates, that a failing sale does not abort the others and that
+        resyncing the same batch does not duplicate anything.
+        """
+        self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        yesterday = timezone.now() - timedelta(days=1)
+        old_rate = ExchangeRate.objects.create(date=timezone.localtime(yesterday).date(), rate_usd_ves=Decimal('37.0'))
+
+        valid = self._build_cart_sale_data([self.product])
+        valid.update({'date_added': yesterday.isoformat(), 'idempotency_key': 'offline-1'})
+        invalid = self._build_cart_sale_data([self.product])
+        invalid['products'][0]['id'] = 999999
+        invalid.update({'date_added': yesterday.isoformat(), 'idempotency_key': 'offline-2'})
+        batch = {'sales': [valid, invalid]}
+
+        for _ in range(2):
+            response = self.client.post(reverse('pos:sync_sales'), batch, content_type='application/json',
+                                        HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            results = response.json()['results']
+            self.assertEqual([r['status'] for r in results], ['success', 'error'])
+
+        sale = Sale.objects.get()
+        self.assertEqual(sale.exchange_rate, old_rate)
+        self.assertEqual(sale.date_added, yesterday)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+
+
+    def test_exchange_rates_for_dates_uses_one_query(self):
+        """
+        Verify that every date gets the rate in force that day, the latest one
+        registered on or before it, from a single query.
+        """
+        today = timezone.localdate()
+        ExchangeRate.objects.all().delete()
+        older = ExchangeRate.objects.create(date=today - timedelta(days=10), rate_usd_ves=Decimal('35.0'))
+        newer = ExchangeRate.objects.create(date=today - timedelta(days=3), rate_usd_ves=Decimal('36.0'))
+        dates = [today, today - timedelta(days=3), today - timedelta(days=5), today - timedelta(days=20)]
+
+        with CaptureQueriesContext(connection) as queries:
+            rates_by_date = _exchange_rates_for_dates(dates)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(rates_by_date, {dates[0]: newer, dates[1]: newer, dates[2]: older})
+
+
+    def test_editing_one_line_writes_only_the_delta(self):
+        """
+        Verify that editing a sale only touches the changed line, moves stock
+        by the difference and adjusts the customer's balance by the difference.
+        """
+        other = Product.objects.create(
+            name='Other Product',
+            description='A product for testing',
+            status='ACTIVE',
+            category=self.category,
+            supplier=self.supplier,
+            price_usd=Decimal('50.00'),
+            stock=10
+        )
+        request = self.factory.post('/pos/')
+        request.user = self.user
+        sale_data = self._build_cart_sale_data([self.product, other])
+        sale_data.update({'is_credit': True, 'payments': []})
+        _process_sale_data(request, sale_data)
+        sale = Sale.objects.get()
+
+        sale_data['products'][1].update({'quantity': 3, 'total_product': '150.00'})
+        sale_data.update({'sub_total': '250.00', 'grand_total': '250.00'})
+        with CaptureQueriesContext(connection) as edit:
+            _process_sale_data(request, sale_data, sale_id=sale.id)
+
+        writes = [q['sql'] for q in edit.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        # Sale, changed line, balance, movement, stock and the two rollup upserts
+        self.assertLessEqual(len(writes), 7)
+        self.assertFalse([sql for sql in writes if sql.startswith('DELETE')])
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+        self.assertEqual(other.stock, 7)
+        self.assertEqual(self.customer.outstanding_balance, Decimal('250.00'))
+        self.assertEqual(InventoryMovement.objects.filter(product=other, movement_type='out').count(), 2)
+
+
+    def test_editing_a_credit_sale_keeps_the_igtf_of_its_payments(self):
+        """
+        Verify that editing a partly paid credit sale keeps the IGTF collected
+        by its credit payments and works out the balance against it.
+        """
+        request = self.factory.post('/pos/')
+        request.user = self.user
+        sale_data = self._build_cart_sale_data([self.product])
+        sale_data.update({'is_credit': True, 'payments': []})
+        _process_sale_data(request, sale_data)
+        sale = Sale.objects.get()
+        CreditPayment.objects.create(sale=sale, amount_usd=Decimal('40.00'), amount_ves=Decimal('1540.00'),
+                                     igtf_amount=Decimal('1.20'), exchange_rate=self.exchange_rate,
+                                     payment_method=self.payment_method)
+        Sale.objects.filter(id=sale.id).update(amount_paid=Decimal('40.00'), igtf_amount=Decimal('1.20'),
+                                               status='partially_paid')
+
+        sale_data['products'][0].update({'quantity': 2, 'total_product': '200.00'})
+        sale_data.update({'sub_total': '200.00', 'grand_total': '200.00'})
+        _process_sale_data(request, sale_data, sale_id=sale.id)
+        sale.refresh_from_db()
+        self.assertEqual(sale.igtf_amount, Decimal('1.20'))
+        self.assertEqual(sale.get_balance(), Decimal('161.20'))
+        self.assertEqual(sale.status, 'partially_paid')
+
+        sale_data['products'][0].update({'quantity': 1, 'price': '38.80', 'total_product': '38.80'})
+        sale_data.update({'sub_total': '38.80', 'grand_total': '38.80'})
+        _process_sale_data(request, sale_data, sale_id=sale.id)
+        sale.refresh_from_db()
+        self.assertEqual(sale.igtf_amount, Decimal('1.20'))
+        self.assertEqual(sale.status, 'completed')
+
+
+    def test_dashboard_groups_earnings_by_month(self):
+        """
+        Verify that monthly earnings and top products come from the year's
+        sales only.
+        """
+        request = self.factory.post('/pos/')
+        request.user = self.user
+        _process_sale_data(request, self._build_cart_sale_data([self.product]))
+        Sale.objects.create(customer=self.customer, grand_total=Decimal('999.00'),
+                            date_added=timezone.now() - timedelta(days=800))
+
+        monthly_earnings = _monthly_earnings(timezone.now().year)
+        self.assertEqual(len(monthly_earnings), 12)
+        self.assertEqual(sum(monthly_earnings), 100.0)
+        self.assertEqual(monthly_earnings[timezone.localtime().month - 1], 100.0)
+        self.assertEqual([p['product__name'] for p in _top_products(timezone.now().year)], ['Test Product'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Row locking stress test requires PostgreSQL')
+class ConcurrentSaleStressTestCase(TransactionTestCase):
+    """
+    Several cashiers sell the same scarce products at the same time. The
+    harness reports sales/second and asserts that stock never goes negative.
+    """
+    THREADS = 8
+    SALES_PER_THREAD = 25
+    STOCK = 100
+
+    def setUp(self):
+        self.exchange_rate = ExchangeRate.objects.create(date=timezone.now().date(), rate_usd_ves=Decimal('38.5'))
+        self.payment_method = PaymentMethod.objects.create(name='Cash', is_foreign_currency=True)
+        self.category = Category.objects.create(name='Stress', description='Desc', status='ACTIVE', prefix='ST')
+        self.customer = Customer.objects.create(first_name='Stress', last_name='Customer')
+        self.products = [
+            Product.objects.create(
+                name=f'Stress Product {i}',
+                description='Contended product',
+                status='ACTIVE',
+                category=self.category,
+                price_usd=Decimal('1.00'),
+                stock=self.STOCK
+            ) for i in range(3)
+        ]
+        self.users = [User.objects.create_user(username=f'cashier{i}', password='password') for i in range(self.THREADS)]
+
+    def _sell(self, user, results):
+        factory = RequestFactory()
+        try:
+            for n in range(self.SALES_PER_THREAD):
+                # Alternate line order so lock acquisition order is exercised
+                cart = self.products if n % 2 else list(reversed(self.products))
+                sale_data = {
+                    'customer': self.customer.id,
+                    'sub_total': '3', 'grand_total': '3', 'tax_amount': '0', 'tax_percentage': '0',
+                    'amount_change': '0', 'total_ves': '0', 'igtf_amount': '0', 'is_credit': False,
+                    'payments': [{'payment_method_id': self.payment_method.id, 'amount': '3'}],
+                    'products': [
+                        {'id': p.id, 'quantity': 1, 'price': '1', 'total_product': '1'} for p in cart
+                    ],
+                }
+                request = factory.post('/pos/')
+                request.user = user
+                try:
+                    _process_sale_data(request, sale_data)
+                    results.append('ok')
+                except InsufficientStock:
+                    results.append('rejected')
+        finally:
+            connection.close()
+
+    def test_no_oversell_under_concurrency(self):
+        results = []
+        threads = [threading.Thread(target=self._sell, args=(user, results)) for user in self.users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        sold = results.count('ok')
+        print(f"\n{len(results)} sale attempts in {elapsed:.2f}s "
+              f"({len(results) / elapsed:.1f} sales/s, {sold} committed, {results.count('rejected')} rejected)")
+
+        self.assertEqual(len(results), self.THREADS * self.SALES_PER_THREAD)
+        self.assertEqual(sold, self.STOCK)
+        for product in Product.objects.filter(id__in=[p.id for p in self.products]):
+            self.assertEqual(product.stock, 0)
+        self.assertEqual(Sale.objects.count(), sold)
@@ -8,6 +8,8 @@ urlpatterns = [
     # Add sale (new or load draft)
     path('add/<int:sale_id>/', views.pos_view, name='pos_add_with_id'),
     path('add/', views.pos_view, name='pos'),
+    # Offline sales sync
+    path('sync/', views.sync_sales_view, name='sync_sales'),
     path('orders/save/', views.save_order_view, name='save_order'),
     path('orders/list/', views.order_list_view, name='order_list'),
     path('orders/<int:order_id>/delete/', views.delete_order_view, name='delete_order'),
@@ -1,61 +1,89 @@
+import hashlib
 import json
 import logging
+from datetime import timedelta
 from decimal import Decimal
+from django.conf import settings
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, FloatField, F, Count, DecimalField
-from django.db.models.functions import Coalesce
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, F, Count, DecimalField
+from django.db.models.functions import Coalesce, TruncMonth
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.views.decorators.http import require_POST
 
 from products.models import Product, Category, InventoryMovement
-from sales.models import Sale, SaleDetail, Payment
+from products.stock import reserve_stock
+from sales import receipts, rollups
+from sales.models import Sale, SaleDetail, Payment, CreditPayment, DailySalesRollup
 from customers.models import Customer
-from core.models import PaymentMethod, ExchangeRate, Company
+from core import company as company_settings, rates
+from core.models import PaymentMethod, ExchangeRate
 from authentication.decorators import role_required
-from .models import Order, OrderDetail
+from .models import Order, OrderDetail, IdempotencyKey
 
 logger = logging.getLogger(__name__)
 
+def _monthly_earnings(year):
+    """
+    Earnings of each month of the year, from a single grouped query over the
+    daily rollup totals.
+    """
+    monthly_totals = (DailySalesRollup.objects
+                      .filter(date__year=year, product__isnull=True)
+                      .annotate(month=TruncMonth('date'))
+                      .values('month')
+                      .annotate(total=Sum('total_usd'))
+                      .order_by())
+    monthly_earnings = [0.0] * 12
+    for row in monthly_totals:
+        monthly_earnings[row['month'].month - 1] += float(row['total'] or 0)
+    return monthly_earnings
+
+
+def _top_products(year, limit=3):
+    """
+    Best-selling products of the year by quantity, grouped over the year's
+    daily rollup rows.
+    """
+    return (DailySalesRollup.objects
+            .filter(date__year=year, product__isnull=False)
+            .values('product_id', 'product__name')
+            .annotate(quantity_sum=Sum('units'))
+            .order_by('-quantity_sum')[:limit])
+
+
 @role_required(allowed_roles=['admin', 'cashier'])
 @login_required(login_url="/accounts/login/")
 def index(request):
     today = timezone.now().date()
 
     year = today.year
-    monthly_earnings = []
-
-    # Calculate earnings per month
-    for month in range(1, 13):
-        earning = Sale.objects.filter(date_added__year=year, date_added__month=month).aggregate(
-            total_variable=Coalesce(Sum(F('grand_total')), 0.0, output_field=FloatField())).get('total_variable')
-        monthly_earnings.append(earning)
+    monthly_earnings = _monthly_earnings(year)
 
     # Calculate annual earnings
-    annual_earnings = Sale.objects.filter(date_added__year=year).aggregate(total_variable=Coalesce(
-        Sum(F('grand_total')), 0.0, output_field=FloatField())).get('total_variable')
-    annual_earnings = format(annual_earnings, '.2f')
+    annual_earnings = format(sum(monthly_earnings), '.2f')
 
     # AVG per month
     avg_month = format(sum(monthly_earnings)/12, '.2f')
 
     # Top-selling products
-    top_products = Product.objects.annotate(quantity_sum=Sum(
-        'saledetail__quantity')).order_by('-quantity_sum')[:3]
-
     top_products_names = []
     top_products_quantity = []
 
-    for p in top_products:
-        top_products_names.append(p.name)
-        top_products_quantity.append(p.quantity_sum)
+    for p in _top_products(year):
+        top_products_names.append(p['product__name'])
+        top_products_quantity.append(p['quantity_sum'])
 
     context = {
         "active_icon": "dashboard",
         "products": Product.objects.all().count(),
+        # Served by the partial index on is_low_stock
+        "low_stock_products": Product.objects.filter(is_low_stock=True).count(),
         "categories": Category.objects.all().count(),
         "annual_earnings": annual_earnings,
         "monthly_earnings": json.dumps(monthly_earnings),
@@ -71,10 +99,273 @@ def is_ajax(request):
     return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
 
 
-def _process_sale_data(request, data, sale_id=None):
+def idempotency_cutoff():
+    """
+    Oldest creation time for which a stored idempotency key is still honoured.
+    """
+    ttl_hours = getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24)
+    return timezone.now() - timedelta(hours=ttl_hours)
+
+
+def _get_idempotency_key(request, data):
+    key = request.headers.get('X-Idempotency-Key') or data.get('idempotency_key')
+    return str(key)[:64] if key else None
+
+
+class IdempotencyConflict(Exception):
+    pass
+
+
+# Fields that say how a submission was sent rather than what it contains: an
+# offline sale replayed through sync_sales_view carries its capture date
+UNFINGERPRINTED_FIELDS = {'idempotency_key', 'date_added', 'exchange_rate_date'}
+
+
+def _fingerprint(data):
+    """
+    Hash of a submission's body, without the key it was sent under.
+    """
+    body = {field: value for field, value in data.items() if field not in UNFINGERPRINTED_FIELDS}
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        raise IdempotencyConflict(
+            f"Idempotency key {stored.key} was already used for a different submission.")
+    logger.info(f"Replaying stored response for idempotency key {stored.key}")
+    return stored.response
+
+
+def _run_idempotent(request, scope, key, data, handler):
+    """
+    Run handler() and store its JSON payload under the idempotency key, scoped
+    to the user and to what is being submitted ('sale' or 'order'), with the
+    fingerprint of data. pos_view and sync_sales_view share the 'sale' scope,
+    so a sale whose response was lost can be retried through either of them.
+    If the key was already used for the same data, the stored payload is
+    returned and handler is not called, so a retried submission never creates
+    a second sale; if it was used for different data, IdempotencyConflict is
+    raised. Only successful payloads are stored; failed submissions can be
+    retried.
+    """
+    if not key:
+        return handler()
+
+    scope = {'user': request.user, 'scope': scope, 'key': key}
+    fingerprint = _fingerprint(data)
+    cutoff = idempotency_cutoff()
+    stored = IdempotencyKey.objects.filter(**scope, created_at__gte=cutoff).first()
+    if stored:
+        return _replay(stored, fingerprint)
+
+    try:
+        with transaction.atomic():
+            payload = handler()
+            IdempotencyKey.objects.filter(**scope, created_at__lt=cutoff).delete()
+            IdempotencyKey.objects.create(**scope, fingerprint=fingerprint, response=payload)
+    except IntegrityError:
+        # A concurrent request with the same key committed first
+        stored = IdempotencyKey.objects.filter(**scope).first()
+        if stored is None:
+            raise
+        return _replay(stored, fingerprint)
+    return payload
+
+
+def _load_products(products):
+    """
+    Fetch every product referenced by the cart in a single query.
+    Raises Product.DoesNotExist if any of them is missing.
+    """
+    try:
+        product_ids = {int(product_data["id"]) for product_data in products}
+    except ValueError as e:
+        logger.error(f"Error reading product IDs: {e}")
+        raise
+    products_by_id = Product.objects.in_bulk(product_ids)
+    missing = product_ids - products_by_id.keys()
+    if missing:
+        logger.error(f"Products not found: {sorted(missing)}")
+        raise Product.DoesNotExist(f"Product matching query does not exist: {sorted(missing)}")
+    return products_by_id
+
+
+def _load_payment_methods(payments):
+    """
+    Fetch every payment method referenced by the payments in a single query.
+    Raises PaymentMethod.DoesNotExist if any of them is missing.
+    """
+    try:
+        method_ids = {int(payment_data["payment_method_id"]) for payment_data in payments}
+    except ValueError as e:
+        logger.error(f"Error reading payment method IDs: {e}")
+        raise
+    methods_by_id = PaymentMethod.objects.in_bulk(method_ids)
+    missing = method_ids - methods_by_id.keys()
+    if missing:
+        logger.error(f"Payment methods not found: {sorted(missing)}")
+        raise PaymentMethod.DoesNotExist(f"PaymentMethod matching query does not exist: {sorted(missing)}")
+    return methods_by_id
+
+
+def _delete_loaded_order(data):
+    """
+    If the sale was created from a saved order, delete the order.
+    """
+    loaded_order_id = data.get('loaded_order_id')
+    if loaded_order_id:
+        logger.info(f"Deleting order ID: {loaded_order_id}")
+        deleted_count = Order.objects.filter(id=int(loaded_order_id)).delete()[0]
+        if not deleted_count:
+            # This case is not critical, so we can just log it or ignore it
+            logger.warning(f"Warning: Tried to delete order ID {loaded_order_id} after sale, but it was not found.")
+
+
+def _apply_sale_edit(request, sale_id, sale_attributes, products, payments, products_by_id, payment_methods_by_id):
+    """
+    Update a stored sale by writing only the difference with the submitted one.
+
+    Submitted lines are matched to stored details of the same product in order
+    of appearance; matched details are updated only if they changed, the rest
+    are created or deleted. Payments are matched on (method, amount, reference).
+    Stock, inventory movements and the customers' outstanding balance are
+    adjusted by the delta alone, so an edited sale never deducts stock twice.
+    """
+    current_sale = Sale.objects.select_for_update().get(id=sale_id)
+    old_customer_id = current_sale.customer_id
+    old_credit = current_sale.grand_total if current_sale.is_credit else Decimal(0)
+
+    stored_details = {}
+    old_lines = []
+    for detail in SaleDetail.objects.filter(sale=current_sale).order_by('id'):
+        stored_details.setdefault(detail.product_id, []).append(detail)
+        old_lines.append((detail.product_id, detail.quantity, detail.total_detail))
+
+    details_to_create = []
+    details_to_update = []
+    stock_delta = {}
+    for product_data in products:
+        product_id = int(product_data["id"])
+        price = Decimal(product_data["price"])
+        quantity = int(product_data["quantity"])
+        total_detail = Decimal(product_data["total_product"])
+        stock_delta[product_id] = stock_delta.get(product_id, 0) + quantity
+
+        if stored_details.get(product_id):
+            detail = stored_details[product_id].pop(0)
+            stock_delta[product_id] -= detail.quantity
+            if (detail.price, detail.quantity, detail.total_detail) != (price, quantity, total_detail):
+                detail.price, detail.quantity, detail.total_detail = price, quantity, total_detail
+                details_to_update.append(detail)
+        else:
+            details_to_create.append(SaleDetail(
+                sale=current_sale,
+                product=products_by_id[product_id],
+                price=price,
+                quantity=quantity,
+                total_detail=total_detail
+            ))
+
+    details_to_delete = [detail for leftovers in stored_details.values() for detail in leftovers]
+    for detail in details_to_delete:
+        stock_delta[detail.product_id] = stock_delta.get(detail.product_id, 0) - detail.quantity
+    stock_delta = {product_id: delta for product_id, delta in stock_delta.items() if delta}
+
+    stored_payments = list(Payment.objects.filter(sale=current_sale))
+    payments_to_create = []
+    for payment_data in payments:
+        key = (int(payment_data["payment_method_id"]), Decimal(payment_data["amount"]), payment_data.get("reference") or "")
+        match = next((p for p in stored_payments if (p.payment_method_id, p.amount, p.reference or "") == key), None)
+        if match:
+            stored_payments.remove(match)
+        else:
+            payments_to_create.append(Payment(
+                sale=current_sale,
+                payment_method=payment_methods_by_id[key[0]],
+                amount=key[1],
+                reference=key[2]
+            ))
+
+    # Sale.igtf_amount also holds the IGTF collected by its credit payments,
+    # which the submitted cart knows nothing about
+    submitted_igtf = sale_attributes["igtf_amount"]
+    credit_igtf = CreditPayment.objects.filter(sale=current_sale).aggregate(igtf=Sum('igtf_amount'))['igtf'] or 0
+    sale_attributes["igtf_amount"] = submitted_igtf + credit_igtf
+    # The rollup counted that IGTF on the days it was collected, not on the
+    # sale's, so it stays out of the sale's contribution on both sides
+    current_sale.igtf_amount -= credit_igtf
+
+    # Credit sales that already received payments keep their payment progress
+    if sale_attributes["is_credit"] and current_sale.amount_paid > 0:
+        balance = sale_attributes["grand_total"] + sale_attributes["igtf_amount"] - current_sale.amount_paid
+        sale_attributes["status"] = 'partially_paid' if balance > 0 else 'completed'
+
+    logger.info(f"Sale {sale_id} delta: {len(details_to_create)} new, {len(details_to_update)} changed, "
+                f"{len(details_to_delete)} removed lines; {len(payments_to_create)} new, "
+                f"{len(stored_payments)} removed payments; stock delta {stock_delta}")
+
+    Sale.objects.filter(id=sale_id).update(**sale_attributes)
+    if details_to_delete:
+        SaleDetail.objects.filter(id__in=[detail.id for detail in details_to_delete]).delete()
+    if details_to_update:
+        SaleDetail.objects.bulk_update(details_to_update, ['price', 'quantity', 'total_detail'])
+    if details_to_create:
+        SaleDetail.objects.bulk_create(details_to_create)
+    if stored_payments:
+        Payment.objects.filter(id__in=[payment.id for payment in stored_payments]).delete()
+    if payments_to_create:
+        Payment.objects.bulk_create(payments_to_create)
+
+    # Move the sale's credit between balances by the difference only
+    new_customer_id = sale_attributes["customer"].id
+    new_credit = sale_attributes["grand_total"] if sale_attributes["is_credit"] else Decimal(0)
+    if old_customer_id == new_customer_id:
+        if new_credit != old_credit:
+            Customer.objects.filter(id=new_customer_id).update(
+                outstanding_balance=F('outstanding_balance') + (new_credit - old_credit))
+    else:
+        if old_credit:
+            Customer.objects.filter(id=old_customer_id).update(
+                outstanding_balance=F('outstanding_balance') - old_credit)
+        if new_credit:
+            Customer.objects.filter(id=new_customer_id).update(
+                outstanding_balance=F('outstanding_balance') + new_credit)
+
+    if stock_delta:
+        InventoryMovement.objects.bulk_create([
+            InventoryMovement(
+                product_id=product_id,
+                movement_type='out' if delta > 0 else 'in',
+                quantity=abs(delta),
+                user=request.user,
+                reason=f'Sale {sale_id} edit'
+            )
+            for product_id, delta in stock_delta.items()
+        ])
+        # Positive deltas are validated against available stock, negative ones are returned
+        reserve_stock(stock_delta)
+
+    updated_sale = Sale(id=current_sale.id, **{'date_added': current_sale.date_added, **sale_attributes,
+                                               'igtf_amount': submitted_igtf})
+    rollups.apply_deltas(rollups.sale_deltas(
+        updated_sale,
+        [(int(p["id"]), p["quantity"], p["total_product"]) for p in products],
+        deltas=rollups.sale_deltas(current_sale, old_lines, sign=-1)
+    ))
+
+    return 'Sale updated successfully!'
+
+
+def _process_sale_data(request, data, sale_id=None, exchange_rate=None, date_added=None):
     """
     Helper function to process the business logic of creating or updating a sale.
     This function is designed to be called from within the main pos_view.
+
+    Every product and payment method referenced by the cart is loaded with a
+    single IN query, details, payments and inventory movements are written with
+    bulk_create and stock is deducted with one set-based UPDATE, so the number
+    of queries does not grow with the size of the cart.
     """
     logger.info(f"Processing sale data for user {request.user}. Sale ID: {sale_id}")
     logger.info(f"Data received: {data}")
@@ -87,12 +378,12 @@ def _process_sale_data(request, data, sale_id=None):
         logger.error(f"Error getting customer: {e}")
         raise
 
-    try:
+    if exchange_rate is None:
         logger.info("Getting latest exchange rate")
-        exchange_rate = ExchangeRate.objects.latest('date')
-    except ExchangeRate.DoesNotExist as e:
-        logger.error(f"No exchange rate found: {e}")
-        raise
+        exchange_rate = rates.get_latest_rate()
+        if exchange_rate is None:
+            logger.error("No exchange rate found")
+            raise ExchangeRate.DoesNotExist("ExchangeRate matching query does not exist.")
 
     sale_attributes = {
         "customer": customer,
@@ -107,6 +398,8 @@ def _process_sale_data(request, data, sale_id=None):
         "is_credit": data.get("is_credit", False),
         "exchange_rate": exchange_rate,
     }
+    if date_added is not None:
+        sale_attributes["date_added"] = date_added
 
     # Determine sale status
     action_type = data.get("action_type", "finalize")
@@ -115,95 +408,87 @@ def _process_sale_data(request, data, sale_id=None):
     else:
         sale_attributes["status"] = 'completed'
 
+    products = data["products"]
+    payments = data.get("payments", []) if not sale_attributes["is_credit"] else []
+    products_by_id = _load_products(products)
+    payment_methods_by_id = _load_payment_methods(payments)
+
     if sale_id:
         logger.info(f"Updating existing sale ID: {sale_id}")
-        # Note: Updating customer balance for edited credit sales is not handled here.
-        # This would require a more complex logic to calculate the difference.
-        Sale.objects.filter(id=sale_id).update(**sale_attributes)
-        current_sale = Sale.objects.get(id=sale_id)
-        SaleDetail.objects.filter(sale=current_sale).delete()  # Clear old details
-        Payment.objects.filter(sale=current_sale).delete() # Clear old payments
-        message = 'Sale updated successfully!'
-    else:
+        with transaction.atomic():
+            message = _apply_sale_edit(request, sale_id, sale_attributes, products, payments,
+                                       products_by_id, payment_methods_by_id)
+            _delete_loaded_order(data)
+            receipts.prerender_on_commit(sale_id)
+        logger.info(f"Sale processing completed successfully: {message}")
+        return message
+
+    with transaction.atomic():
         logger.info("Creating new sale")
         current_sale = Sale.objects.create(**sale_attributes)
         # Update customer outstanding balance on new credit sale
         if current_sale.is_credit:
-            customer = current_sale.customer
-            customer.outstanding_balance = F('outstanding_balance') + current_sale.grand_total
-            customer.save()
+            Customer.objects.filter(id=customer.id).update(
+                outstanding_balance=F('outstanding_balance') + current_sale.grand_total)
         message = 'Sale created successfully!'
 
-    # Create Payment objects
-    if not sale_attributes["is_credit"]:
-        payments = data.get("payments", [])
+        # Create Payment objects
         logger.info(f"Processing {len(payments)} payments")
-        for payment_data in payments:
-            try:
-                payment_method_id = int(payment_data["payment_method_id"])
-                logger.info(f"Creating payment with method ID: {payment_method_id}")
-                Payment.objects.create(
-                    sale=current_sale,
-                    payment_method=PaymentMethod.objects.get(id=payment_method_id),
-                    amount=Decimal(payment_data["amount"]),
-                    reference=payment_data.get("reference", "")
-                )
-            except (ValueError, PaymentMethod.DoesNotExist) as e:
-                logger.error(f"Error creating payment: {e}")
-                raise
-
-    products = data["products"]
-    logger.info(f"Processing {len(products)} products")
-    for product_data in products:
-        try:
-            product_id = int(product_data["id"])
-            logger.info(f"Creating sale detail for product ID: {product_id}")
-            detail_attributes = {
-                "sale": current_sale,
-                "product": Product.objects.get(id=product_id),
-                "price": Decimal(product_data["price"]),
-                "quantity": product_data["quantity"],
-                "total_detail": Decimal(product_data["total_product"])
-            }
-            SaleDetail.objects.create(**detail_attributes)
-        except (ValueError, Product.DoesNotExist) as e:
-            logger.error(f"Error creating sale detail: {e}")
-            raise
-
-    # Stock deduction and InventoryMovement for completed or credit sales
-    if current_sale.status in ['completed', 'pending_credit']:
-        logger.info("Updating stock and creating inventory movements")
-        for product_data in products:
-            try:
+        Payment.objects.bulk_create([
+            Payment(
+                sale=current_sale,
+                payment_method=payment_methods_by_id[int(payment_data["payment_method_id"])],
+                amount=Decimal(payment_data["amount"]),
+                reference=payment_data.get("reference", "")
+            )
+            for payment_data in payments
+        ])
+
+        logger.info(f"Processing {len(products)} products")
+        SaleDetail.objects.bulk_create([
+            SaleDetail(
+                sale=current_sale,
+                product=products_by_id[int(product_data["id"])],
+                price=Decimal(product_data["price"]),
+                quantity=int(product_data["quantity"]),
+                total_detail=Decimal(product_data["total_product"])
+            )
+            for product_data in products
+        ])
+
+        # Stock deduction and InventoryMovement for completed or credit sales
+        quantities = {}
+        if current_sale.status in ['completed', 'pending_credit']:
+            logger.info("Creating inventory movements")
+            for product_data in products:
                 product_id = int(product_data["id"])
-                product_obj = Product.objects.get(id=product_id)
-                quantity = product_data["quantity"]
-                logger.info(f"Updating stock for product {product_id}: subtracting {quantity}")
-                product_obj.stock = F('stock') - quantity
-                product_obj.save()
-
-                InventoryMovement.objects.create(
-                    product=product_obj,
+                quantities[product_id] = quantities.get(product_id, 0) + int(product_data["quantity"])
+
+            InventoryMovement.objects.bulk_create([
+                InventoryMovement(
+                    product=products_by_id[product_id],
                     movement_type='out',
                     quantity=quantity,
                     user=request.user,
                     reason=f'Sale {current_sale.id}'
                 )
-            except (ValueError, Product.DoesNotExist) as e:
-                logger.error(f"Error updating stock: {e}")
-                raise
-        message = 'Sale finalized and stock updated successfully!'
+                for product_id, quantity in quantities.items()
+            ])
+            message = 'Sale finalized and stock updated successfully!'
 
-    # If the sale was created from a saved order, delete the order
-    loaded_order_id = data.get('loaded_order_id')
-    if loaded_order_id:
-        try:
-            logger.info(f"Deleting order ID: {loaded_order_id}")
-            Order.objects.get(id=int(loaded_order_id)).delete()
-        except Order.DoesNotExist:
-            # This case is not critical, so we can just log it or ignore it
-            logger.warning(f"Warning: Tried to delete order ID {loaded_order_id} after sale, but it was not found.")
-            pass
+        _delete_loaded_order(data)
+
+        # Reserve stock and update the rollup last so their rows stay locked
+        # as briefly as possible
+        if quantities:
+            logger.info("Reserving stock")
+            reserve_stock(quantities)
+        rollups.apply_deltas(rollups.sale_deltas(
+            current_sale,
+            [(int(p["id"]), p["quantity"], p["total_product"]) for p in products]
+        ))
+
+        receipts.prerender_on_commit(current_sale.id)
 
     logger.info(f"Sale processing completed successfully: {message}")
     return message
@@ -235,22 +520,14 @@ def pos_view(request, sale_id=None):
             messages.error(request, 'Sale not found!', extra_tags="danger")
             return redirect('pos:pos')  # Redirect to new sale if not found
 
-    # Fetch IGTF percentage from Company model
-    igtf_percentage = 0.00
-    try:
-        company = Company.objects.first() # Assuming there's only one company or you want the first one
-        if company:
-            igtf_percentage = float(company.igtf_percentage)
-    except Company.DoesNotExist:
-        pass # Handle case where no company is configured
+    # Fetch IGTF percentage from the cached Company settings
+    igtf_percentage = float(company_settings.get_igtf_percentage())
 
     # Fetch latest exchange rate
     exchange_rate = 0
-    try:
-        latest_rate = ExchangeRate.objects.latest('date')
+    latest_rate = rates.get_latest_rate()
+    if latest_rate:
         exchange_rate = latest_rate.rate_usd_ves
-    except ExchangeRate.DoesNotExist:
-        pass # Handle case where no exchange rate is configured
 
     context = {
         "active_icon": "pos",
@@ -258,6 +535,7 @@ def pos_view(request, sale_id=None):
         "sale_details_json": sale_details_json,
         "igtf_percentage": igtf_percentage, # Pass IGTF percentage to context
         "product_list_api_url": reverse('products:product_list_api'),
+        "product_lookup_api_url": reverse('products:product_lookup_api'),
         "categories_list_api_url": reverse('products:category_list_api'),
         "get_customers_api_url": reverse('customers:get_customers_api'),
         "create_customer_api_url": reverse('customers:create_customer_api'),
@@ -272,8 +550,13 @@ def pos_view(request, sale_id=None):
         if is_ajax(request=request):
             try:
                 data = json.load(request)
-                message = _process_sale_data(request, data, sale_id)
-                return JsonResponse({'status': 'success', 'message': message})
+                payload = _run_idempotent(
+                    request, 'sale', _get_idempotency_key(request, data), data,
+                    lambda: {'status': 'success', 'message': _process_sale_data(request, data, sale_id)}
+                )
+                return JsonResponse(payload)
+            except IdempotencyConflict as e:
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=422)
             except Exception as e:
                 return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
@@ -282,6 +565,99 @@ def pos_view(request, sale_id=None):
     return render(request, "pos/pos.html", context=context)
 
 
+def _exchange_rates_for_dates(dates):
+    """
+    Map each date to the exchange rate in force on that day: the rate
+    registered for the date itself or, failing that, the latest earlier one.
+    """
+    pending = sorted(set(dates), reverse=True)
+    rates_by_date = {}
+    if not pending:
+        return rates_by_date
+    # One query, newest first, read only as far back as the earliest date needs
+    for rate in ExchangeRate.objects.filter(date__lte=pending[0]).order_by('-date').iterator(chunk_size=100):
+        while pending and pending[0] >= rate.date:
+            rates_by_date[pending.pop(0)] = rate
+        if not pending:
+            break
+    return rates_by_date
+
+
+def _parse_offline_sale(sale_data):
+    """
+    Return (date_added, exchange_rate_date) for a sale captured offline.
+    """
+    date_added = parse_datetime(str(sale_data.get('date_added', '')))
+    if date_added is None:
+        raise ValueError(f"Invalid or missing date_added: {sale_data.get('date_added')!r}")
+    if timezone.is_naive(date_added):
+        date_added = timezone.make_aware(date_added)
+
+    rate_date = sale_data.get('exchange_rate_date')
+    exchange_rate_date = parse_date(str(rate_date)) if rate_date else timezone.localtime(date_added).date()
+    if exchange_rate_date is None:
+        raise ValueError(f"Invalid exchange_rate_date: {rate_date!r}")
+    return date_added, exchange_rate_date
+
+
+@role_required(allowed_roles=['admin', 'cashier'])
+@login_required(login_url="/accounts/login/")
+@require_POST
+def sync_sales_view(request):
+    """
+    Receives an ordered batch of sales captured while the register was offline.
+    Each sale carries its own date_added, exchange_rate_date and idempotency_key.
+    Sales are committed in chunks of SALE_SYNC_CHUNK_SIZE, one transaction per
+    chunk, and the response lists the outcome of every sale in input order.
+    A failing sale is rolled back on its own without aborting the chunk.
+    """
+    if not is_ajax(request):
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+    try:
+        sales = json.load(request).get('sales', [])
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    parsed = []
+    for sale_data in sales:
+        try:
+            parsed.append(_parse_offline_sale(sale_data))
+        except ValueError as e:
+            parsed.append(e)
+    sale_rates = _exchange_rates_for_dates([p[1] for p in parsed if not isinstance(p, Exception)])
+
+    chunk_size = getattr(settings, 'SALE_SYNC_CHUNK_SIZE', 50)
+    results = []
+    for start in range(0, len(sales), chunk_size):
+        with transaction.atomic():
+            for index in range(start, min(start + chunk_size, len(sales))):
+                sale_data = sales[index]
+                result = {'index': index, 'idempotency_key': sale_data.get('idempotency_key')}
+                try:
+                    if isinstance(parsed[index], Exception):
+                        raise parsed[index]
+                    date_added, exchange_rate_date = parsed[index]
+                    exchange_rate = sale_rates.get(exchange_rate_date)
+                    if exchange_rate is None:
+                        raise ExchangeRate.DoesNotExist(f"No exchange rate on or before {exchange_rate_date}")
+
+                    # _process_sale_data runs in its own savepoint, so a failure only
+                    # rolls back this sale
+                    key = sale_data.get('idempotency_key')
+                    result.update(_run_idempotent(
+                        request, 'sale', str(key)[:64] if key else None, sale_data,
+                        lambda: {'status': 'success', 'message': _process_sale_data(
+                            request, sale_data, exchange_rate=exchange_rate, date_added=date_added)}
+                    ))
+                except Exception as e:
+                    logger.error(f"Error syncing offline sale {index}: {e}")
+                    result.update({'status': 'error', 'message': str(e)})
+                results.append(result)
+
+    return JsonResponse({'status': 'success', 'results': results})
+
+
 @login_required
 @require_POST
 def save_order_view(request):
@@ -298,24 +674,28 @@ def save_order_view(request):
 
         customer = Customer.objects.get(id=customer_id) if customer_id else None
 
-        # Create the main Order
-        new_order = Order.objects.create(
-            user=request.user,
-            customer=customer
-        )
-
-        # Create the OrderDetail items
-        for product_data in cart_products:
-            OrderDetail.objects.create(
-                order=new_order,
-                product=Product.objects.get(id=int(product_data["id"])),
-                quantity=int(product_data["quantity"]),
-                price_usd=Decimal(product_data["price"]),
-                discount_percent=Decimal(product_data.get("discount_percent", 0))
+        def create_order():
+            # Create the main Order
+            new_order = Order.objects.create(
+                user=request.user,
+                customer=customer
             )
-        
-        return JsonResponse({'status': 'success', 'message': 'Order saved successfully!'})
 
+            # Create the OrderDetail items
+            for product_data in cart_products:
+                OrderDetail.objects.create(
+                    order=new_order,
+                    product=Product.objects.get(id=int(product_data["id"])),
+                    quantity=int(product_data["quantity"]),
+                    price_usd=Decimal(product_data["price"]),
+                    discount_percent=Decimal(product_data.get("discount_percent", 0))
+                )
+            return {'status': 'success', 'message': 'Order saved successfully!'}
+
+        return JsonResponse(_run_idempotent(request, 'order', _get_idempotency_key(request, data), data, create_order))
+
+    except IdempotencyConflict as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=422)
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
@@ -1,19 +1,20 @@
-from django_pos.wsgi import *
-from django_pos import settings
-from django.template.loader import get_template
-from weasyprint import HTML, CSS
+"""
+Render the PDF receipt of a sale from the command line:
+
+    python print_receipt.py <sale id> [receipt.pdf]
+"""
+import sys
 
+from django_pos.wsgi import *
+from sales.models import Sale
+from sales.rendering import render_receipt
 
-def print_receipt():
-    template = get_template("sales/receipt_pdf.html")
-    context = {"name": "Jorge"}
-    html_template = template.render(context)
 
-    # CSS Boostrap
-    css_url = os.path.join(
-        settings.BASE_DIR, 'static/css/receipt_pdf/bootstrap.min.css')
+def print_receipt(sale_id, target="receipt.pdf"):
+    sale = Sale.objects.select_related('customer').get(id=sale_id)
+    with open(target, 'wb') as pdf:
+        pdf.write(render_receipt(sale))
 
-    # Create the pdf
-    HTML(string=html_template).write_pdf(
-        target="receipt.pdf", stylesheets=[CSS(css_url)])
 
+if __name__ == '__main__':
+    print_receipt(int(sys.argv[1]), *sys.argv[2:3])
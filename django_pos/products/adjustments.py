@@ -0,0 +1,224 @@
+"""
+Bulk stock adjustments.
+
+A CSV or XLSX file holds one adjustment per row: SKU, quantity (signed) and
+an optional reason. The rows are read as a stream and applied in chunks:
+the chunk's SKUs are resolved and locked with one query, its movements are
+written with one bulk_create() and the stock moves with one set-based
+UPDATE. As with reserve_stock(), no product may end below zero unless its
+category allows negative stock; this is checked on the net change of each
+product over the whole file, however its rows fall into chunks.
+
+On PostgreSQL the rows are instead COPYed into a temporary staging table
+and applied with a handful of set-based statements.
+
+Everything runs in one transaction. If any row fails, or on a dry run, it
+is rolled back; the report lists the stock change of every product and the
+rows that failed either way.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Product, Category, InventoryMovement
+
+CHUNK_SIZE = 1000
+DEFAULT_REASON = 'Stock import'
+REASON_LENGTH = InventoryMovement._meta.get_field('reason').max_length
+
+
+def read_rows(file, name):
+    """
+    Yield (line, cells) from a binary file; name tells CSV from XLSX. The
+    CSV delimiter (comma, semicolon or tab) is sniffed from the first lines.
+    """
+    if name.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(file, read_only=True, data_only=True).active
+        yield from enumerate(sheet.iter_rows(values_only=True), 1)
+        return
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        dialect = csv.Sniffer().sniff(text.read(4096), delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    text.seek(0)
+    yield from enumerate(csv.reader(text, dialect), 1)
+
+
+def _quantity(value):
+    try:
+        quantity = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+    if quantity != quantity.to_integral_value():
+        return None
+    return int(quantity)
+
+
+def parse_adjustments(rows, errors, reason=DEFAULT_REASON):
+    """
+    Yield (line, sku, quantity, reason) from read_rows(), skipping blank
+    rows and a header, and append (line, message) to errors for rows that
+    cannot be read.
+    """
+    for line, cells in rows:
+        cells = ['' if cell is None else str(cell).strip() for cell in cells][:3]
+        if not any(cells):
+            continue
+        sku, quantity, row_reason = (cells + ['', ''])[:3]
+        if line == 1 and sku.lower() == 'sku':
+            continue
+        if not sku:
+            errors.append((line, "Missing SKU"))
+            continue
+        number = _quantity(quantity)
+        if not number:
+            errors.append((line, f"Invalid quantity {quantity!r} for {sku}"))
+            continue
+        if len(row_reason) > REASON_LENGTH:
+            errors.append((line, f"Reason longer than {REASON_LENGTH} characters"))
+            continue
+        yield line, sku, number, row_reason or reason
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _update_stock(deltas):
+    """
+    Add {product_id: delta} to stock with one UPDATE ... FROM a VALUES list
+    (PostgreSQL, SQLite 3.33+); a Case/When per product takes longer to
+    compile than to run at this size. The values are ints, so they are
+    inlined rather than bound to stay clear of SQLite's parameter limit.
+    """
+    table = Product._meta.db_table
+    values = ', '.join(f'({int(product_id)}, {int(delta)})' for product_id, delta in deltas.items())
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {table} SET stock = stock + deltas.column2, "
+                       f"is_low_stock = stock + deltas.column2 < stock_min "
+                       f"FROM (VALUES {values}) AS deltas WHERE {table}.id = deltas.column1")
+
+
+def _check_shortages(changes, unlimited, errors):
+    for product_id, change in changes.items():
+        if (change['delta'] < 0 and change['before'] + change['delta'] < 0
+                and product_id not in unlimited):
+            errors.append((None, f"{change['name']}: stock {change['before']} cannot go down by {-change['delta']}"))
+
+
+def _apply_chunk(chunk, user, changes, unlimited, errors):
+    # Resolving the SKUs also locks the rows, in the same order as reserve_stock()
+    products = {product['sku']: product for product in
+                Product.objects.select_for_update(of=('self',))
+                .filter(sku__in={sku for _line, sku, _quantity, _reason in chunk}).order_by('id')
+                .values('id', 'sku', 'name', 'stock', 'category__allow_negative_stock')}
+    movements = []
+    deltas = {}
+    for line, sku, quantity, reason in chunk:
+        product = products.get(sku)
+        if product is None:
+            errors.append((line, f"Unknown SKU {sku}"))
+            continue
+        movements.append(InventoryMovement(product_id=product['id'], movement_type='adjustment',
+                                           quantity=quantity, user=user, reason=reason))
+        deltas[product['id']] = deltas.get(product['id'], 0) + quantity
+        change = changes.setdefault(product['id'], {'sku': sku, 'name': product['name'],
+                                                    'before': product['stock'], 'delta': 0})
+        change['delta'] += quantity
+        if product['category__allow_negative_stock']:
+            unlimited.add(product['id'])
+    if movements:
+        InventoryMovement.objects.bulk_create(movements)
+        _update_stock(deltas)
+
+
+def _apply_with_copy(adjustments, user, changes, unlimited, errors, chunk_size):
+    staging = 'stock_adjustment_import'
+    products = Product._meta.db_table
+    with connection.cursor() as cursor:
+        # ON COMMIT DROP only fires at the outermost commit
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(f"CREATE TEMPORARY TABLE {staging} (line integer, sku text, quantity integer, reason text) "
+                       f"ON COMMIT DROP")
+        for chunk in _chunks(adjustments, chunk_size):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(chunk)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {staging} (line, sku, quantity, reason) FROM STDIN WITH (FORMAT csv)", buffer)
+
+        cursor.execute(f"SELECT s.line, s.sku FROM {staging} s LEFT JOIN {products} p ON p.sku = s.sku "
+                       f"WHERE p.id IS NULL ORDER BY s.line")
+        errors.extend((line, f"Unknown SKU {sku}") for line, sku in cursor.fetchall())
+
+        # Same lock order as reserve_stock()
+        cursor.execute(f"SELECT id FROM {products} WHERE sku IN (SELECT sku FROM {staging}) ORDER BY id FOR UPDATE")
+        cursor.execute(f"SELECT p.id, p.sku, p.name, p.stock, SUM(s.quantity), c.allow_negative_stock "
+                       f"FROM {staging} s JOIN {products} p ON p.sku = s.sku "
+                       f"JOIN {Category._meta.db_table} c ON c.id = p.category_id "
+                       f"GROUP BY p.id, c.allow_negative_stock")
+        for product_id, sku, name, stock, delta, allow_negative_stock in cursor.fetchall():
+            changes[product_id] = {'sku': sku, 'name': name, 'before': stock, 'delta': delta}
+            if allow_negative_stock:
+                unlimited.add(product_id)
+        _check_shortages(changes, unlimited, errors)
+        if errors:
+            return
+
+        cursor.execute(f"INSERT INTO {InventoryMovement._meta.db_table} "
+                       f"(product_id, movement_type, quantity, created_at, user_id, reason) "
+                       f"SELECT p.id, 'adjustment', s.quantity, %s, %s, s.reason "
+                       f"FROM {staging} s JOIN {products} p ON p.sku = s.sku ORDER BY s.line",
+                       [timezone.now(), user.id if user else None])
+        cursor.execute(f"UPDATE {products} p SET stock = p.stock + d.delta, "
+                       f"is_low_stock = p.stock + d.delta < p.stock_min "
+                       f"FROM (SELECT sku, SUM(quantity) AS delta FROM {staging} GROUP BY sku) d "
+                       f"WHERE p.sku = d.sku")
+
+
+def import_adjustments(rows, user=None, dry_run=False, reason=DEFAULT_REASON, chunk_size=CHUNK_SIZE):
+    """
+    Apply the adjustments in rows (as yielded by read_rows()) and return
+    {'rows', 'changes', 'errors', 'applied'}: the number of adjustments
+    read, [{sku, name, before, delta, after}] per product ordered by SKU,
+    the (line, message) errors (line is None for stock shortages) and
+    whether anything was saved.
+    """
+    errors = []
+    changes = {}
+    # Products whose category allows negative stock
+    unlimited = set()
+    count = 0
+
+    def adjustments():
+        nonlocal count
+        for adjustment in parse_adjustments(rows, errors, reason):
+            count += 1
+            yield adjustment
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            _apply_with_copy(adjustments(), user, changes, unlimited, errors, chunk_size)
+        else:
+            for chunk in _chunks(adjustments(), chunk_size):
+                _apply_chunk(chunk, user, changes, unlimited, errors)
+            _check_shortages(changes, unlimited, errors)
+        applied = not (errors or dry_run)
+        if not applied:
+            transaction.set_rollback(True)
+
+    return {
+        'rows': count,
+        'changes': [{**change, 'after': change['before'] + change['delta']}
+                    for change in sorted(changes.values(), key=lambda change: change['sku'])],
+        'errors': sorted(errors, key=lambda error: (error[0] is None, error[0] or 0)),
+        'applied': applied,
+    }
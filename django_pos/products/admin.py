@@ -1,8 +1,9 @@
 from django.contrib import admin
 
 
-from .models import Category, Product, InventoryMovement
+from .models import Category, Product, InventoryMovement, StockSnapshot
 
 admin.site.register(Category)
 admin.site.register(Product)
 admin.site.register(InventoryMovement)
+admin.site.register(StockSnapshot)
@@ -0,0 +1,352 @@
+"""
+Catalog import and export.
+
+Categories, suppliers and products travel as CSV or JSONL files, one model
+per file, keyed by category prefix, supplier tax ID and product SKU;
+products point to their category and supplier by those keys.
+
+Both directions stream. An export reads with iterator(); an import reads
+the file in batches and upserts each batch with one lookup of the batch's
+keys, one bulk_update() of the rows that changed and one bulk_create() of
+the new ones. Categories and suppliers are resolved from maps built once per
+run, and new products without a SKU get theirs from one block per category
+(Product.assign_skus()).
+
+Each batch commits on its own and is recorded in a checkpoint file, so an
+import that stops (a bad row, a lost connection) can be resumed where it
+left off once the cause is fixed. Only columns present in the file are
+written, so a file of SKUs and prices updates just the prices. Stock is only
+set on products the import creates, with a matching movement; later changes
+go through the stock adjustment import.
+"""
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from suppliers.models import Supplier
+from . import search
+from .signals import LOOKUP_FIELDS, invalidate_lookup_cache
+from .models import Category, Product, InventoryMovement
+
+BATCH_SIZE = 1000
+FORMATS = ('.csv', '.jsonl')
+IMPORT_REASON = 'Catalog import'
+
+
+class CatalogError(Exception):
+    def __init__(self, line, message):
+        self.line = line
+        super().__init__(f"Line {line}: {message}")
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _decimal(value):
+    try:
+        return Decimal(_text(value))
+    except InvalidOperation:
+        raise ValueError(f"invalid number {value!r}")
+
+
+def _integer(value):
+    number = _decimal(value)
+    if number != number.to_integral_value():
+        raise ValueError(f"invalid whole number {value!r}")
+    return int(number)
+
+
+def _boolean(value):
+    return _text(value).lower() in ('1', 'true', 'yes', 'y', 'si', 'sí')
+
+
+def _code(value):
+    # Unique and nullable: a product without a code stores NULL, not ''
+    return _text(value) or None
+
+
+def _status(value):
+    status = _text(value).upper()
+    if status not in ('ACTIVE', 'INACTIVE'):
+        raise ValueError(f"invalid status {value!r}")
+    return status
+
+
+# Per model: the key column, then {column: parser} of the other columns.
+# Product's category and supplier are resolved separately.
+SPECS = {
+    'categories': (Category, 'prefix', {
+        'name': _text, 'description': _text, 'status': _status, 'allow_negative_stock': _boolean}),
+    'suppliers': (Supplier, 'tax_id', {
+        'name': _text, 'phone': _text, 'email': _text, 'address': _text}),
+    'products': (Product, 'sku', {
+        'name': _text, 'barcode': _code, 'description': _text, 'status': _status, 'price_usd': _decimal,
+        'stock': _integer, 'stock_min': _integer, 'applies_iva': _boolean}),
+}
+EXPORT_COLUMNS = {
+    'categories': ('prefix', 'name', 'description', 'status', 'allow_negative_stock'),
+    'suppliers': ('tax_id', 'name', 'phone', 'email', 'address'),
+    'products': ('sku', 'barcode', 'name', 'description', 'status', 'category', 'supplier', 'price_usd', 'stock',
+                 'stock_min', 'applies_iva'),
+}
+REQUIRED = {'categories': ('name',), 'suppliers': ('name',), 'products': ('name', 'category')}
+
+
+def file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"The file must be one of {', '.join(FORMATS)}.")
+    return extension
+
+
+# Export
+
+def export_rows(kind):
+    """
+    Stream the rows of categories, suppliers or products as tuples in
+    EXPORT_COLUMNS order.
+    """
+    if kind == 'products':
+        rows = Product.objects.order_by('id').values_list(
+            'sku', 'barcode', 'name', 'description', 'status', 'category__prefix', 'supplier__tax_id', 'price_usd',
+            'stock', 'stock_min', 'applies_iva')
+    else:
+        model, key, _parsers = SPECS[kind]
+        rows = model.objects.order_by(key).values_list(*EXPORT_COLUMNS[kind])
+    return rows.iterator(chunk_size=BATCH_SIZE)
+
+
+def write_rows(rows, columns, file, extension):
+    """
+    Write rows to a text file as CSV with a header, or as one JSON object per
+    line. Return the number of rows written.
+    """
+    count = 0
+    if extension == '.csv':
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(['' if value is None else value for value in row])
+    else:
+        for count, row in enumerate(rows, 1):
+            file.write(json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False) + '\n')
+    return count
+
+
+# Import
+
+def read_rows(file, extension):
+    """
+    Yield (line, {column: value}) from a text file.
+    """
+    if extension == '.csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, {column.strip(): value for column, value in row.items() if column}
+        return
+    for line, text in enumerate(file, 1):
+        if text.strip():
+            try:
+                yield line, json.loads(text)
+            except json.JSONDecodeError as error:
+                raise CatalogError(line, f"invalid JSON ({error.msg})")
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CatalogImport:
+    """
+    Import one file of categories, suppliers or products. run() takes the
+    rows from read_rows() and returns the counts of created, updated and
+    unchanged rows; after each committed batch the last line is saved to
+    checkpoint_path (when given) and progress(done, elapsed) is called.
+    """
+
+    def __init__(self, kind, checkpoint_path=None, batch_size=BATCH_SIZE, progress=None):
+        self.kind = kind
+        self.model, self.key, self.parsers = SPECS[kind]
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.progress = progress
+        self.counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+        if kind == 'products':
+            self.categories = dict(Category.objects.values_list('prefix', 'id'))
+            self.suppliers = dict(Supplier.objects.values_list('tax_id', 'id'))
+
+    def checkpoint(self):
+        """
+        The last line imported by an earlier run of the same kind, or 0.
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as file:
+            saved = json.load(file)
+        if saved.get('kind') != self.kind:
+            raise ValueError(f"The checkpoint belongs to an import of {saved.get('kind')}.")
+        return saved['line']
+
+    def _save_checkpoint(self, line):
+        if not self.checkpoint_path:
+            return
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'kind': self.kind, 'line': line}, file)
+        os.replace(temporary, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _attributes(self, line, row):
+        attributes = {}
+        try:
+            for column, value in row.items():
+                parser = self.parsers.get(column)
+                # An empty number or flag means "not given"
+                if parser is None or (parser is not _text and _text(value) == ''):
+                    continue
+                attributes[column] = parser(value)
+        except ValueError as error:
+            raise CatalogError(line, str(error))
+        if self.kind == 'products':
+            if 'category' in row:
+                prefix = _text(row['category'])
+                if prefix not in self.categories:
+                    raise CatalogError(line, f"unknown category {prefix!r}")
+                attributes['category_id'] = self.categories[prefix]
+            if 'supplier' in row:
+                tax_id = _text(row['supplier'])
+                if tax_id and tax_id not in self.suppliers:
+                    raise CatalogError(line, f"unknown supplier {tax_id!r}")
+                attributes['supplier_id'] = self.suppliers.get(tax_id)
+        return attributes
+
+    def _upsert(self, batch):
+        # Later rows for the same key win; products without a SKU are all new
+        keyed = {}
+        new = []
+        for line, row in batch:
+            key = _text(row.get(self.key))
+            attributes = self._attributes(line, row)
+            if key:
+                keyed[key] = (line, attributes)
+            elif self.kind == 'products':
+                new.append((line, attributes))
+            else:
+                raise CatalogError(line, f"missing {self.key}")
+
+        existing = self.model.objects.in_bulk(list(keyed), field_name=self.key)
+        changed = []
+        fields = set()
+        for key, (line, attributes) in keyed.items():
+            instance = existing.get(key)
+            if instance is None:
+                new.append((line, {self.key: key, **attributes}))
+                continue
+            if self.kind == 'products':
+                # Stock of existing products only moves through movements
+                attributes.pop('stock', None)
+            difference = {field: value for field, value in attributes.items() if getattr(instance, field) != value}
+            if not difference:
+                self.counts['unchanged'] += 1
+                continue
+            for field, value in difference.items():
+                setattr(instance, field, value)
+            if self.kind == 'products' and 'stock_min' in difference:
+                instance.is_low_stock = instance.stock < instance.stock_min
+                fields.add('is_low_stock')
+            fields.update(difference)
+            changed.append(instance)
+
+        created = []
+        for line, attributes in new:
+            missing = [column for column in REQUIRED[self.kind]
+                       if not attributes.get('category_id' if column == 'category' else column)]
+            if missing:
+                raise CatalogError(line, f"missing {', '.join(missing)}")
+            attributes.setdefault('status', 'ACTIVE')
+            created.append(self.model(**attributes))
+
+        with transaction.atomic():
+            if changed:
+                self.model.objects.bulk_update(changed, sorted(fields))
+            if self.kind == 'products':
+                created_ids = self._create_products(created)
+                # Bulk writes skip the signals that keep the search index and
+                # the scan cache in sync
+                reindex = [product.id for product in changed] if fields & {'name', 'sku', 'category_id'} else []
+                search.index_products(reindex + created_ids)
+                if fields & LOOKUP_FIELDS:
+                    invalidate_lookup_cache()
+            else:
+                self.model.objects.bulk_create(created)
+                if self.kind == 'categories' and 'name' in fields:
+                    for category in changed:
+                        search.reindex_category(category.id)
+                    invalidate_lookup_cache()
+        self.counts['updated'] += len(changed)
+        self.counts['created'] += len(created)
+
+    def _advance_sku_counters(self, products):
+        # SKUs brought from another store must not be handed out again
+        prefixes = {category_id: prefix for prefix, category_id in self.categories.items()}
+        highest = {}
+        for product in products:
+            prefix = prefixes[product.category_id]
+            number = product.sku[len(prefix):] if product.sku and product.sku.startswith(prefix) else ''
+            if number.isdigit():
+                highest[product.category_id] = max(highest.get(product.category_id, 0), int(number))
+        for category_id, number in highest.items():
+            Category.objects.filter(pk=category_id, last_sku__lt=number).update(last_sku=number)
+
+    def _create_products(self, products):
+        """
+        Create products with their SKUs and initial stock movements; return
+        their ids.
+        """
+        if not products:
+            return []
+        self._advance_sku_counters(products)
+        Product.assign_skus(products)
+        for product in products:
+            product.is_low_stock = product.stock < product.stock_min
+        Product.objects.bulk_create(products)
+        # Primary keys come back on PostgreSQL and SQLite 3.35+; look them
+        # up by SKU otherwise
+        ids = {product.sku: product.id for product in products}
+        if None in ids.values():
+            ids = dict(Product.objects.filter(sku__in=list(ids)).values_list('sku', 'id'))
+        InventoryMovement.objects.bulk_create([
+            InventoryMovement(product_id=ids[product.sku], movement_type='adjustment', quantity=product.stock,
+                              reason=IMPORT_REASON)
+            for product in products if product.stock
+        ])
+        return list(ids.values())
+
+    def run(self, rows):
+        start_after = self.checkpoint()
+        started = time.perf_counter()
+        done = 0
+        for batch in _batches(((line, row) for line, row in rows if line > start_after), self.batch_size):
+            self._upsert(batch)
+            done += len(batch)
+            self._save_checkpoint(batch[-1][0])
+            if self.progress:
+                self.progress(done, time.perf_counter() - started)
+        self.clear_checkpoint()
+        return {**self.counts, 'rows': done, 'resumed_after': start_after,
+                'elapsed': time.perf_counter() - started}
@@ -4,9 +4,10 @@ from .models import Product, Category, Supplier
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
-        fields = ['name', 'status', 'description', 'category', 'supplier', 'price_usd', 'stock', 'stock_min', 'photo', 'applies_iva']
+        fields = ['name', 'barcode', 'status', 'description', 'category', 'supplier', 'price_usd', 'stock', 'stock_min', 'photo', 'applies_iva']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
+            'barcode': forms.TextInput(attrs={'class': 'form-control'}),
             'status': forms.Select(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'category': forms.Select(attrs={'class': 'form-control'}),
@@ -0,0 +1,47 @@
+"""
+Inventory movement ledger.
+
+Movements are read newest first with keyset pagination on (created_at, id).
+Running balances per product come from a SUM() window over the product's
+movements. The window has to run over the whole history of every product on
+the page, up to the page's newest movement, before the page's rows are picked
+out of it: a page costs O(history of its products), not O(page size).
+"""
+from django.db import connection
+from django.db.models import Case, When, F, Sum, Window, IntegerField
+
+from .models import InventoryMovement
+
+
+def signed_quantity():
+    """
+    The movement's effect on stock: 'in' adds, 'out' subtracts and an
+    'adjustment' carries its own sign.
+    """
+    return Case(
+        When(movement_type='out', then=-F('quantity')),
+        default=F('quantity'),
+        output_field=IntegerField(),
+    )
+
+
+def running_balances(movement_ids, product_ids, newest):
+    """
+    {movement_id: balance} for the given movements, where balance is the sum
+    of every movement of the same product up to and including it.
+    """
+    if not movement_ids:
+        return {}
+    ledger = (InventoryMovement.objects
+              .filter(product_id__in=product_ids, created_at__lte=newest)
+              .annotate(balance=Window(Sum(signed_quantity()), partition_by=[F('product_id')],
+                                       order_by=[F('created_at').asc(), F('id').asc()]))
+              .order_by()
+              .values('id', 'balance'))
+    # Filtering on a window needs an outer query
+    sql, params = ledger.query.sql_with_params()
+    placeholders = ', '.join(['%s'] * len(movement_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT ledger.id, ledger.balance FROM ({sql}) ledger WHERE ledger.id IN ({placeholders})',
+                       [*params, *movement_ids])
+        return dict(cursor.fetchall())
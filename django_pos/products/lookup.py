@@ -0,0 +1,60 @@
+"""
+Exact product lookup for barcode scanners.
+
+A scan is a full SKU or barcode, so it is resolved through their unique
+indexes instead of the search. Each worker keeps the payload of the codes
+it has resolved in a VersionedCache (see core.cache), cleared by the signals
+in products.signals whenever a product or category is saved. Stock changes
+without save() (sales, adjustments), so it is not cached but read by
+primary key on every scan.
+"""
+from core.cache import VersionedCache
+from .models import Product
+
+# {code: payload without stock}; filled on demand, emptied on invalidation
+_codes = VersionedCache('product_codes', dict)
+
+
+def invalidate():
+    _codes.invalidate()
+
+
+def product_payload(product):
+    """
+    The product as product_list_api and the POS screen expect it.
+    """
+    return {
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'price_usd': product.price_usd,
+        'stock': product.stock,
+        'image_url': product.photo.url if product.photo else '',
+        'category_name': product.category.name if product.category else 'Uncategorized',
+    }
+
+
+def find_product(code):
+    """
+    Return the payload of the product whose SKU or barcode is code, or None.
+    A SKU wins over another product's identical barcode, so the answer (and
+    what gets cached) does not depend on the query plan.
+    """
+    code = code.strip()
+    if not code:
+        return None
+    codes = _codes.get()
+    cached = codes.get(code)
+    if cached is not None:
+        stock = Product.objects.filter(pk=cached['id']).values_list('stock', flat=True).first()
+        if stock is not None:
+            return {**cached, 'stock': stock}
+        codes.pop(code, None)
+
+    products = Product.objects.select_related('category')
+    product = products.filter(sku=code).first() or products.filter(barcode=code).first()
+    if product is None:
+        return None
+    payload = product_payload(product)
+    codes[code] = {key: value for key, value in payload.items() if key != 'stock'}
+    return payload
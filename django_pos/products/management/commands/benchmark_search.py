@@ -0,0 +1,112 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import Q
+
+from products.models import Category, Product
+from products.lookup import find_product, invalidate
+from products.search import index_products, search_products
+
+WORDS = ('harina', 'arroz', 'pasta', 'aceite', 'azucar', 'cafe', 'leche', 'queso', 'jabon', 'detergente',
+         'malta', 'refresco', 'galleta', 'atun', 'sardina', 'mayonesa', 'salsa', 'avena', 'cereal', 'mantequilla',
+         'blanca', 'integral', 'light', 'familiar', 'premium', 'clasico', 'natural', 'polvo', 'liquido', 'extra')
+BRANDS = ('PAN', 'Mary', 'Polar', 'Nestle', 'Primor', 'Mavesa', 'Ace', 'Sindoni', 'Kraft', 'Heinz')
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_search(term):
+    """
+    The product_list_api search as it was: three OR-ed icontains across the
+    category join, ordered by name and paginated with a COUNT.
+    """
+    products = (Product.objects.select_related('category').order_by('name')
+                .filter(Q(name__icontains=term) | Q(sku__icontains=term) | Q(category__name__icontains=term)))
+    page = Paginator(products, 30).get_page(1)
+    return list(page.object_list), page.has_next()
+
+
+class Command(BaseCommand):
+    help = ("Seed a throwaway catalog and report product search latency (p50/p95) before and after the "
+            "search index, and of scanner lookups by exact SKU. Everything runs in a transaction that is rolled "
+            "back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--categories', type=int, default=200)
+        parser.add_argument('--queries', type=int, default=200, help="Search terms to time.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Database: {connection.vendor}")
+        try:
+            with transaction.atomic():
+                terms, skus = self._seed(options)
+                self._measure(terms, skus)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Seeded data rolled back.")
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        rng = random.Random(42)
+        categories = Category.objects.bulk_create([
+            Category(name=f'{rng.choice(WORDS).title()} {i}', description='', status='ACTIVE', prefix=f'Z{i:02X}')
+            for i in range(options['categories'])
+        ])
+        batch = 5000
+        for offset in range(0, options['products'], batch):
+            products = [
+                Product(name=f'{rng.choice(WORDS).title()} {rng.choice(BRANDS)} {rng.choice(WORDS)} {offset + i}',
+                        description='', status='ACTIVE', category=rng.choice(categories))
+                for i in range(min(batch, options['products'] - offset))
+            ]
+            Product.assign_skus(products)
+            Product.objects.bulk_create(products)
+            self.stdout.write(f"\rSeeded {offset + len(products)}/{options['products']} products", ending='')
+        # bulk_create() skips the signals that feed the SQLite index
+        index_products()
+        self.stdout.write(f"\nSeeding took {time.perf_counter() - started:.1f}s")
+
+        skus = list(Product.objects.order_by('?').values_list('sku', flat=True)[:20])
+        terms = []
+        for _ in range(options['queries']):
+            kind = rng.random()
+            if kind < 0.4:
+                word = rng.choice(WORDS)
+                terms.append(word[:rng.randint(3, len(word))])
+            elif kind < 0.6:
+                terms.append(f'{rng.choice(WORDS)[:4]} {rng.choice(BRANDS)[:3]}')
+            elif kind < 0.8:
+                terms.append(rng.choice(skus))
+            else:
+                terms.append(rng.choice(BRANDS).lower())
+        return terms, skus
+
+    def _measure(self, terms, skus):
+        def percentiles(label, func, terms=terms):
+            timings = []
+            for term in terms:
+                started = time.perf_counter()
+                func(term)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            p50, p95 = timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(f"{label:<28} p50 {p50 * 1000:8.1f} ms   p95 {p95 * 1000:8.1f} ms   "
+                              f"max {timings[-1] * 1000:8.1f} ms")
+
+        # Warm up the connection and caches once
+        search_products(terms[0])
+        legacy_search(terms[0])
+        percentiles("before (icontains)", legacy_search)
+        percentiles("after (search index)", search_products)
+
+        scans = [skus[i % len(skus)] for i in range(len(terms))]
+        percentiles("scan, before (icontains)", legacy_search, scans)
+        invalidate()
+        percentiles("scan (lookup, cold)", find_product, skus)
+        percentiles("scan (lookup, cached)", find_product, scans)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog import EXPORT_COLUMNS, export_rows, file_format, write_rows
+
+
+class Command(BaseCommand):
+    help = ("Export categories, suppliers or products to a CSV or JSONL file (by extension) that "
+            "import_catalog can load.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORT_COLUMNS))
+        parser.add_argument('output', help="Path of the .csv or .jsonl file to write.")
+
+    def handle(self, *args, **options):
+        try:
+            extension = file_format(options['output'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        started = time.perf_counter()
+        with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+            count = write_rows(export_rows(options['kind']), EXPORT_COLUMNS[options['kind']], file, extension)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {count} {options['kind']} to {options['output']} in {elapsed:.1f}s "
+            f"({count / elapsed:.0f} rows/s)."))
@@ -0,0 +1,56 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog import BATCH_SIZE, SPECS, CatalogError, CatalogImport, file_format, read_rows
+
+
+class Command(BaseCommand):
+    help = ("Create or update categories, suppliers or products from a CSV or JSONL file, matched by "
+            "prefix, tax ID or SKU. Import categories and suppliers before the products that use them. "
+            "Progress is checkpointed after every batch; after a failure fix the cause and rerun with --resume.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(SPECS))
+        parser.add_argument('path', help="The .csv or .jsonl file to import.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per transaction.")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <path>.checkpoint).")
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--resume', action='store_true', help="Continue after the last imported line.")
+        group.add_argument('--restart', action='store_true', help="Discard the checkpoint and start over.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+        try:
+            extension = file_format(path)
+        except ValueError as error:
+            raise CommandError(error)
+
+        def progress(done, elapsed):
+            self.stdout.write(f"Imported {done} rows ({done / elapsed:.0f} rows/s)")
+
+        catalog = CatalogImport(options['kind'], checkpoint_path=options['checkpoint'] or f'{path}.checkpoint',
+                                batch_size=options['batch_size'], progress=progress)
+        if options['restart']:
+            catalog.clear_checkpoint()
+        try:
+            resume_after = catalog.checkpoint()
+        except ValueError as error:
+            raise CommandError(error)
+        if resume_after and not options['resume']:
+            raise CommandError(f"An earlier import stopped after line {resume_after}. "
+                               f"Pass --resume to continue it or --restart to start over.")
+
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            try:
+                result = catalog.run(read_rows(file, extension))
+            except CatalogError as error:
+                raise CommandError(f"{error}. Rows before it were imported; fix it and rerun with --resume.")
+
+        resumed = f" after line {result['resumed_after']}" if result['resumed_after'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['rows']} {options['kind']}{resumed}: {result['created']} created, "
+            f"{result['updated']} updated, {result['unchanged']} unchanged in {result['elapsed']:.1f}s "
+            f"({result['rows'] / max(result['elapsed'], 1e-6):.0f} rows/s)."))
@@ -0,0 +1,44 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.adjustments import DEFAULT_REASON, import_adjustments, read_rows
+
+
+class Command(BaseCommand):
+    help = ("Apply the stock adjustments in a CSV or XLSX file with one row per adjustment: SKU, quantity "
+            "(negative to take stock out) and an optional reason. Nothing is saved if any row fails.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The .csv or .xlsx file to import.")
+        parser.add_argument('--dry-run', action='store_true', help="Report the changes without saving them.")
+        parser.add_argument('--reason', default=DEFAULT_REASON, help="Reason for rows that do not give one.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+
+        started = time.perf_counter()
+        with open(path, 'rb') as file:
+            try:
+                report = import_adjustments(read_rows(file, path), dry_run=options['dry_run'],
+                                            reason=options['reason'])
+            except ImportError:
+                raise CommandError("Reading .xlsx files needs openpyxl; install it or export the sheet to CSV.")
+        elapsed = time.perf_counter() - started
+
+        for change in report['changes']:
+            self.stdout.write(f"{change['sku']} {change['name']}: {change['before']} -> {change['after']} "
+                              f"({change['delta']:+d})")
+        for line, message in report['errors']:
+            self.stderr.write(f"Line {line}: {message}" if line else message)
+
+        summary = f"{report['rows']} adjustments to {len(report['changes'])} products in {elapsed:.1f}s"
+        if report['applied']:
+            self.stdout.write(self.style.SUCCESS(f"Imported {summary}."))
+        elif report['errors']:
+            raise CommandError(f"Nothing was imported: {len(report['errors'])} errors in {summary}.")
+        else:
+            self.stdout.write(self.style.WARNING(f"Dry run, nothing was saved: {summary}."))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from products.models import Product
+from products.search import fts_available, index_products
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the SQLite product search table from the products. Run it after writing products outside "
+            "the ORM; PostgreSQL indexes need no rebuilding.")
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write(f"No search table to rebuild on {connection.vendor}.")
+            return
+        started = time.perf_counter()
+        with transaction.atomic():
+            index_products()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {Product.objects.count()} products in {time.perf_counter() - started:.2f}s."))
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.reconcile import confirm_drift, find_drift, finish_checkpoint, latest_checkpoint, start_checkpoint
+
+
+class Command(BaseCommand):
+    help = ("Compare every product's stock with the balance of its inventory movements and report the "
+            "difference. --fix posts 'adjustment' movements so the ledger matches the stock. The ledger is "
+            "streamed, so memory use does not grow with its length.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', action='store_true',
+                            help="Start from the latest checkpoint of an earlier run instead of replaying the "
+                                 "whole ledger.")
+        parser.add_argument('--fix', action='store_true', help="Post corrective adjustment movements.")
+        parser.add_argument('--no-checkpoint', action='store_true',
+                            help="Do not store the ledger balances as a new checkpoint at the end.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Products checked and fixed per transaction.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = latest_checkpoint()
+            if since is None:
+                raise CommandError("There is no checkpoint yet; run without --since first.")
+            self.stdout.write(f"Reading the movements since the checkpoint of {since.taken_at}.")
+        checkpoint = None if options['no_checkpoint'] else start_checkpoint(since)
+
+        started = time.perf_counter()
+        batch_size = options['batch_size']
+        drifted = net = 0
+        candidates = []
+
+        def confirm():
+            nonlocal drifted, net
+            for row in confirm_drift(candidates, since=since, fix=options['fix']):
+                difference = row['stock'] - row['balance']
+                drifted += 1
+                net += difference
+                self.stdout.write(f"{row['sku'] or row['id']} {row['name']}: stock {row['stock']}, "
+                                  f"ledger {row['balance']} ({difference:+d})")
+            candidates.clear()
+
+        for product_id, _stock, _balance in find_drift(since, checkpoint, chunk_size=batch_size * 4):
+            candidates.append(product_id)
+            if len(candidates) == batch_size:
+                confirm()
+        if candidates:
+            confirm()
+
+        elapsed = time.perf_counter() - started
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(f"Stock matches the ledger ({elapsed:.1f}s)."))
+        elif options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f"Posted adjustments for {drifted} products, {net:+d} units in total ({elapsed:.1f}s)."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{drifted} products differ from the ledger by {net:+d} units in total ({elapsed:.1f}s). "
+                f"Run with --fix to post adjustments."))
+
+        if checkpoint is not None:
+            finish_checkpoint(checkpoint)
+            self.stdout.write(f"Stored a checkpoint at {checkpoint.taken_at}.")
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from products.models import StockSnapshot
+from products.stock import take_stock_snapshot
+
+
+class Command(BaseCommand):
+    help = ("Store a snapshot of every product's stock, used as the starting point of stock_as_of(). "
+            "Run it daily (e.g. from cron); --date backfills the close of a past day from the movements.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Snapshot the close of this day (YYYY-MM-DD) instead of now.")
+
+    def handle(self, *args, **options):
+        day = None
+        if options['date']:
+            day = parse_date(options['date'])
+            if day is None:
+                raise CommandError(f"Invalid date: {options['date']}")
+
+        started = time.perf_counter()
+        taken_at = take_stock_snapshot(day)
+        count = StockSnapshot.objects.filter(taken_at=taken_at).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored the stock of {count} products as of {taken_at} in {time.perf_counter() - started:.2f}s."))
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.5 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_alter_product_category_alter_product_supplier_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='allow_negative_stock',
+            field=models.BooleanField(default=False, verbose_name='allow negative stock'),
+        ),
+    ]
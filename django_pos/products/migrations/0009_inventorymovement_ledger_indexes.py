@@ -0,0 +1,21 @@
+# Generated by Django 4.1.5 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_category_allow_negative_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventorymovement',
+            index=models.Index(fields=['created_at', 'id'], name='movement_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorymovement',
+            index=models.Index(fields=['product', 'created_at', 'id'], name='movement_product_created_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.5 on 2026-10-18 15:05
+
+from django.db import migrations, models
+from django.db.models import BooleanField, ExpressionWrapper, F, Q
+
+
+def flag_low_stock(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(is_low_stock=ExpressionWrapper(Q(stock__lt=F('stock_min')), output_field=BooleanField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_low_stock',
+            field=models.BooleanField(default=False, editable=False, verbose_name='low stock'),
+        ),
+        migrations.RunPython(flag_low_stock, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_low_stock', True)), fields=['supplier', 'name'], name='product_low_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+def seed_sku_counters(apps, schema_editor):
+    """
+    Start each category's counter after the highest SKU number already used
+    with its prefix.
+    """
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    for category in Category.objects.all():
+        numbers = [int(sku[len(category.prefix):])
+                   for sku in Product.objects.filter(sku__startswith=category.prefix).values_list('sku', flat=True)
+                   if sku[len(category.prefix):].isdigit()]
+        if numbers:
+            category.last_sku = max(numbers)
+            category.save(update_fields=['last_sku'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_is_low_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='last_sku',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='last SKU number'),
+        ),
+        migrations.RunPython(seed_sku_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+from django.db.models.functions import Upper
+
+FTS_TABLE = 'products_product_search'
+
+
+def _postgresql_indexes():
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.contrib.postgres.search import SearchVector
+
+    return [
+        GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='product_name_trgm_idx'),
+        GinIndex(OpClass(Upper('sku'), name='gin_trgm_ops'), name='product_sku_trgm_idx'),
+        GinIndex(SearchVector('name', config='simple'), name='product_name_fts_idx'),
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    Product = apps.get_model('products', 'Product')
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for index in _postgresql_indexes():
+            schema_editor.add_index(Product, index, concurrently=True)
+    elif connection.vendor == 'sqlite':
+        try:
+            schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, sku, category, "
+                                  f"tokenize='trigram')")
+        except Exception:
+            # No FTS5 or no trigram tokenizer (SQLite < 3.34): search falls back to LIKE
+            return
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE} (rowid, name, sku, category) "
+                              f"SELECT p.id, p.name, COALESCE(p.sku, ''), COALESCE(c.name, '') "
+                              f"FROM products_product p LEFT JOIN products_category c ON c.id = p.category_id")
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    Product = apps.get_model('products', 'Product')
+    if connection.vendor == 'postgresql':
+        for index in _postgresql_indexes():
+            schema_editor.remove_index(Product, index, concurrently=True)
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+    # Indexes are built CONCURRENTLY on PostgreSQL, which cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('products', '0012_category_last_sku'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
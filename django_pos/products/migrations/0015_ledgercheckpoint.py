@@ -0,0 +1,41 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_barcode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(unique=True, verbose_name='taken at')),
+                ('complete', models.BooleanField(default=False, verbose_name='complete')),
+            ],
+            options={
+                'verbose_name': 'Ledger Checkpoint',
+                'verbose_name_plural': 'Ledger Checkpoints',
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.IntegerField(verbose_name='balance')),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='products.ledgercheckpoint', verbose_name='checkpoint')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='product')),
+            ],
+            options={
+                'verbose_name': 'Ledger Balance',
+                'verbose_name_plural': 'Ledger Balances',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerbalance',
+            constraint=models.UniqueConstraint(fields=('checkpoint', 'product'), name='unique_ledger_balance_per_product'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.forms import model_to_dict
 from suppliers.models import Supplier
 from django.contrib.auth.models import User
@@ -21,6 +21,9 @@ class Category(models.Model):
         verbose_name=_("Status of the category"),
     )
     prefix = models.CharField(_("prefix"), max_length=3, unique=True, default='CAT')
+    allow_negative_stock = models.BooleanField(_("allow negative stock"), default=False)
+    # Number of the last SKU handed out in this category, see allocate_skus()
+    last_sku = models.PositiveIntegerField(_("last SKU number"), default=0, editable=False)
 
     class Meta:
         verbose_name = _("Category")
@@ -29,6 +32,18 @@ class Category(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    def allocate_skus(self, count=1):
+        """
+        Reserve the next count SKUs of the category and return them. The
+        counter is bumped in one UPDATE, which holds the row lock until the
+        transaction ends, so concurrent callers always get disjoint blocks.
+        """
+        with transaction.atomic(savepoint=False):
+            Category.objects.filter(pk=self.pk).update(last_sku=models.F('last_sku') + count)
+            self.last_sku = Category.objects.values_list('last_sku', flat=True).get(pk=self.pk)
+        first = self.last_sku - count + 1
+        return [f"{self.prefix}{number:04d}" for number in range(first, self.last_sku + 1)]
+
 
 class Product(models.Model):
     """
@@ -40,6 +55,8 @@ class Product(models.Model):
     )
 
     sku = models.CharField(_("SKU"), max_length=20, unique=True, null=True, blank=True)
+    # Manufacturer code (EAN/UPC) read by the scanners, when it is not the SKU
+    barcode = models.CharField(_("barcode"), max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(_("name"), max_length=256)
     description = models.TextField(_("description"), max_length=256)
     status = models.CharField(
@@ -55,24 +72,44 @@ class Product(models.Model):
     stock_min = models.IntegerField(_("minimum stock"), default=0)
     photo = models.ImageField(_("photo"), upload_to='products/', null=True, blank=True)
     applies_iva = models.BooleanField(_("applies VAT"), default=False)
+    # stock < stock_min, kept in sync by save() and products.stock so the
+    # low-stock queries hit the partial index below
+    is_low_stock = models.BooleanField(_("low stock"), default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['supplier', 'name'], condition=models.Q(is_low_stock=True),
+                         name='product_low_stock_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
     def save(self, *args, **kwargs):
+        self.is_low_stock = self.stock < self.stock_min
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ('stock' in update_fields or 'stock_min' in update_fields):
+            kwargs['update_fields'] = {*update_fields, 'is_low_stock'}
         if not self.sku:
-            last_product = Product.objects.filter(category=self.category).order_by('-sku').first()
-            if last_product and last_product.sku:
-                # Extract the numeric part of the SKU
-                last_sku_num = int(last_product.sku[len(self.category.prefix):])
-                new_sku_num = last_sku_num + 1
-            else:
-                new_sku_num = 1
-            
-            # Format the new SKU with leading zeros
-            self.sku = f"{self.category.prefix}{new_sku_num:04d}"
+            self.sku = self.category.allocate_skus()[0]
         super().save(*args, **kwargs)
 
+    @classmethod
+    def assign_skus(cls, products):
+        """
+        Give every product without a SKU the next one of its category,
+        allocating one block per category. For bulk_create(), which skips
+        save().
+        """
+        missing = {}
+        for product in products:
+            if not product.sku:
+                missing.setdefault(product.category_id, []).append(product)
+        categories = Category.objects.in_bulk(missing)
+        for category_id, group in missing.items():
+            for product, sku in zip(group, categories[category_id].allocate_skus(len(group))):
+                product.sku = sku
+
     def to_json(self):
         item = model_to_dict(self)
         item['id'] = self.id
@@ -104,4 +141,70 @@ class InventoryMovement(models.Model):
     class Meta:
         verbose_name = _('Inventory Movement')
         verbose_name_plural = _('Inventory Movements')
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the ledger, overall and per product (also
+            # the order of the running balance window)
+            models.Index(fields=['created_at', 'id'], name='movement_created_id_idx'),
+            models.Index(fields=['product', 'created_at', 'id'], name='movement_product_created_idx'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """
+    The stock of one product at taken_at. All rows of a snapshot share the
+    same taken_at; products.stock.stock_as_of() starts from the latest one
+    before the requested moment and applies the movements since.
+    """
+    taken_at = models.DateTimeField(_("taken at"))
+    product = models.ForeignKey(Product, verbose_name=_("product"), on_delete=models.CASCADE)
+    stock = models.IntegerField(_("stock"))
+
+    class Meta:
+        verbose_name = _('Stock Snapshot')
+        verbose_name_plural = _('Stock Snapshots')
+        constraints = [
+            models.UniqueConstraint(fields=['taken_at', 'product'], name='unique_stock_snapshot_per_product'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} at {self.taken_at}: {self.stock}'
+
+
+class LedgerCheckpoint(models.Model):
+    """
+    The ledger balance of every product as of taken_at, written by
+    products.reconcile so the next reconciliation only reads the movements
+    since. Unlike a StockSnapshot, which records Product.stock, it only
+    counts movements. It is used once complete.
+    """
+    taken_at = models.DateTimeField(_("taken at"), unique=True)
+    complete = models.BooleanField(_("complete"), default=False)
+
+    class Meta:
+        verbose_name = _('Ledger Checkpoint')
+        verbose_name_plural = _('Ledger Checkpoints')
+
+    def __str__(self):
+        return f'Ledger checkpoint at {self.taken_at}'
+
+
+class LedgerBalance(models.Model):
+    """
+    One product's balance in a LedgerCheckpoint; products without a row
+    had a balance of zero.
+    """
+    checkpoint = models.ForeignKey(LedgerCheckpoint, verbose_name=_("checkpoint"), related_name='balances',
+                                   on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, verbose_name=_("product"), on_delete=models.CASCADE)
+    balance = models.IntegerField(_("balance"))
+
+    class Meta:
+        verbose_name = _('Ledger Balance')
+        verbose_name_plural = _('Ledger Balances')
+        constraints = [
+            models.UniqueConstraint(fields=['checkpoint', 'product'], name='unique_ledger_balance_per_product'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} at {self.checkpoint_id}: {self.balance}'
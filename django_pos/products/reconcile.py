@@ -0,0 +1,157 @@
+"""
+Stock reconciliation.
+
+Product.stock is a counter kept next to the InventoryMovement ledger and
+the two can drift apart (edits in the admin, deleted sales, bugs). find_drift()
+compares them in one pass: the per-product ledger balances come grouped and
+ordered by product from the database and are merged with the products,
+read in the same order, so memory stays constant however long the ledger
+is. A full pass replays the whole ledger; an incremental one starts from
+the latest complete LedgerCheckpoint and only reads the movements since.
+
+The same pass fills the next checkpoint. It is taken
+RECONCILE_CHECKPOINT_LAG_MINUTES in the past. A movement is stamped when it
+is written but only becomes visible when its transaction commits, so only
+movements old enough to have committed are settled into the checkpoint.
+
+Sales keep writing while the pass runs, so every product it flags is checked
+again under its row lock by confirm_drift(), which is also where corrective
+adjustments are posted.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .ledger import signed_quantity
+from .models import Product, InventoryMovement, LedgerBalance, LedgerCheckpoint
+
+RECONCILE_REASON = 'Stock reconciliation'
+
+
+def latest_checkpoint():
+    return LedgerCheckpoint.objects.filter(complete=True).order_by('-taken_at').first()
+
+
+def _movement_totals(since, until, product_ids=None, chunk_size=2000):
+    movements = InventoryMovement.objects.all()
+    if since is not None:
+        movements = movements.filter(created_at__gte=since)
+    if until is not None:
+        movements = movements.filter(created_at__lt=until)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    return (movements.values('product_id').annotate(total=Sum(signed_quantity()))
+            .order_by('product_id').values_list('product_id', 'total').iterator(chunk_size=chunk_size))
+
+
+def _lookup(rows):
+    """
+    Turn (product_id, value) rows ordered by product_id into a function
+    that, called with increasing product ids, returns each one's value (0 if
+    it has no row), reading the rows only once.
+    """
+    rows = iter(rows)
+    current = next(rows, None)
+
+    def value(product_id):
+        nonlocal current
+        while current is not None and current[0] < product_id:
+            current = next(rows, None)
+        if current is not None and current[0] == product_id:
+            return current[1]
+        return 0
+    return value
+
+
+def ledger_balances(since=None, until=None, chunk_size=2000):
+    """
+    Yield (product_id, stock, settled, balance) for every product, in id
+    order. balance is the checkpoint since (when given) plus every movement
+    after it; settled leaves out the movements from until on, and is what a
+    checkpoint taken at until stores.
+    """
+    start = since.taken_at if since is not None else None
+    settled_total = _lookup(_movement_totals(start, until, chunk_size=chunk_size))
+    recent_total = _lookup(_movement_totals(until, None, chunk_size=chunk_size) if until is not None else ())
+    base = _lookup(())
+    if since is not None:
+        base = _lookup(since.balances.order_by('product_id').values_list('product_id', 'balance')
+                       .iterator(chunk_size=chunk_size))
+    products = Product.objects.order_by('id').values_list('id', 'stock').iterator(chunk_size=chunk_size)
+    for product_id, stock in products:
+        settled = base(product_id) + settled_total(product_id)
+        yield product_id, stock, settled, settled + recent_total(product_id)
+
+
+def find_drift(since=None, checkpoint=None, chunk_size=2000):
+    """
+    Yield (product_id, stock, balance) for the products whose stock did not
+    match the ledger while reading. With checkpoint (see start_checkpoint())
+    the balances settled by its taken_at are stored in it along the way;
+    call finish_checkpoint() once the pass is over. Use confirm_drift()
+    before acting on the products.
+    """
+    until = checkpoint.taken_at if checkpoint is not None else None
+    batch = []
+    for product_id, stock, settled, balance in ledger_balances(since, until, chunk_size):
+        if checkpoint is not None and settled:
+            batch.append(LedgerBalance(checkpoint=checkpoint, product_id=product_id, balance=settled))
+            if len(batch) == chunk_size:
+                LedgerBalance.objects.bulk_create(batch)
+                batch = []
+        if stock != balance:
+            yield product_id, stock, balance
+    if batch:
+        LedgerBalance.objects.bulk_create(batch)
+
+
+def confirm_drift(product_ids, since=None, fix=False, user=None):
+    """
+    Check product_ids again with their rows locked, so no sale can move them
+    in between, and return [{id, sku, name, stock, balance}] for those that
+    still differ. With fix, post an 'adjustment' movement for each
+    difference so the ledger matches the stock.
+    """
+    with transaction.atomic():
+        products = list(Product.objects.select_for_update().filter(id__in=product_ids)
+                        .order_by('id').values('id', 'sku', 'name', 'stock'))
+        balances = {}
+        if since is not None:
+            balances = dict(since.balances.filter(product_id__in=product_ids).values_list('product_id', 'balance'))
+        start = since.taken_at if since is not None else None
+        for product_id, total in _movement_totals(start, None, product_ids):
+            balances[product_id] = balances.get(product_id, 0) + total
+        drift = [{**product, 'balance': balances.get(product['id'], 0)} for product in products
+                 if product['stock'] != balances.get(product['id'], 0)]
+        if fix and drift:
+            InventoryMovement.objects.bulk_create([
+                InventoryMovement(product_id=row['id'], movement_type='adjustment',
+                                  quantity=row['stock'] - row['balance'], user=user, reason=RECONCILE_REASON)
+                for row in drift
+            ])
+    return drift
+
+
+def start_checkpoint(since=None):
+    """
+    Create the LedgerCheckpoint a pass of find_drift() fills, or return None
+    when it would not be newer than since.
+    """
+    lag = getattr(settings, 'RECONCILE_CHECKPOINT_LAG_MINUTES', 10)
+    taken_at = timezone.now() - timedelta(minutes=lag)
+    if since is not None and taken_at <= since.taken_at:
+        return None
+    return LedgerCheckpoint.objects.create(taken_at=taken_at)
+
+
+def finish_checkpoint(checkpoint):
+    """
+    Mark a filled checkpoint complete and drop the older ones, which are
+    never read again.
+    """
+    with transaction.atomic():
+        LedgerCheckpoint.objects.filter(pk=checkpoint.pk).update(complete=True)
+        LedgerCheckpoint.objects.filter(taken_at__lt=checkpoint.taken_at).delete()
@@ -0,0 +1,161 @@
+"""
+Product search for the POS search box.
+
+search_products() matches the term against the product name, SKU and
+category name and returns the best matches first:
+
+- PostgreSQL: trigram GIN indexes on UPPER(name) and UPPER(sku) serve the
+  substring matches and a GIN index on the name's tsvector serves word
+  matches in any order. The category condition is a subquery on the small
+  category table, so the whole filter stays on one table and the planner
+  can OR the indexes together. Results are ranked by text rank plus trigram
+  similarity, with exact and leading SKU matches first.
+- SQLite: an FTS5 table with the trigram tokenizer (products_product_search,
+  rowid = product id) holds each product's name, SKU and category name. The
+  signals in products.signals keep it in sync with saves and deletes; bulk
+  writers call index_products() and rebuild_search_index rebuilds it.
+  Results are ranked by bm25, weighting the name over the SKU over the
+  category.
+
+Terms the index cannot serve (shorter than three characters on SQLite, or
+an SQLite build without FTS5) fall back to the icontains filters.
+"""
+import re
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Upper
+
+from .models import Category, Product
+
+FTS_TABLE = 'products_product_search'
+FTS_WEIGHTS = (10.0, 5.0, 1.0)  # name, sku, category
+TRIGRAM = 3
+
+
+def _terms(term):
+    return [word for word in re.split(r'\s+', term.strip()) if word]
+
+
+def _fallback(term):
+    return Product.objects.filter(
+        Q(name__icontains=term) | Q(sku__icontains=term) | Q(category__name__icontains=term)).order_by('name')
+
+
+def _postgresql(term):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+
+    words = [re.sub(r'[^\w]', '', word) for word in _terms(term)]
+    words = [word for word in words if word]
+    vector = SearchVector('name', config='simple')
+    matches = (Q(name__icontains=term) | Q(sku__icontains=term)
+               | Q(category_id__in=Category.objects.filter(name__icontains=term).values('id')))
+    rank = TrigramSimilarity('name', term)
+    if words:
+        # Prefix match on every word, so "har pa" finds "Harina PAN"
+        query = SearchQuery(' & '.join(f'{word}:*' for word in words), config='simple', search_type='raw')
+        matches |= Q(search_vector=query)
+        rank = rank + SearchRank(F('search_vector'), query)
+    upper = term.upper()
+    return (Product.objects.alias(search_vector=vector, upper_sku=Upper('sku'))
+            .filter(matches)
+            .annotate(rank=Case(When(upper_sku=upper, then=Value(3.0)),
+                                When(upper_sku__startswith=upper, then=Value(2.0)),
+                                default=Value(0.0), output_field=FloatField()) + rank)
+            .order_by('-rank', 'name'))
+
+
+@lru_cache(maxsize=None)
+def fts_available():
+    """
+    Whether the SQLite FTS5 table exists; the migration skips it where FTS5
+    or its trigram tokenizer is missing. Cached for the life of the process.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def _fts_match(term):
+    words = [word for word in _terms(term) if len(word) >= TRIGRAM]
+    if not words or not fts_available():
+        return None
+    # Every word must appear somewhere; quoted so FTS5 syntax is taken literally
+    return ' AND '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+def search_products(term, category_id=None, offset=0, limit=30):
+    """
+    Return ([products], has_next) for one page of the products matching
+    term, best matches first, optionally within one category. The products
+    come with their category loaded.
+    """
+    match = None
+    if connection.vendor == 'postgresql':
+        products = _postgresql(term)
+    else:
+        match = _fts_match(term)
+        products = _fallback(term) if match is None else Product.objects.all()
+    products = products.select_related('category')
+    if category_id is not None:
+        products = products.filter(category_id=category_id)
+
+    if match is None:
+        page = list(products[offset:offset + limit + 1])
+        return page[:limit], len(page) > limit
+
+    sql = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+    params = [match]
+    if category_id is not None:
+        sql += f' AND rowid IN (SELECT id FROM {Product._meta.db_table} WHERE category_id = %s)'
+        params.append(category_id)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} ORDER BY bm25({FTS_TABLE}, {", ".join(map(str, FTS_WEIGHTS))}) LIMIT %s OFFSET %s',
+                       [*params, limit + 1, offset])
+        ids = [row[0] for row in cursor.fetchall()]
+    found = products.in_bulk(ids[:limit])
+    return [found[product_id] for product_id in ids[:limit] if product_id in found], len(ids) > limit
+
+
+def _rows(products):
+    for product_id, name, sku, category in products.values_list('id', 'name', 'sku', 'category__name').iterator():
+        yield product_id, name, sku or '', category or ''
+
+
+def index_products(product_ids=None):
+    """
+    Write the FTS5 rows of the given products (all when None). A no-op
+    outside SQLite.
+    """
+    if not fts_available():
+        return
+    products = Product.objects.all()
+    with connection.cursor() as cursor:
+        if product_ids is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        else:
+            product_ids = list(product_ids)
+            products = products.filter(id__in=product_ids)
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, sku, category) VALUES (%s, %s, %s, %s)',
+                           _rows(products))
+
+
+def unindex_products(product_ids):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(product_id,) for product_id in product_ids])
+
+
+def reindex_category(category_id):
+    """
+    Refresh the category name of a category's products.
+    """
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'UPDATE {FTS_TABLE} SET category = (SELECT name FROM {Category._meta.db_table} '
+                       f'WHERE id = %s) WHERE rowid IN (SELECT id FROM {Product._meta.db_table} '
+                       f'WHERE category_id = %s)', [category_id, category_id])
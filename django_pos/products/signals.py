@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import lookup, search
+from .models import Category, Product
+
+SEARCHED_FIELDS = {'name', 'sku', 'category', 'category_id'}
+# Fields of the cached scan payload; stock is read on every scan
+LOOKUP_FIELDS = SEARCHED_FIELDS | {'barcode', 'price_usd', 'photo'}
+
+
+def invalidate_lookup_cache():
+    # Drop it right away for this worker and again once the change is
+    # visible to the others
+    lookup.invalidate()
+    transaction.on_commit(lookup.invalidate)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    # Stock updates and the like do not touch the search index
+    if update_fields is None or SEARCHED_FIELDS & set(update_fields):
+        search.index_products([instance.pk])
+    if update_fields is None or LOOKUP_FIELDS & set(update_fields):
+        invalidate_lookup_cache()
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.unindex_products([instance.pk])
+    invalidate_lookup_cache()
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'name' in update_fields:
+        search.reindex_category(instance.pk)
+        invalidate_lookup_cache()
@@ -0,0 +1,133 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, When, F, Q, BooleanField, ExpressionWrapper, IntegerField, Max, Sum
+from django.utils import timezone
+
+from .ledger import signed_quantity
+from .models import Product, InventoryMovement, StockSnapshot
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when a reservation would drive the stock of a product below zero
+    and its category does not allow negative stock.
+    """
+
+    def __init__(self, shortages):
+        # shortages: list of (product, requested, available)
+        self.shortages = shortages
+        details = ", ".join(
+            f"{product.name} (requested {requested}, available {available})"
+            for product, requested, available in shortages
+        )
+        super().__init__(f"Insufficient stock: {details}")
+
+
+def reserve_stock(quantities):
+    """
+    Atomically subtract {product_id: quantity} from stock.
+
+    The affected rows are locked with SELECT ... FOR UPDATE in ascending id
+    order, so concurrent registers always acquire locks in the same order and
+    cannot deadlock each other. The whole reservation is rejected with
+    InsufficientStock if any line would leave a product below zero, unless
+    its category allows negative stock. Call it as late as possible inside
+    the sale transaction to keep the lock window short.
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+
+    with transaction.atomic():
+        locked = (Product.objects
+                  .select_for_update(of=('self',))
+                  .select_related('category')
+                  .filter(id__in=quantities.keys())
+                  .order_by('id')
+                  .only('id', 'name', 'stock', 'category__allow_negative_stock'))
+
+        shortages = [
+            (product, quantities[product.id], product.stock)
+            for product in locked
+            if product.stock < quantities[product.id] and not product.category.allow_negative_stock
+        ]
+        if shortages:
+            raise InsufficientStock(shortages)
+
+        # SET expressions see the old stock, so the low-stock flag compares
+        # it with the minimum shifted by the quantity taken
+        Product.objects.filter(id__in=quantities.keys()).update(
+            stock=Case(
+                *[When(id=product_id, then=F('stock') - quantity) for product_id, quantity in quantities.items()],
+                default=F('stock'),
+                output_field=IntegerField(),
+            ),
+            is_low_stock=Case(
+                *[When(id=product_id, then=ExpressionWrapper(Q(stock__lt=F('stock_min') + quantity),
+                                                             output_field=BooleanField()))
+                  for product_id, quantity in quantities.items()],
+                default=F('is_low_stock'),
+                output_field=BooleanField(),
+            ),
+        )
+
+
+def low_stock_flag():
+    """
+    Expression for is_low_stock from a row's current stock and minimum, for
+    bulk updates that change stock_min or set stock outright.
+    """
+    return ExpressionWrapper(Q(stock__lt=F('stock_min')), output_field=BooleanField())
+
+
+def _moment(when):
+    # A date stands for the end of that local day
+    if isinstance(when, datetime):
+        return when
+    return timezone.make_aware(datetime.combine(when + timedelta(days=1), time.min))
+
+
+def stock_as_of(when):
+    """
+    {product_id: stock} for every product with stock history at when (a
+    datetime, or a date meaning the close of that local day).
+
+    Starts from the latest StockSnapshot taken at or before when and adds
+    the movements since then, grouped per product in a single query; without
+    a snapshot it replays the movements from the beginning.
+    """
+    when = _moment(when)
+    base_at = StockSnapshot.objects.filter(taken_at__lte=when).aggregate(latest=Max('taken_at'))['latest']
+    stock = {}
+    movements = InventoryMovement.objects.filter(created_at__lt=when)
+    if base_at is not None:
+        stock = dict(StockSnapshot.objects.filter(taken_at=base_at).values_list('product_id', 'stock'))
+        movements = movements.filter(created_at__gte=base_at)
+    for product_id, delta in (movements.values('product_id').order_by()
+                              .annotate(delta=Sum(signed_quantity())).values_list('product_id', 'delta')):
+        stock[product_id] = stock.get(product_id, 0) + delta
+    return stock
+
+
+def take_stock_snapshot(when=None, batch_size=2000):
+    """
+    Store a StockSnapshot of every product and return its taken_at. Without
+    when it records the current stock; with a past date or datetime it
+    records stock_as_of(when), which also speeds up later lookups.
+    """
+    if when is None:
+        taken_at = timezone.now()
+        stock = dict(Product.objects.values_list('id', 'stock'))
+    else:
+        taken_at = _moment(when)
+        stock = stock_as_of(taken_at)
+    with transaction.atomic():
+        # Re-running a backfill replaces that snapshot
+        StockSnapshot.objects.filter(taken_at=taken_at).delete()
+        StockSnapshot.objects.bulk_create(
+            [StockSnapshot(taken_at=taken_at, product_id=product_id, stock=quantity)
+             for product_id, quantity in stock.items()],
+            batch_size=batch_size,
+        )
+    return taken_at
@@ -1,3 +1,476 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from suppliers.models import Supplier
+from . import lookup
+from .adjustments import import_adjustments, read_rows
+from .models import Category, Product, InventoryMovement, LedgerCheckpoint, StockSnapshot
+from .search import fts_available, search_products
+from .stock import reserve_stock, stock_as_of, take_stock_snapshot
+
+
+class InventoryLedgerTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE', prefix='TC')
+        self.flour = Product.objects.create(name='Flour', description='', status='ACTIVE', category=category)
+        self.rice = Product.objects.create(name='Rice', description='', status='ACTIVE', category=category)
+        now = timezone.now()
+        movements = [(self.flour, 'in', 10), (self.rice, 'in', 5), (self.flour, 'out', 3),
+                     (self.flour, 'adjustment', -2), (self.rice, 'out', 1), (self.flour, 'in', 4)]
+        for minutes, (product, movement_type, quantity) in enumerate(movements):
+            movement = InventoryMovement.objects.create(product=product, movement_type=movement_type,
+                                                        quantity=quantity, user=self.user)
+            # created_at is auto_now_add; spread them out to get a stable order
+            InventoryMovement.objects.filter(id=movement.id).update(created_at=now + timedelta(minutes=minutes))
+
+    def test_pages_carry_running_balances_per_product(self):
+        url = reverse('products:inventory_ledger_api')
+        first = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual([(m['product_name'], m['balance']) for m in first['movements']],
+                         [('Flour', 9), ('Rice', 4), ('Flour', 5)])
+        with self.assertNumQueries(4):  # session, user, page and balances
+            second = self.client.get(url, {'limit': 3, 'cursor': first['next_cursor']}).json()
+        self.assertFalse(second['has_next'])
+        self.assertEqual([(m['product_name'], m['balance']) for m in second['movements']],
+                         [('Flour', 7), ('Rice', 5), ('Flour', 10)])
+
+    def test_filters_keep_the_balance_of_the_whole_ledger(self):
+        data = self.client.get(reverse('products:inventory_ledger_api'),
+                               {'product': self.flour.id, 'type': 'out'}).json()
+        self.assertEqual([(m['quantity'], m['balance']) for m in data['movements']], [(3, 7)])
+        self.assertEqual(self.client.get(reverse('products:inventory_ledger')).status_code, 200)
+
+
+class StockAsOfTestCase(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE', prefix='TC')
+        self.flour = Product.objects.create(name='Flour', description='', status='ACTIVE', category=category)
+        self.rice = Product.objects.create(name='Rice', description='', status='ACTIVE', category=category)
+        self.today = timezone.localdate()
+        for days_ago, product, movement_type, quantity in [(3, self.flour, 'in', 10), (3, self.rice, 'in', 5),
+                                                           (2, self.flour, 'out', 4), (1, self.rice, 'out', 2),
+                                                           (0, self.flour, 'adjustment', -1)]:
+            movement = InventoryMovement.objects.create(product=product, movement_type=movement_type,
+                                                        quantity=quantity)
+            InventoryMovement.objects.filter(id=movement.id).update(
+                created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_snapshot_plus_movements_matches_a_full_replay(self):
+        two_days_ago = self.today - timedelta(days=2)
+        replayed = stock_as_of(two_days_ago)
+        self.assertEqual(replayed, {self.flour.id: 6, self.rice.id: 5})
+
+        take_stock_snapshot(two_days_ago)
+        take_stock_snapshot(two_days_ago)  # re-running replaces it
+        self.assertEqual(StockSnapshot.objects.count(), 2)
+        with self.assertNumQueries(3):
+            self.assertEqual(stock_as_of(self.today), {self.flour.id: 5, self.rice.id: 3})
+        self.assertEqual(stock_as_of(two_days_ago), replayed)
+        self.assertEqual(stock_as_of(self.today - timedelta(days=3)), {self.flour.id: 10, self.rice.id: 5})
+
+
+class LowStockTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE',
+                                                prefix='TC')
+        self.supplier = Supplier.objects.create(name='Acme')
+
+    def product(self, name, stock, stock_min, supplier=None):
+        return Product.objects.create(name=name, description='', status='ACTIVE', category=self.category,
+                                      supplier=supplier, stock=stock, stock_min=stock_min)
+
+    def test_flag_follows_saves_and_stock_reservations(self):
+        flour = self.product('Flour', stock=5, stock_min=3)
+        self.assertFalse(flour.is_low_stock)
+        reserve_stock({flour.id: 3})
+        flour.refresh_from_db()
+        self.assertEqual((flour.stock, flour.is_low_stock), (2, True))
+        reserve_stock({flour.id: -4})
+        flour.refresh_from_db()
+        self.assertEqual((flour.stock, flour.is_low_stock), (6, False))
+        flour.stock_min = 10
+        flour.save(update_fields=['stock_min'])
+        self.assertTrue(Product.objects.get(id=flour.id).is_low_stock)
+
+    def test_reorder_queue_groups_by_supplier(self):
+        self.product('Flour', stock=1, stock_min=4, supplier=self.supplier)
+        self.product('Rice', stock=0, stock_min=2)
+        self.product('Salt', stock=9, stock_min=2, supplier=self.supplier)
+        data = self.client.get(reverse('products:reorder_queue_api')).json()
+        self.assertEqual([(s['name'], [(p['name'], p['suggested_quantity']) for p in s['products']])
+                          for s in data['suppliers']],
+                         [('Acme', [('Flour', 7)]), (None, [('Rice', 4)])])
+        response = self.client.get(reverse('products:inventory_report'))
+        self.assertContains(response, 'Flour')
+        self.assertNotContains(response, 'Salt')
+
+
+class SkuAllocationTestCase(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE',
+                                                prefix='TC')
+
+    def product(self, name, **kwargs):
+        return Product(name=name, description='', status='ACTIVE', category=self.category, **kwargs)
+
+    def test_sequence_is_numeric_past_four_digits(self):
+        Category.objects.filter(id=self.category.id).update(last_sku=9998)
+        skus = [Product.objects.create(name=f'P{i}', description='', status='ACTIVE', category=self.category).sku
+                for i in range(3)]
+        self.assertEqual(skus, ['TC9999', 'TC10000', 'TC10001'])
+
+    def test_bulk_products_get_one_block_per_category(self):
+        other = Category.objects.create(name='Other', description='Desc', status='ACTIVE', prefix='OT')
+        self.product('Existing').save()
+        products = [self.product(f'P{i}') for i in range(3)] + [self.product('Kept', sku='KEEP1')]
+        products.append(Product(name='O', description='', status='ACTIVE', category=other))
+        # categories, then an UPDATE and a SELECT per category
+        with self.assertNumQueries(5):
+            Product.assign_skus(products)
+        self.assertEqual([product.sku for product in products], ['TC0002', 'TC0003', 'TC0004', 'KEEP1', 'OT0001'])
+        Product.objects.bulk_create(products)
+        self.assertEqual(Product.objects.create(name='Next', description='', status='ACTIVE',
+                                                category=self.category).sku, 'TC0005')
+
+
+class ReconcileStockTestCase(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE', prefix='TC')
+        # Created with stock but no movement, as the admin does
+        self.flour = Product.objects.create(name='Flour', description='', status='ACTIVE', category=category,
+                                            stock=10)
+        self.rice = Product.objects.create(name='Rice', description='', status='ACTIVE', category=category)
+        InventoryMovement.objects.create(product=self.rice, movement_type='in', quantity=5)
+        reserve_stock({self.rice.id: -5})
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_stock', *args, '--batch-size', '1', stdout=out)
+        return out.getvalue()
+
+    def test_reports_and_fixes_drift(self):
+        output = self.reconcile('--no-checkpoint')
+        self.assertIn('TC0001 Flour: stock 10, ledger 0 (+10)', output)
+        self.assertNotIn('Rice', output)
+        self.assertFalse(InventoryMovement.objects.filter(movement_type='adjustment').exists())
+
+        self.reconcile('--fix')
+        adjustment = InventoryMovement.objects.get(movement_type='adjustment')
+        self.assertEqual((adjustment.product, adjustment.quantity), (self.flour, 10))
+        self.assertIn('Stock matches the ledger', self.reconcile('--since'))
+
+    def test_incremental_run_starts_from_the_checkpoint(self):
+        self.reconcile('--fix')
+        InventoryMovement.objects.create(product=self.rice, movement_type='out', quantity=2)
+        reserve_stock({self.rice.id: 2})
+        Product.objects.filter(id=self.flour.id).update(stock=7)
+        output = self.reconcile('--since')
+        self.assertIn('TC0001 Flour: stock 7, ledger 10 (-3)', output)
+        self.assertNotIn('Rice', output)
+        self.assertEqual(stock_as_of(timezone.now()), {self.flour.id: 10, self.rice.id: 3})
+
+    def test_stock_snapshots_are_not_checkpoints(self):
+        # A snapshot of Product.stock would hide the drift it was taken with
+        take_stock_snapshot()
+        with self.assertRaises(CommandError):
+            self.reconcile('--since')
+
+    def test_checkpoint_only_settles_movements_old_enough_to_have_committed(self):
+        InventoryMovement.objects.update(created_at=timezone.now() - timedelta(days=1))
+        self.reconcile('--fix')
+        checkpoint = LedgerCheckpoint.objects.get()
+        self.assertTrue(checkpoint.complete)
+        self.assertLess(checkpoint.taken_at, timezone.now() - timedelta(minutes=9))
+        # The adjustment is newer than the checkpoint and read again next time
+        self.assertEqual(dict(checkpoint.balances.values_list('product_id', 'balance')), {self.rice.id: 5})
+
+        # Stamped before this run but committed after it
+        movement = InventoryMovement.objects.create(product=self.rice, movement_type='out', quantity=2)
+        InventoryMovement.objects.filter(id=movement.id).update(created_at=timezone.now() - timedelta(minutes=1))
+        reserve_stock({self.rice.id: 2})
+        self.assertIn('Stock matches the ledger', self.reconcile('--since'))
+        self.assertEqual(LedgerCheckpoint.objects.get().balances.get(product=self.rice).balance, 5)
+
+
+class StockImportTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE', prefix='TC')
+        self.flour = Product.objects.create(name='Flour', description='', status='ACTIVE', category=category,
+                                            stock=5, stock_min=3)
+        self.rice = Product.objects.create(name='Rice', description='', status='ACTIVE', category=category,
+                                           stock=1, stock_min=3)
+
+    def upload(self, content, dry_run=False):
+        data = {'file': SimpleUploadedFile('stock.csv', content.encode())}
+        if dry_run:
+            data['dry_run'] = 'on'
+        return self.client.post(reverse('products:stock_import'), data)
+
+    def test_dry_run_reports_without_saving(self):
+        response = self.upload('sku;quantity;reason\nTC0001;10;Restock\nTC0002;4;\nTC0001;-2;Damaged\n',
+                               dry_run=True)
+        report = response.context['report']
+        self.assertFalse(report['applied'])
+        self.assertEqual(report['rows'], 3)
+        self.assertEqual([(c['sku'], c['before'], c['delta'], c['after']) for c in report['changes']],
+                         [('TC0001', 5, 8, 13), ('TC0002', 1, 4, 5)])
+        self.assertEqual(Product.objects.get(id=self.flour.id).stock, 5)
+        self.assertFalse(InventoryMovement.objects.exists())
+
+    def test_import_is_all_or_nothing(self):
+        report = self.upload('TC0001,-6\nNOPE,1\nTC0002,x\n').context['report']
+        self.assertFalse(report['applied'])
+        self.assertEqual(report['errors'], [(2, 'Unknown SKU NOPE'), (3, "Invalid quantity 'x' for TC0002"),
+                                            (None, 'Flour: stock 5 cannot go down by 6')])
+        self.assertFalse(InventoryMovement.objects.exists())
+
+        report = self.upload('TC0001,-2,Damaged\nTC0002,4\n').context['report']
+        self.assertTrue(report['applied'])
+        self.assertEqual(list(Product.objects.order_by('id').values_list('stock', 'is_low_stock')),
+                         [(3, False), (5, False)])
+        self.assertEqual(list(InventoryMovement.objects.order_by('id')
+                              .values_list('movement_type', 'quantity', 'reason', 'user')),
+                         [('adjustment', -2, 'Damaged', self.user.id), ('adjustment', 4, 'Stock import', self.user.id)])
+
+
+    def test_shortage_is_checked_on_the_net_change_of_the_file(self):
+        # One row per chunk: the -6 alone would leave Flour below zero
+        content = b'TC0001,-6\nTC0002,4\nTC0001,10\n'
+        report = import_adjustments(read_rows(BytesIO(content), 'stock.csv'), chunk_size=1)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual([(c['sku'], c['before'], c['after']) for c in report['changes']],
+                         [('TC0001', 5, 9), ('TC0002', 1, 5)])
+
+        report = import_adjustments(read_rows(BytesIO(b'TC0001,5\nTC0001,-20\n'), 'stock.csv'), chunk_size=1)
+        self.assertEqual(report['errors'], [(None, 'Flour: stock 9 cannot go down by 15')])
+        self.assertEqual(Product.objects.get(id=self.flour.id).stock, 9)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The COPY import path requires PostgreSQL')
+class PostgresStockImportTestCase(TestCase):
+    """
+    The COPY and staging table path import_adjustments() takes on PostgreSQL.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE', prefix='TC')
+        self.flour = Product.objects.create(name='Flour', description='', status='ACTIVE', category=category,
+                                            stock=5, stock_min=3)
+        self.rice = Product.objects.create(name='Rice', description='', status='ACTIVE', category=category,
+                                           stock=1, stock_min=3)
+
+    def run_import(self, content, *args):
+        path = os.path.join(self.directory.name, 'stock.csv')
+        with open(path, 'w') as file:
+            file.write(content)
+        out = StringIO()
+        call_command('import_stock_adjustments', path, *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def stock(self):
+        return list(Product.objects.order_by('id').values_list('stock', 'is_low_stock'))
+
+    def test_applies_through_the_staging_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            output = self.run_import('sku,quantity,reason\nTC0001,-2,Damaged\nTC0002,4\nTC0001,1,Found\n')
+        self.assertTrue(any('CREATE TEMPORARY TABLE stock_adjustment_import' in query['sql']
+                            for query in queries.captured_queries))
+        self.assertIn('Imported 3 adjustments to 2 products', output)
+        self.assertEqual(self.stock(), [(4, False), (5, False)])
+        self.assertEqual(list(InventoryMovement.objects.order_by('id').values_list('movement_type', 'quantity',
+                                                                                    'reason')),
+                         [('adjustment', -2, 'Damaged'), ('adjustment', 4, 'Stock import'),
+                          ('adjustment', 1, 'Found')])
+
+    def test_any_error_rolls_back_everything(self):
+        with self.assertRaisesMessage(CommandError, 'Nothing was imported: 2 errors'):
+            self.run_import('TC0002,4\nNOPE,1\nTC0001,-6\n')
+        self.assertEqual(self.stock(), [(5, False), (1, True)])
+        self.assertFalse(InventoryMovement.objects.exists())
+
+    def test_shortage_is_checked_on_the_net_change_of_the_file(self):
+        content = b'TC0001,-6\nTC0002,4\nTC0001,10\n'
+        report = import_adjustments(read_rows(BytesIO(content), 'stock.csv'), chunk_size=1)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(self.stock(), [(9, False), (5, False)])
+
+        report = import_adjustments(read_rows(BytesIO(b'TC0001,5\nTC0001,-20\n'), 'stock.csv'), chunk_size=1)
+        self.assertEqual(report['errors'], [(None, 'Flour: stock 9 cannot go down by 15')])
+        self.assertEqual(self.stock(), [(9, False), (5, False)])
+
+    def test_dry_run_reports_without_saving(self):
+        output = self.run_import('TC0001,-3\nTC0002,2\n', '--dry-run')
+        self.assertIn('TC0001 Flour: 5 -> 2 (-3)', output)
+        self.assertIn('Dry run, nothing was saved: 2 adjustments to 2 products', output)
+        self.assertEqual(self.stock(), [(5, False), (1, True)])
+        self.assertFalse(InventoryMovement.objects.exists())
+
+
+class CatalogTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.category = Category.objects.create(name='Groceries', description='', status='ACTIVE', prefix='GR')
+        Supplier.objects.create(name='Acme', tax_id='J-1', phone='', email='acme@example.com', address='')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def catalog(self, command, *args):
+        call_command(command, *args, stdout=StringIO())
+
+    def test_products_round_trip_through_jsonl(self):
+        path = self.write('products.csv', 'sku,name,category,supplier,price_usd,stock,stock_min\n'
+                                          'GR0007,Flour,GR,J-1,1.50,4,5\n'
+                                          ',Rice,GR,,2,0,0\n')
+        self.catalog('import_catalog', 'products', path)
+        flour, rice = Product.objects.get(name='Flour'), Product.objects.get(name='Rice')
+        self.assertEqual((flour.sku, flour.supplier.tax_id, flour.stock, flour.is_low_stock), ('GR0007', 'J-1', 4, True))
+        # Explicit SKUs advance the counter, so the next one is not reused
+        self.assertEqual(rice.sku, 'GR0008')
+        self.assertEqual(stock_as_of(timezone.now()), {flour.id: 4})
+
+        exported = os.path.join(self.directory.name, 'products.jsonl')
+        self.catalog('export_catalog', 'products', exported)
+        Product.objects.filter(id=flour.id).update(name='Old', price_usd=9)
+        self.catalog('import_catalog', 'products', exported)
+        flour.refresh_from_db()
+        self.assertEqual((flour.name, flour.price_usd, flour.stock), ('Flour', Decimal('1.50'), 4))
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_partial_update_and_resume_after_a_bad_row(self):
+        Product.objects.create(name='Flour', description='', status='ACTIVE', category=self.category, stock=3)
+        path = self.write('prices.csv', 'sku,price_usd,stock\nGR0001,2.25,50\nGR0002,1,0\nNEW,x,0\n')
+        with self.assertRaisesMessage(CommandError, 'Line 3: missing name, category'):
+            self.catalog('import_catalog', 'products', path, '--batch-size', '1')
+        flour = Product.objects.get()
+        # Stock of existing products is not overwritten
+        self.assertEqual((flour.price_usd, flour.stock), (Decimal('2.25'), 3))
+        with self.assertRaisesMessage(CommandError, 'stopped after line 2'):
+            self.catalog('import_catalog', 'products', path)
+
+        # The fixed file; line 2 was imported already and is skipped
+        self.write('prices.csv', 'sku,name,category,price_usd\nGR0001,Flour,GR,9\nGR0002,Rice,GR,1\nGR0003,Salt,GR,\n')
+        self.catalog('import_catalog', 'products', path, '--resume')
+        self.assertEqual(list(Product.objects.order_by('sku').values_list('sku', 'price_usd')),
+                         [('GR0001', Decimal('2.25')), ('GR0002', Decimal('1')), ('GR0003', Decimal('0'))])
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+
+class ProductSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.user)
+        self.flours = Category.objects.create(name='Harinas', description='', status='ACTIVE', prefix='HA')
+        self.drinks = Category.objects.create(name='Bebidas', description='', status='ACTIVE', prefix='BE')
+        for name, category in [('Harina PAN blanca', self.flours), ('Arroz Mary', self.flours),
+                               ('Malta Polar', self.drinks), ('Refresco de harina', self.drinks)]:
+            Product.objects.create(name=name, description='', status='ACTIVE', category=category)
+
+    def names(self, term, **kwargs):
+        products, _has_next = search_products(term, **kwargs)
+        return [product.name for product in products]
+
+    def test_ranks_name_matches_before_category_matches(self):
+        self.assertTrue(fts_available())
+        self.assertEqual(self.names('harina')[-1], 'Arroz Mary')
+        self.assertEqual(set(self.names('harina')[:2]), {'Harina PAN blanca', 'Refresco de harina'})
+        self.assertEqual(self.names('pan har'), ['Harina PAN blanca'])
+        self.assertEqual(self.names('harina', category_id=self.drinks.id), ['Refresco de harina'])
+        self.assertEqual(self.names('BE0001'), ['Malta Polar'])
+        # Too short for the trigram index: plain substring match
+        self.assertEqual(self.names('ma'), ['Arroz Mary', 'Malta Polar'])
+
+    def test_index_follows_saves_deletes_and_category_renames(self):
+        product = Product.objects.get(name='Malta Polar')
+        product.name = 'Malta Regional'
+        product.save()
+        self.assertEqual(self.names('regional'), ['Malta Regional'])
+        self.assertEqual(self.names('polar'), [])
+        self.drinks.name = 'Gaseosas'
+        self.drinks.save()
+        self.assertEqual(self.names('gaseosas'), ['Malta Regional', 'Refresco de harina'])
+        product.delete()
+        response = self.client.get(reverse('products:product_list_api'), {'search': 'gaseosas'})
+        self.assertEqual([p['name'] for p in response.json()['products']], ['Refresco de harina'])
+
+
+class ProductLookupTestCase(TestCase):
+
+    def setUp(self):
+        override = override_settings(CACHE_STAMP_DIR=tempfile.mkdtemp())
+        override.enable()
+        self.addCleanup(override.disable)
+        lookup.invalidate()
+        self.user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name='Harinas', description='', status='ACTIVE', prefix='HA')
+        self.product = Product.objects.create(name='Harina PAN', description='', status='ACTIVE',
+                                              category=self.category, barcode='7591002000011', stock=12)
+
+    def scan(self, code):
+        return self.client.get(reverse('products:product_lookup_api'), {'code': code})
+
+    def test_resolves_sku_and_barcode_exactly(self):
+        self.assertEqual(self.scan('HA0001').json()['product']['name'], 'Harina PAN')
+        product = self.scan(' 7591002000011 ').json()['product']
+        self.assertEqual((product['id'], product['sku'], product['stock']), (self.product.id, 'HA0001', 12))
+        self.assertEqual(self.scan('HA000').status_code, 404)
+        self.assertEqual(self.scan('').status_code, 404)
+
+    def test_sku_wins_over_another_products_barcode(self):
+        other = Product.objects.create(name='Harina Juana', description='', status='ACTIVE',
+                                       category=self.category, barcode='HA0001')
+        self.assertEqual(lookup.find_product('HA0001')['id'], self.product.id)
+        self.assertEqual(lookup.find_product('HA0001')['id'], self.product.id)
+        self.assertEqual(lookup.find_product(other.sku)['id'], other.id)
+
+    def test_cached_scans_read_only_the_stock(self):
+        lookup.find_product('HA0001')
+        Product.objects.filter(pk=self.product.pk).update(stock=5)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(lookup.find_product('HA0001')['stock'], 5)
+        self.assertEqual(len(queries), 1)
+
+    def test_saving_a_product_or_category_invalidates_the_cache(self):
+        lookup.find_product('7591002000011')
+        self.product.price_usd = Decimal('2.50')
+        self.product.save()
+        self.assertEqual(lookup.find_product('7591002000011')['price_usd'], Decimal('2.50'))
+        self.category.name = 'Harinas y granos'
+        self.category.save()
+        self.assertEqual(lookup.find_product('7591002000011')['category_name'], 'Harinas y granos')
+        self.product.delete()
+        self.assertIsNone(lookup.find_product('7591002000011'))
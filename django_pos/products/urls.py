@@ -8,7 +8,16 @@ urlpatterns = [
     path('', views.products_list_view, name='products_list'),
     # Get products AJAX
     path("api/list", views.product_list_api, name="product_list_api"),
+    # Exact SKU/barcode match for scanners
+    path("api/lookup", views.product_lookup_api, name="product_lookup_api"),
     path('api/categories/', views.category_list_api, name='category_list_api'),
     # Inventory Report
     path("inventory/report", views.inventory_report_view, name="inventory_report"),
+    # Low-stock products grouped by supplier
+    path("inventory/reorder/api/", views.reorder_queue_api, name="reorder_queue_api"),
+    # Inventory movement ledger
+    path("inventory/movements/", views.inventory_ledger_view, name="inventory_ledger"),
+    path("inventory/movements/api/", views.inventory_ledger_api, name="inventory_ledger_api"),
+    # Bulk stock adjustments from a file
+    path("inventory/import/", views.stock_import_view, name="stock_import"),
 ]
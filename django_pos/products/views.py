@@ -1,12 +1,23 @@
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.conf import settings
 from django.contrib import messages
 from .models import Product, Category, InventoryMovement
+from . import adjustments, ledger, lookup, search
 from django.core.paginator import Paginator
 
-from authentication.decorators import admin_required
-from django.db import IntegrityError, models
+from authentication.decorators import admin_required, role_required
+from django.db import IntegrityError
+from django.db.models import F, Q
 from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext as _
 
 
 @login_required(login_url="/accounts/login/")
@@ -29,55 +40,184 @@ def inventory_report_view(request):
     """
     View to generate an inventory report.
     - Shows products with stock below the minimum.
-    - Shows a history of inventory movements.
+    - Links to the inventory movement ledger.
     """
-    low_stock_products = Product.objects.filter(stock__lt=models.F('min_stock'))
-    inventory_movements = InventoryMovement.objects.all().order_by('-created_at')
+    low_stock_products = Product.objects.filter(is_low_stock=True).order_by('name')
 
     context = {
         "active_icon": "reports", # Or a new icon for reports
         "low_stock_products": low_stock_products,
-        "inventory_movements": inventory_movements,
     }
     return render(request, "products/inventory_report.html", context)
 
 
+@login_required(login_url="/accounts/login/")
+def reorder_queue_api(request):
+    """
+    Low-stock products grouped by supplier, each with a suggested order
+    quantity that brings stock back to REORDER_TARGET_FACTOR times its
+    minimum (2 by default).
+    """
+    factor = getattr(settings, 'REORDER_TARGET_FACTOR', 2)
+    products = (Product.objects.filter(is_low_stock=True).select_related('supplier')
+                .order_by(F('supplier__name').asc(nulls_last=True), 'supplier_id', 'name'))
+    suppliers = []
+    for supplier_id, group in groupby(products, key=lambda product: product.supplier_id):
+        group = list(group)
+        supplier = group[0].supplier
+        suppliers.append({
+            'id': supplier_id,
+            'name': supplier.name if supplier else None,
+            'products': [{
+                'id': product.id,
+                'sku': product.sku,
+                'name': product.name,
+                'stock': product.stock,
+                'stock_min': product.stock_min,
+                'suggested_quantity': max(product.stock_min * factor - product.stock, 1),
+            } for product in group],
+        })
+    return JsonResponse({'suppliers': suppliers})
+
+
+@role_required(allowed_roles=['admin'])
+def stock_import_view(request):
+    """
+    Upload a CSV or XLSX file of stock adjustments (SKU, quantity, reason).
+    A dry run, the default, shows the stock change of every product without
+    saving; nothing is saved either while any row fails.
+    """
+    context = {"active_icon": "reports", "dry_run": True}
+    upload = request.FILES.get('file')
+    if request.method == 'POST' and upload:
+        context["dry_run"] = dry_run = request.POST.get('dry_run') == 'on'
+        try:
+            context["report"] = report = adjustments.import_adjustments(
+                adjustments.read_rows(upload, upload.name), user=request.user, dry_run=dry_run)
+        except ImportError:
+            messages.error(request, _("Reading .xlsx files needs openpyxl; upload the sheet as CSV."),
+                           extra_tags="danger")
+        else:
+            if report['applied']:
+                messages.success(request, _("Stock imported."), extra_tags="success")
+    elif request.method == 'POST':
+        messages.error(request, _("Choose a file to import."), extra_tags="danger")
+    return render(request, "products/stock_import.html", context)
+
+
+@login_required(login_url="/accounts/login/")
+def inventory_ledger_view(request):
+    context = {
+        "active_icon": "reports",
+        "ledger_api_url": reverse('products:inventory_ledger_api'),
+        "movement_types": InventoryMovement.MOVEMENT_TYPE_CHOICES,
+        "products": Product.objects.order_by('name').only('id', 'name'),
+        "users": User.objects.filter(is_active=True).order_by('username'),
+    }
+    return render(request, "products/inventory_ledger.html", context)
+
+
+@login_required(login_url="/accounts/login/")
+def inventory_ledger_api(request):
+    """
+    Inventory movements newest first, paginated by keyset on (created_at, id),
+    each with the running stock balance of its product.
+    Filters: product, type, user, start, end (YYYY-MM-DD, inclusive).
+    Pass the returned next_cursor as cursor to get the following page.
+    """
+    movements = InventoryMovement.objects.order_by('-created_at', '-id')
+    try:
+        if request.GET.get('product'):
+            movements = movements.filter(product_id=int(request.GET['product']))
+        if request.GET.get('type'):
+            movements = movements.filter(movement_type=request.GET['type'])
+        if request.GET.get('user'):
+            movements = movements.filter(user_id=int(request.GET['user']))
+        if request.GET.get('start'):
+            start = date.fromisoformat(request.GET['start'])
+            movements = movements.filter(created_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+        if request.GET.get('end'):
+            end = date.fromisoformat(request.GET['end']) + timedelta(days=1)
+            movements = movements.filter(created_at__lt=timezone.make_aware(datetime.combine(end, time.min)))
+        if request.GET.get('cursor'):
+            cursor_date, cursor_id = request.GET['cursor'].rsplit('_', 1)
+            cursor_date = parse_datetime(cursor_date)
+            if cursor_date is None:
+                raise ValueError('Invalid cursor')
+            movements = movements.filter(Q(created_at__lt=cursor_date) | Q(created_at=cursor_date, id__lt=int(cursor_id)))
+        limit = max(1, min(int(request.GET.get('limit', 50)), 200))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    rows = list(movements.values('id', 'created_at', 'product_id', 'product__name', 'product__sku',
+                                 'movement_type', 'quantity', 'user__username', 'reason')[:limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    balances = ledger.running_balances(
+        [row['id'] for row in rows], {row['product_id'] for row in rows},
+        rows[0]['created_at'] if rows else None)
+    type_display = dict(InventoryMovement.MOVEMENT_TYPE_CHOICES)
+    data = [{
+        'id': row['id'],
+        'created_at': row['created_at'].isoformat(),
+        'date_display': timezone.localtime(row['created_at']).strftime('%Y-%m-%d %H:%M'),
+        'product_id': row['product_id'],
+        'product_name': row['product__name'],
+        'sku': row['product__sku'],
+        'movement_type': row['movement_type'],
+        'movement_type_display': str(type_display.get(row['movement_type'], row['movement_type'])),
+        'quantity': row['quantity'],
+        'balance': balances.get(row['id']),
+        'user': row['user__username'],
+        'reason': row['reason'],
+    } for row in rows]
+
+    return JsonResponse({
+        'movements': data,
+        'has_next': has_next,
+        'next_cursor': f"{rows[-1]['created_at'].isoformat()}_{rows[-1]['id']}" if has_next else None,
+    })
+
+
 def product_list_api(request):
-    product_list = Product.objects.select_related('category').all().order_by('name')
-
-    if 'search' in request.GET:
-        search_term = request.GET['search']
-        product_list = product_list.filter(
-            models.Q(name__icontains=search_term) |
-            models.Q(sku__icontains=search_term) |
-            models.Q(category__name__icontains=search_term)
-        )
-
-    if 'category' in request.GET:
-        category_id = request.GET['category']
-        if category_id.isdigit():
+    category_id = request.GET.get('category', '')
+    category_id = int(category_id) if category_id.isdigit() else None
+    search_term = request.GET.get('search', '').strip()
+
+    if search_term:
+        # Ranked by relevance through the search index, see products.search
+        page_number = request.GET.get('page', '1')
+        page_number = int(page_number) if page_number.isdigit() and int(page_number) > 0 else 1
+        products, has_next = search.search_products(search_term, category_id=category_id,
+                                                     offset=(page_number - 1) * 30, limit=30)
+    else:
+        product_list = Product.objects.select_related('category').all().order_by('name')
+        if category_id is not None:
             product_list = product_list.filter(category_id=category_id)
 
-    # Paginate the results
-    paginator = Paginator(product_list, 30) # Show 30 products per page
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+        # Paginate the results
+        paginator = Paginator(product_list, 30) # Show 30 products per page
+        page_number = request.GET.get('page', 1)
+        page_obj = paginator.get_page(page_number)
+        products, has_next = page_obj.object_list, page_obj.has_next()
 
-    data = [{
-        'id': product.id,
-        'name': product.name,
-        'sku': product.sku,
-        'price_usd': product.price_usd,
-        'stock': product.stock,
-        'image_url': product.photo.url if product.photo else '',
-        'category_name': product.category.name if product.category else 'Uncategorized'
-    } for product in page_obj.object_list]
+    data = [lookup.product_payload(product) for product in products]
 
     return JsonResponse({
         'products': data,
-        'has_next': page_obj.has_next()
+        'has_next': has_next
     })
 
+
+def product_lookup_api(request):
+    """
+    Resolve a scanned SKU or barcode to its product, see products.lookup.
+    """
+    product = lookup.find_product(request.GET.get('code', ''))
+    if product is None:
+        return JsonResponse({'status': 'error', 'message': _("No product with that code.")}, status=404)
+    return JsonResponse({'status': 'success', 'product': product})
+
 def category_list_api(request):
     categories = Category.objects.all().order_by('name')
     data = [{
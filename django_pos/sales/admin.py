@@ -1,7 +1,85 @@
-from django.contrib import admin
+import tempfile
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import F
+from django.http import FileResponse
+from django.utils.translation import gettext_lazy as _
+
+from . import rollups
+from .bulk_receipts import render_receipts, write_zip
+from .models import Sale, SaleDetail, CreditPayment, CashClose
+
+
+@admin.register(Sale)
+class SaleAdmin(admin.ModelAdmin):
+    list_display = ('id', 'date_added', 'customer', 'grand_total', 'status')
+    list_filter = ('status', 'date_added')
+    actions = ['download_receipts']
+
+    # Deleting here goes around the POS views, so the rollup is corrected
+    # explicitly
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            deltas = rollups.removal_deltas([obj])
+            super().delete_model(request, obj)
+            rollups.apply_deltas(deltas)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            deltas = rollups.removal_deltas(queryset.select_related('exchange_rate'))
+            super().delete_queryset(request, queryset)
+            rollups.apply_deltas(deltas)
+
+    @admin.action(description=_("Download receipts (ZIP)"))
+    def download_receipts(self, request, queryset):
+        # Rendered inside this request, so the selection is capped; larger
+        # ranges go through the export_receipts command and its worker pool
+        limit = getattr(settings, 'RECEIPT_ADMIN_DOWNLOAD_LIMIT', 100)
+        sale_ids = list(queryset.order_by('date_added', 'id').values_list('id', flat=True)[:limit + 1])
+        if len(sale_ids) > limit:
+            self.message_user(request, _(
+                "Select at most %(limit)d sales, or export larger ranges with the export_receipts command."
+            ) % {'limit': limit}, messages.ERROR)
+            return None
+        archive = tempfile.TemporaryFile()
+        write_zip(render_receipts(sale_ids, workers=1), archive)
+        archive.seek(0)
+        return FileResponse(archive, as_attachment=True, filename='receipts.zip')
 
-from .models import Sale, SaleDetail, CreditPayment
 
-admin.site.register(Sale)
 admin.site.register(SaleDetail)
-admin.site.register(CreditPayment)
+
+
+@admin.register(CreditPayment)
+class CreditPaymentAdmin(admin.ModelAdmin):
+
+    # Deleting here goes around pay_credit_sale_view: the payment leaves the
+    # rollup of the day it was collected, and its IGTF leaves the sale's
+    # igtf_amount, which holds the IGTF of the sale's credit payments
+    def _remove_payments(self, payments):
+        deltas = {}
+        for payment in payments:
+            rollups.credit_payment_deltas(payment.payment_date, payment.amount_usd, payment.igtf_amount, sign=-1,
+                                          deltas=deltas)
+            if payment.igtf_amount:
+                Sale.objects.filter(id=payment.sale_id).update(igtf_amount=F('igtf_amount') - payment.igtf_amount)
+        rollups.apply_deltas(deltas)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            self._remove_payments([obj])
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            payments = list(queryset)
+            super().delete_queryset(request, queryset)
+            self._remove_payments(payments)
+
+
+@admin.register(CashClose)
+class CashCloseAdmin(admin.ModelAdmin):
+    list_display = ('day', 'cashier', 'sales_count', 'total_usd', 'collected_usd', 'closed_by', 'closed_at')
+    list_filter = ('day',)
@@ -0,0 +1,93 @@
+"""
+Bulk rendering of PDF receipts.
+
+render_receipts() renders a list of sales across a pool of worker
+processes. Each worker sets Django up once, loads the receipt template and
+stylesheet, and then writes every PDF through the on-disk receipt store, so
+only file paths travel back to the parent. write_zip() and
+write_merged_pdf() then stream those files into one archive or document.
+
+Workers are started with the "spawn" method so they never share the
+parent's database connections. They are pointed at the parent's database
+and receipt store, which differ from the settings under tests. They unpickle
+the functions below before Django is set up, so this module imports models
+lazily.
+"""
+import multiprocessing
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection
+from django.template.loader import get_template
+from django.utils import translation
+
+
+def _init_worker(language, database_name, cache_dir):
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database_name
+    settings.RECEIPT_CACHE_DIR = cache_dir
+
+    import django
+    django.setup()
+    from . import rendering
+
+    translation.activate(language)
+    get_template(rendering.RECEIPT_TEMPLATE)
+    rendering.stylesheet(rendering.RECEIPT_STYLESHEET)
+
+
+def _render(sale_id):
+    from . import receipts
+
+    return sale_id, receipts.get_receipt(sale_id)
+
+
+def render_receipts(sale_ids, workers=None):
+    """
+    Yield (sale_id, pdf_path) for each sale, in the order given. With
+    workers=1 everything runs in this process.
+    """
+    if workers == 1:
+        for sale_id in sale_ids:
+            yield _render(sale_id)
+        return
+    from . import receipts
+
+    initargs = (translation.get_language(), connection.settings_dict['NAME'], receipts.cache_dir())
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=initargs) as pool:
+        yield from pool.map(_render, sale_ids, chunksize=8)
+
+
+def _track(results, total, progress):
+    started = time.perf_counter()
+    for done, result in enumerate(results, 1):
+        yield result
+        if progress:
+            progress(done, total, time.perf_counter() - started)
+
+
+def write_zip(results, target, total=None, progress=None):
+    """
+    Write each rendered receipt into a ZIP archive at target (a path or a
+    binary file object). PDFs are already compressed, so they are stored.
+    """
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for sale_id, path in _track(results, total, progress):
+            archive.write(path, arcname=f'receipt-{sale_id}.pdf')
+
+
+def write_merged_pdf(results, target, total=None, progress=None):
+    """
+    Append the pages of each rendered receipt to a single PDF at target.
+    Needs pypdf, which keeps the page objects until the document is written;
+    prefer write_zip() for very long ranges.
+    """
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _sale_id, path in _track(results, total, progress):
+        writer.append(path)
+    writer.write(target)
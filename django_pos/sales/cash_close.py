@@ -0,0 +1,172 @@
+"""
+Daily cash close.
+
+compute_cash_close() totals a business day (in the configured TIME_ZONE)
+from the rows that hold the money: one conditional aggregate over the day's
+sales, one grouped query over their Payment rows and one grouped query over
+the CreditPayment rows. The number of queries does not depend on how many
+sales the day had.
+
+close_day() freezes those totals in a CashClose row; the history reads only
+those rows and summarize() adds them up per week or month.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Sale, Payment, CreditPayment, CashClose
+
+ZERO = Decimal('0.00')
+SNAPSHOT_FIELDS = ('sales_count', 'total_usd', 'total_ves', 'change_usd', 'credit_sales_count',
+                   'credit_sales_usd', 'credit_collected_usd', 'credit_collected_ves', 'sales_igtf',
+                   'credit_igtf', 'igtf_total', 'collected_usd', 'collected_ves')
+METHOD_AMOUNTS = ('sales_usd', 'sales_ves', 'credit_usd', 'credit_ves', 'total_usd', 'total_ves')
+PERIODS = {'week': TruncWeek, 'month': TruncMonth}
+
+
+class AlreadyClosed(Exception):
+    pass
+
+
+def day_bounds(day):
+    """
+    The [start, end) datetimes of a local business day.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+def _sum(expression, **kwargs):
+    return Coalesce(Sum(expression, **kwargs), ZERO, output_field=DecimalField(max_digits=16, decimal_places=2))
+
+
+def compute_cash_close(day, user=None):
+    """
+    Totals of a business day, optionally restricted to one cashier's sales
+    and collections:
+
+    - sales: count, USD, VES, IGTF charged at sale time, change given and
+      credit sold;
+    - payment_methods: per method, USD and VES taken on the day's sales and
+      collected on credit sales, and their sum;
+    - credit collected, IGTF collected with it and the overall IGTF.
+    """
+    start, end = day_bounds(day)
+    sales = Sale.objects.filter(date_added__gte=start, date_added__lt=end)
+    if user is not None:
+        sales = sales.filter(user=user)
+    totals = sales.aggregate(
+        sales_count=Count('id'),
+        total_usd=_sum('grand_total'),
+        total_ves=_sum('total_ves'),
+        igtf_amount=_sum('igtf_amount'),
+        change_usd=_sum('amount_change'),
+        credit_sales_count=Count('id', filter=Q(is_credit=True)),
+        credit_sales_usd=_sum('grand_total', filter=Q(is_credit=True)),
+    )
+
+    payments = Payment.objects.filter(sale__date_added__gte=start, sale__date_added__lt=end)
+    if user is not None:
+        payments = payments.filter(sale__user=user)
+    payment_rows = (payments
+                    .values('payment_method_id', 'payment_method__name', 'payment_method__is_foreign_currency')
+                    .annotate(count=Count('id'), usd=_sum('amount'),
+                              ves=_sum(F('amount') * F('sale__exchange_rate__rate_usd_ves')))
+                    .order_by())
+
+    # Credit payments collected today, plus those made at any time on
+    # today's sales: pay_credit_sale_view adds their IGTF to the sale, so it
+    # has to come off the sales' IGTF to get what was charged at sale time.
+    collected = Q(payment_date__gte=start, payment_date__lt=end)
+    on_todays_sales = Q(sale__date_added__gte=start, sale__date_added__lt=end)
+    credit_payments = CreditPayment.objects.filter(collected | on_todays_sales)
+    if user is not None:
+        credit_payments = credit_payments.filter(sale__user=user)
+    credit_rows = (credit_payments
+                   .values('payment_method_id', 'payment_method__name', 'payment_method__is_foreign_currency')
+                   .annotate(count=Count('id', filter=collected),
+                             usd=_sum('amount_usd', filter=collected),
+                             ves=_sum('amount_ves', filter=collected),
+                             igtf=_sum('igtf_amount', filter=collected),
+                             igtf_on_todays_sales=_sum('igtf_amount', filter=on_todays_sales))
+                   .order_by())
+
+    methods = {}
+
+    def method(row):
+        return methods.setdefault(row['payment_method_id'], {
+            'id': row['payment_method_id'],
+            'name': row['payment_method__name'],
+            'is_foreign_currency': row['payment_method__is_foreign_currency'],
+            'sales_count': 0, 'sales_usd': ZERO, 'sales_ves': ZERO,
+            'credit_count': 0, 'credit_usd': ZERO, 'credit_ves': ZERO,
+        })
+
+    for row in payment_rows:
+        entry = method(row)
+        entry.update(sales_count=row['count'], sales_usd=row['usd'], sales_ves=row['ves'].quantize(ZERO))
+
+    credit_collected_usd = credit_collected_ves = credit_igtf = igtf_paid_later = ZERO
+    for row in credit_rows:
+        igtf_paid_later += row['igtf_on_todays_sales']
+        if not row['count']:
+            continue
+        entry = method(row)
+        entry.update(credit_count=row['count'], credit_usd=row['usd'], credit_ves=row['ves'])
+        credit_collected_usd += row['usd']
+        credit_collected_ves += row['ves']
+        credit_igtf += row['igtf']
+
+    payment_methods = sorted(methods.values(), key=lambda entry: entry['name'])
+    for entry in payment_methods:
+        entry['total_usd'] = entry['sales_usd'] + entry['credit_usd']
+        entry['total_ves'] = entry['sales_ves'] + entry['credit_ves']
+
+    sales_igtf = totals.pop('igtf_amount') - igtf_paid_later
+    return {
+        'day': day,
+        **totals,
+        'sales_igtf': sales_igtf,
+        'payment_methods': payment_methods,
+        'credit_collected_usd': credit_collected_usd,
+        'credit_collected_ves': credit_collected_ves,
+        'credit_igtf': credit_igtf,
+        'igtf_total': sales_igtf + credit_igtf,
+        'collected_usd': sum((entry['total_usd'] for entry in payment_methods), ZERO),
+        'collected_ves': sum((entry['total_ves'] for entry in payment_methods), ZERO),
+    }
+
+
+def close_day(day, cashier=None, closed_by=None):
+    """
+    Snapshot the cash close of a day, or of one cashier's shift on that day.
+    Raises AlreadyClosed if it was closed before.
+    """
+    totals = compute_cash_close(day, user=cashier)
+    payment_methods = [
+        {**entry, **{field: str(entry[field]) for field in METHOD_AMOUNTS}}
+        for entry in totals['payment_methods']
+    ]
+    try:
+        with transaction.atomic():
+            return CashClose.objects.create(
+                day=day, cashier=cashier, closed_by=closed_by, payment_methods=payment_methods,
+                **{field: totals[field] for field in SNAPSHOT_FIELDS})
+    except IntegrityError:
+        raise AlreadyClosed(day)
+
+
+def summarize(closes, period='month'):
+    """
+    Sum CashClose snapshots per week or month, newest first. Only whole-day
+    closes are counted so shifts are not added twice.
+    """
+    return list(closes.filter(cashier__isnull=True)
+                .annotate(period=PERIODS[period]('day')).values('period')
+                .annotate(days=Count('id'), **{field: Sum(field) for field in SNAPSHOT_FIELDS})
+                .order_by('-period'))
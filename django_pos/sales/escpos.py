@@ -0,0 +1,182 @@
+"""
+Thermal printer receipts.
+
+render_text() lays a sale out as fixed-width plain text and render_escpos()
+wraps the same layout in ESC/POS commands (initialise, code page, alignment,
+emphasis and paper cut) ready to be sent to the printer as is. Neither
+needs an HTML engine.
+
+Column widths and encoding come from the RECEIPT_PRINTERS setting, a dict of
+named profiles whose keys override DEFAULT_PRINTER, e.g.
+
+    RECEIPT_PRINTERS = {
+        'default': {},
+        '58mm': {'width': 32, 'qty_width': 3, 'price_width': 0, 'total_width': 9},
+    }
+
+A price_width of 0 drops the unit price column on narrow paper.
+"""
+import textwrap
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from core import company as company_settings
+from .models import SaleDetail, Payment
+
+DEFAULT_PRINTER = {
+    # Characters per line in font A: 48 on 80mm paper, 32 on 58mm
+    'width': 48,
+    'qty_width': 4,
+    'price_width': 9,
+    'total_width': 10,
+    'encoding': 'cp858',
+    # ESC t n code page matching encoding (19 is PC858 on Epson-compatible printers)
+    'code_page': 19,
+    'feed_lines': 4,
+    'cut': True,
+}
+
+ESC = b'\x1b'
+GS = b'\x1d'
+INIT = ESC + b'@'
+ALIGN = {'left': ESC + b'a\x00', 'center': ESC + b'a\x01', 'right': ESC + b'a\x02'}
+BOLD_ON = ESC + b'E\x01'
+BOLD_OFF = ESC + b'E\x00'
+PARTIAL_CUT = GS + b'V\x42\x00'
+
+LEFT, CENTER = 'left', 'center'
+
+
+class UnknownPrinter(Exception):
+    pass
+
+
+def printer_profile(name='default'):
+    profiles = getattr(settings, 'RECEIPT_PRINTERS', {'default': {}})
+    if name not in profiles:
+        raise UnknownPrinter(name)
+    return {**DEFAULT_PRINTER, **profiles[name]}
+
+
+def _money(value):
+    return f'{value:.2f}'
+
+
+def _pair(label, value, width):
+    value = str(value)
+    if len(label) + 1 + len(value) > width:
+        value = value[:max(width - len(label) - 1, 0)]
+    return label[:max(width - len(value) - 1, 0)].ljust(width - len(value)) + value
+
+
+def _columns(name, cells, profile):
+    """
+    A product row: the name takes whatever the numeric columns leave over
+    and wraps onto further lines; the cells are right-aligned.
+    """
+    columns = [(cell, w) for cell, w in
+               zip(cells, (profile['qty_width'], profile['price_width'], profile['total_width'])) if w]
+    name_width = profile['width'] - sum(w + 1 for _cell, w in columns)
+    names = textwrap.wrap(name, name_width) or ['']
+    first = names[0].ljust(name_width) + ''.join(' ' + str(cell)[-w:].rjust(w) for cell, w in columns)
+    return [first] + names[1:]
+
+
+def receipt_lines(sale, details=None, payments=None, company=None, profile=None):
+    """
+    The receipt as a list of (alignment, bold, text) lines.
+    """
+    profile = profile or printer_profile()
+    width = profile['width']
+    if details is None:
+        details = SaleDetail.objects.filter(sale=sale).select_related('product').order_by('id')
+    if payments is None:
+        payments = Payment.objects.filter(sale=sale).select_related('payment_method').order_by('id')
+    if company is None:
+        company = company_settings.get_company()
+
+    lines = []
+
+    def add(text='', align=LEFT, bold=False):
+        lines.append((align, bold, text))
+
+    def rule():
+        add('-' * width)
+
+    if company:
+        for text in textwrap.wrap(company.name, width):
+            add(text, CENTER, True)
+        add(textwrap.shorten(_('Tax ID: %s') % company.tax_id, width, placeholder=''), CENTER)
+        for text in textwrap.wrap(company.address, width):
+            add(text, CENTER)
+        rule()
+
+    add(_pair(_('Date:'), timezone.localtime(sale.date_added).strftime('%d/%m/%Y %H:%M'), width))
+    add(_pair(_('Sale ID:'), sale.id, width))
+    add(_pair(_('Customer:'), sale.customer.get_full_name(), width))
+    if sale.user_id:
+        add(_pair(_('Cashier:'), sale.user.username, width))
+    rule()
+
+    for text in _columns(_('Product'), [_('Qty'), _('Price'), _('Total')], profile):
+        add(text, bold=True)
+    for d in details:
+        for text in _columns(d.product.name, [d.quantity, _money(d.price), _money(d.total_detail)], profile):
+            add(text)
+    rule()
+
+    add(_pair(_('Subtotal'), _money(sale.sub_total), width))
+    add(_pair(_('Tax Inclusive') + f' ({sale.tax_percentage}%)', _money(sale.tax_amount), width))
+    add(_pair(_('Grand Total') + ' USD', _money(sale.grand_total), width), bold=True)
+    if sale.igtf_amount:
+        add(_pair('IGTF', _money(sale.igtf_amount), width))
+        add(_pair(_('Total with IGTF'), _money(sale.grand_total + sale.igtf_amount), width), bold=True)
+    if sale.exchange_rate_id:
+        add(_pair(_('Exchange rate'), _money(sale.exchange_rate.rate_usd_ves), width))
+    add(_pair(_('Total') + ' VES', _money(sale.total_ves), width), bold=True)
+
+    if payments:
+        rule()
+        for payment in payments:
+            add(_pair(payment.payment_method.name, _money(payment.amount), width))
+            if payment.reference:
+                add('  ' + _('Ref: %s') % payment.reference)
+    if sale.is_credit:
+        add(_pair(_('Paid'), _money(sale.amount_paid), width))
+        add(_pair(_('Balance'), _money(sale.get_balance()), width), bold=True)
+    else:
+        add(_pair(_('Change'), _money(sale.amount_change), width))
+    rule()
+    add(_('Thank you for your preference!'), CENTER)
+    return lines
+
+
+def render_text(sale, profile=None, **kwargs):
+    profile = profile or printer_profile()
+    width = profile['width']
+    rendered = []
+    for align, _bold, text in receipt_lines(sale, profile=profile, **kwargs):
+        rendered.append(text.center(width).rstrip() if align == CENTER else text)
+    return '\n'.join(rendered) + '\n'
+
+
+def render_escpos(sale, profile=None, **kwargs):
+    profile = profile or printer_profile()
+    out = [INIT, ESC + b't' + bytes([profile['code_page']])]
+    align, bold = None, False
+    for line_align, line_bold, text in receipt_lines(sale, profile=profile, **kwargs):
+        if line_align != align:
+            align = line_align
+            out.append(ALIGN[align])
+        if line_bold != bold:
+            bold = line_bold
+            out.append(BOLD_ON if bold else BOLD_OFF)
+        out.append(text.encode(profile['encoding'], errors='replace') + b'\n')
+    if bold:
+        out.append(BOLD_OFF)
+    out.append(ESC + b'd' + bytes([profile['feed_lines']]))
+    if profile['cut']:
+        out.append(PARTIAL_CUT)
+    return b''.join(out)
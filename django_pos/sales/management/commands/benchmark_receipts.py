@@ -0,0 +1,87 @@
+import os
+import resource
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import get_template
+from weasyprint import HTML, CSS
+
+from core import company as company_settings
+from customers.models import Customer
+from products.models import Category, Product
+from sales.models import Sale, SaleDetail
+from sales.rendering import RECEIPT_TEMPLATE, render_receipt
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_render_receipt(sale, details, company):
+    """
+    The receipt as it was rendered before the rendering service: full
+    Bootstrap parsed and a new font configuration for every document.
+    """
+    html = get_template(RECEIPT_TEMPLATE).render({"sale": sale, "details": details, "company": company})
+    css_url = os.path.join(settings.BASE_DIR, 'sales/static/css/receipt_pdf/bootstrap.min.css')
+    return HTML(string=html).write_pdf(stylesheets=[CSS(css_url)])
+
+
+class Command(BaseCommand):
+    help = ("Report per-receipt PDF render time and peak memory, before and after the rendering "
+            "service. The sale it renders is created in a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--receipts', type=int, default=50, help="Receipts to render per variant.")
+        parser.add_argument('--lines', type=int, default=10, help="Lines on the benchmark sale.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                sale, details = self._seed(options['lines'])
+                company = company_settings.get_company()
+                self._measure("legacy (bootstrap, per-document CSS)", options['receipts'],
+                              lambda: legacy_render_receipt(sale, details, company))
+                self._measure("render_receipt (cached receipt.css)", options['receipts'],
+                              lambda: render_receipt(sale, details, company))
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Seeded data rolled back.")
+
+    def _seed(self, lines):
+        category = Category.objects.create(name='Benchmark', description='Benchmark', status='ACTIVE', prefix='BMK')
+        customer = Customer.objects.create(first_name='Benchmark', last_name='Customer')
+        sale = Sale.objects.create(customer=customer, sub_total=Decimal('10.00') * lines,
+                                   grand_total=Decimal('10.00') * lines)
+        for i in range(lines):
+            product = Product.objects.create(sku=f'BMK{i:06d}', name=f'Benchmark product {i}', description='',
+                                             status='ACTIVE', category=category, price_usd=Decimal('10.00'))
+            SaleDetail.objects.create(sale=sale, product=product, price=Decimal('10.00'), quantity=1,
+                                      total_detail=Decimal('10.00'))
+        details = list(SaleDetail.objects.filter(sale=sale).select_related('product').order_by('id'))
+        return sale, details
+
+    def _measure(self, label, count, render):
+        # The first document pays for imports and caches; keep it out of the timing
+        first_started = time.perf_counter()
+        render()
+        first = time.perf_counter() - first_started
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        for _ in range(count):
+            render()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(
+            f"{label}: first {first * 1000:.1f} ms, then {elapsed / count * 1000:.1f} ms/receipt "
+            f"({count / elapsed:.1f} receipts/s), peak Python heap {peak / 1024 / 1024:.1f} MiB, "
+            f"process max RSS {max_rss / 1024:.1f} MiB"
+        )
@@ -0,0 +1,79 @@
+import os
+import time
+from datetime import datetime, time as day_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from sales.bulk_receipts import render_receipts, write_merged_pdf, write_zip
+from sales.models import Sale
+
+
+class Command(BaseCommand):
+    help = ("Render the PDF receipts of a date range or a list of sales in parallel and write them "
+            "to one ZIP archive or one merged PDF, depending on the output extension.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Path of the .zip or .pdf file to write.")
+        parser.add_argument('--start', help="First day to export (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Last day to export (YYYY-MM-DD).")
+        parser.add_argument('--ids', help="Comma separated sale ids, instead of a date range.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes.")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        extension = os.path.splitext(output)[1].lower()
+        if extension not in ('.zip', '.pdf'):
+            raise CommandError("The output must be a .zip or .pdf file.")
+
+        sale_ids = self._sale_ids(options)
+        if not sale_ids:
+            self.stdout.write("There are no sales to export.")
+            return
+
+        total = len(sale_ids)
+        step = max(total // 20, 1)
+
+        def progress(done, total, elapsed):
+            if done % step == 0 or done == total:
+                self.stdout.write(f"Rendered {done}/{total} receipts ({done / elapsed:.1f} receipts/s)")
+
+        started = time.perf_counter()
+        results = render_receipts(sale_ids, workers=options['workers'])
+        write = write_zip if extension == '.zip' else write_merged_pdf
+        try:
+            write(results, output, total=total, progress=progress)
+        except ImportError:
+            raise CommandError("Merging into one PDF needs pypdf; install it or export to a .zip file.")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {total} receipts to {output} in {elapsed:.1f}s ({total / elapsed:.1f} receipts/s)."))
+
+    def _sale_ids(self, options):
+        if options['ids']:
+            try:
+                requested = [int(value) for value in options['ids'].split(',') if value.strip()]
+            except ValueError:
+                raise CommandError("--ids must be a comma separated list of sale ids.")
+            found = set(Sale.objects.filter(id__in=requested).values_list('id', flat=True))
+            missing = [sale_id for sale_id in requested if sale_id not in found]
+            if missing:
+                raise CommandError(f"Sales not found: {', '.join(map(str, missing))}")
+            return requested
+
+        if not options['start'] or not options['end']:
+            raise CommandError("Pass --ids or both --start and --end.")
+        start, end = self._parse(options['start']), self._parse(options['end'])
+        if start > end:
+            raise CommandError("--start must not be after --end.")
+        return list(Sale.objects.filter(
+            date_added__gte=timezone.make_aware(datetime.combine(start, day_time.min)),
+            date_added__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), day_time.min)),
+        ).order_by('date_added', 'id').values_list('id', flat=True))
+
+    def _parse(self, value):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        return day
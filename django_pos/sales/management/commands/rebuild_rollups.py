@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from sales.models import Sale, CreditPayment
+from sales.rollups import rebuild_rollups, local_date
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups for a date range (all sales by default)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        start = self._parse(options['start']) if options['start'] else self._first_day()
+        end = self._parse(options['end']) if options['end'] else timezone.localdate()
+        if start is None:
+            self.stdout.write("There are no sales to roll up.")
+            return
+        if start > end:
+            raise CommandError("--start must not be after --end.")
+
+        started = time.perf_counter()
+        total_days = (end - start).days + 1
+        done = []
+
+        def progress(day):
+            done.append(day)
+            if len(done) % 30 == 0 or day == end:
+                self.stdout.write(f"Rebuilt {len(done)}/{total_days} days (up to {day})")
+
+        rebuild_rollups(start, end, progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rollups from {start} to {end} in {time.perf_counter() - started:.1f}s."))
+
+    def _parse(self, value):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value}")
+        return day
+
+    def _first_day(self):
+        first_sale = Sale.objects.aggregate(first=Min('date_added'))['first']
+        first_payment = CreditPayment.objects.aggregate(first=Min('payment_date'))['first']
+        candidates = [local_date(value) for value in (first_sale, first_payment) if value]
+        return min(candidates) if candidates else None
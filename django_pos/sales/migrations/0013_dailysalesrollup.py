@@ -0,0 +1,42 @@
+# Generated by Django 4.1.5 on 2026-10-18 12:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_category_allow_negative_stock'),
+        ('sales', '0011_creditpayment_igtf_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('sales_count', models.IntegerField(default=0, verbose_name='sales count')),
+                ('units', models.IntegerField(default=0, verbose_name='units')),
+                ('total_usd', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='total in USD')),
+                ('total_ves', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='total in VEF')),
+                ('igtf_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='IGTF amount')),
+                ('credit_sales_usd', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='credit sales in USD')),
+                ('credit_collected_usd', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='credit collected in USD')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='products.product', verbose_name='product')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'product'), name='unique_daily_rollup_per_product'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('product__isnull', True)), fields=('date',), name='unique_daily_rollup_totals'),
+        ),
+    ]
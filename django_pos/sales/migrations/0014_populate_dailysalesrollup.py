@@ -0,0 +1,28 @@
+from django.db import migrations
+from django.db.models import Min
+from django.utils import timezone
+
+from sales.rollups import rebuild_rollups, local_date
+
+
+def populate_rollups(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    CreditPayment = apps.get_model('sales', 'CreditPayment')
+    firsts = [
+        Sale.objects.aggregate(first=Min('date_added'))['first'],
+        CreditPayment.objects.aggregate(first=Min('payment_date'))['first'],
+    ]
+    firsts = [local_date(first) for first in firsts if first]
+    if firsts:
+        rebuild_rollups(min(firsts), timezone.localdate(), apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0013_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
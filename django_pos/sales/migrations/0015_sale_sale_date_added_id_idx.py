@@ -0,0 +1,17 @@
+# Generated by Django 4.1.5 on 2026-10-18 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0014_populate_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['date_added', 'id'], name='sale_date_added_id_idx'),
+        ),
+    ]
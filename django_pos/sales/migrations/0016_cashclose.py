@@ -0,0 +1,53 @@
+# Generated by Django 4.1.5 on 2026-10-18 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sales', '0015_sale_sale_date_added_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashClose',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('closed_at', models.DateTimeField(auto_now_add=True, verbose_name='closed at')),
+                ('sales_count', models.IntegerField(default=0, verbose_name='sales count')),
+                ('total_usd', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='total in USD')),
+                ('total_ves', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='total in VEF')),
+                ('change_usd', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='change given in USD')),
+                ('credit_sales_count', models.IntegerField(default=0, verbose_name='credit sales count')),
+                ('credit_sales_usd', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='credit sales in USD')),
+                ('credit_collected_usd', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='credit collected in USD')),
+                ('credit_collected_ves', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='credit collected in VEF')),
+                ('sales_igtf', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='IGTF on sales')),
+                ('credit_igtf', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='IGTF on credit payments')),
+                ('igtf_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='IGTF total')),
+                ('collected_usd', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='collected in USD')),
+                ('collected_ves', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='collected in VEF')),
+                ('payment_methods', models.JSONField(default=list, verbose_name='payment methods')),
+                ('cashier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='cash_closes', to=settings.AUTH_USER_MODEL, verbose_name='cashier')),
+                ('closed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='closed by')),
+            ],
+            options={
+                'verbose_name': 'Cash Close',
+                'verbose_name_plural': 'Cash Closes',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cashclose',
+            constraint=models.UniqueConstraint(fields=('day', 'cashier'), name='unique_cash_close_per_cashier'),
+        ),
+        migrations.AddConstraint(
+            model_name='cashclose',
+            constraint=models.UniqueConstraint(condition=models.Q(('cashier__isnull', True)), fields=('day',), name='unique_cash_close_per_day'),
+        ),
+    ]
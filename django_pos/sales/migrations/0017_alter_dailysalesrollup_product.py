@@ -0,0 +1,20 @@
+# Generated by Django 4.1.5 on 2026-10-18 16:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_ledgercheckpoint'),
+        ('sales', '0016_cashclose'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailysalesrollup',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='product'),
+        ),
+    ]
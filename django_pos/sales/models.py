@@ -34,6 +34,10 @@ class Sale(models.Model):
     class Meta:
         verbose_name = _("Sale")
         verbose_name_plural = _("Sales")
+        indexes = [
+            # Keyset pagination of the sales list
+            models.Index(fields=['date_added', 'id'], name='sale_date_added_id_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"Sale ID: {self.id} | Grand Total: {self.grand_total} | Datetime: {self.date_added}"
@@ -93,4 +97,78 @@ class CreditPayment(models.Model):
         verbose_name_plural = _("Credit Payments")
 
     def __str__(self):
-        return f'Payment for sale {self.sale.id} of {self.amount_usd} USD'
\ No newline at end of file
+        return f'Payment for sale {self.sale.id} of {self.amount_usd} USD'
+
+class DailySalesRollup(models.Model):
+    """
+    Pre-aggregated sales totals per day. Rows with a product hold the units and
+    amounts sold of that product; the row without a product holds the totals of
+    the day's sales (count, grand total, IGTF, credit sold and collected).
+    Kept up to date by sales.rollups in the transactions that commit sales and
+    credit payments.
+    """
+    date = models.DateField(_("date"))
+    # A product can only be deleted once no sale line references it, by which
+    # point its rollup rows are zero
+    product = models.ForeignKey(Product, verbose_name=_("product"), on_delete=models.CASCADE, null=True, blank=True)
+    sales_count = models.IntegerField(_("sales count"), default=0)
+    units = models.IntegerField(_("units"), default=0)
+    total_usd = models.DecimalField(_("total in USD"), max_digits=14, decimal_places=2, default=0)
+    total_ves = models.DecimalField(_("total in VEF"), max_digits=16, decimal_places=2, default=0)
+    igtf_amount = models.DecimalField(_("IGTF amount"), max_digits=14, decimal_places=2, default=0)
+    credit_sales_usd = models.DecimalField(_("credit sales in USD"), max_digits=14, decimal_places=2, default=0)
+    credit_collected_usd = models.DecimalField(_("credit collected in USD"), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _("Daily Sales Rollup")
+        verbose_name_plural = _("Daily Sales Rollups")
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_rollup_per_product'),
+            models.UniqueConstraint(fields=['date'], condition=models.Q(product__isnull=True),
+                                    name='unique_daily_rollup_totals'),
+        ]
+
+    def __str__(self):
+        return f'Rollup {self.date} - {self.product_id or "totals"}'
+
+
+class CashClose(models.Model):
+    """
+    Frozen totals of a closed business day (cashier null) or of one
+    cashier's shift on that day, as computed by sales.cash_close when it was
+    closed. Later edits to the underlying sales do not change it.
+    """
+    day = models.DateField(_("day"))
+    cashier = models.ForeignKey(User, verbose_name=_("cashier"), on_delete=models.PROTECT, null=True, blank=True,
+                                related_name='cash_closes')
+    closed_by = models.ForeignKey(User, verbose_name=_("closed by"), on_delete=models.SET_NULL, null=True,
+                                  related_name='+')
+    closed_at = models.DateTimeField(_("closed at"), auto_now_add=True)
+    sales_count = models.IntegerField(_("sales count"), default=0)
+    total_usd = models.DecimalField(_("total in USD"), max_digits=14, decimal_places=2, default=0)
+    total_ves = models.DecimalField(_("total in VEF"), max_digits=16, decimal_places=2, default=0)
+    change_usd = models.DecimalField(_("change given in USD"), max_digits=14, decimal_places=2, default=0)
+    credit_sales_count = models.IntegerField(_("credit sales count"), default=0)
+    credit_sales_usd = models.DecimalField(_("credit sales in USD"), max_digits=14, decimal_places=2, default=0)
+    credit_collected_usd = models.DecimalField(_("credit collected in USD"), max_digits=14, decimal_places=2, default=0)
+    credit_collected_ves = models.DecimalField(_("credit collected in VEF"), max_digits=16, decimal_places=2, default=0)
+    sales_igtf = models.DecimalField(_("IGTF on sales"), max_digits=14, decimal_places=2, default=0)
+    credit_igtf = models.DecimalField(_("IGTF on credit payments"), max_digits=14, decimal_places=2, default=0)
+    igtf_total = models.DecimalField(_("IGTF total"), max_digits=14, decimal_places=2, default=0)
+    collected_usd = models.DecimalField(_("collected in USD"), max_digits=14, decimal_places=2, default=0)
+    collected_ves = models.DecimalField(_("collected in VEF"), max_digits=16, decimal_places=2, default=0)
+    # Per payment method breakdown, amounts as strings
+    payment_methods = models.JSONField(_("payment methods"), default=list)
+
+    class Meta:
+        verbose_name = _("Cash Close")
+        verbose_name_plural = _("Cash Closes")
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'cashier'], name='unique_cash_close_per_cashier'),
+            models.UniqueConstraint(fields=['day'], condition=models.Q(cashier__isnull=True),
+                                    name='unique_cash_close_per_day'),
+        ]
+
+    def __str__(self):
+        return f'Cash close {self.day} - {self.cashier or "day"}'
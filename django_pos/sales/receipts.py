@@ -0,0 +1,122 @@
+"""
+On-disk store of rendered sale receipts.
+
+A receipt is rendered once and saved as
+RECEIPT_CACHE_DIR/<sale id>/<version>.pdf, where the version is a digest of
+everything the template prints (sale, lines, customer, company, language and
+the template and stylesheet themselves). Any change to those produces a new version, so a stale
+PDF is never served; older versions of the same sale are removed when the new
+one is written.
+
+With RECEIPT_PRERENDER enabled, prerender_on_commit() renders the receipt in
+a background thread once the sale has been committed, so the first request
+is served from disk as well.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.template.loader import get_template
+from django.utils import translation
+
+from core import company as company_settings
+from .models import Sale, SaleDetail
+from .rendering import RECEIPT_STYLESHEET, RECEIPT_TEMPLATE, render_receipt
+
+logger = logging.getLogger(__name__)
+
+
+def cache_dir():
+    return getattr(settings, 'RECEIPT_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'receipts'))
+
+
+def _load(sale_id):
+    sale = Sale.objects.select_related('customer').get(id=sale_id)
+    details = list(SaleDetail.objects.filter(sale=sale).select_related('product').order_by('id'))
+    return sale, details
+
+
+def receipt_version(sale, details, company):
+    """
+    Digest of the data printed on the receipt; it changes whenever the sale,
+    its lines, the customer or the company header change.
+    """
+    template = get_template(RECEIPT_TEMPLATE)
+    parts = [
+        translation.get_language() or '',
+        os.stat(template.origin.name).st_mtime_ns,
+        os.stat(RECEIPT_STYLESHEET).st_mtime_ns,
+        sale.date_added.isoformat(), sale.customer.get_full_name(), sale.status,
+        sale.sub_total, sale.tax_percentage, sale.tax_amount, sale.grand_total, sale.amount_change,
+    ]
+    for d in details:
+        parts += [d.product_id, d.product.name, d.quantity, d.price, d.total_detail]
+    if company:
+        parts += [company.name, company.tax_id, company.address]
+    return hashlib.sha256('\x1f'.join(map(str, parts)).encode()).hexdigest()[:32]
+
+
+def receipt_path(sale_id, version):
+    return os.path.join(cache_dir(), str(sale_id), f'{version}.pdf')
+
+
+def _store(path, pdf):
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    # Write next to the final name and rename, so a concurrent reader never
+    # sees a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(pdf)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    for name in os.listdir(folder):
+        stale = os.path.join(folder, name)
+        if stale != path and name.endswith('.pdf'):
+            try:
+                os.unlink(stale)
+            except FileNotFoundError:
+                pass
+
+
+def get_receipt(sale_id):
+    """
+    Return the path of the up-to-date PDF receipt of a sale, rendering and
+    storing it first if needed. Raises Sale.DoesNotExist.
+    """
+    sale, details = _load(sale_id)
+    company = company_settings.get_company()
+    path = receipt_path(sale.id, receipt_version(sale, details, company))
+    if not os.path.exists(path):
+        _store(path, render_receipt(sale, details, company))
+    return path
+
+
+def _prerender(sale_id, language):
+    try:
+        with translation.override(language):
+            get_receipt(sale_id)
+    except Exception:
+        # Best effort: the view renders it on demand anyway
+        logger.exception(f"Could not pre-render the receipt of sale {sale_id}")
+    finally:
+        connection.close()
+
+
+def prerender_on_commit(sale_id):
+    """
+    Render the receipt in the background once the current transaction
+    commits, when RECEIPT_PRERENDER is enabled.
+    """
+    if not getattr(settings, 'RECEIPT_PRERENDER', False):
+        return
+    language = translation.get_language()
+    transaction.on_commit(
+        lambda: threading.Thread(target=_prerender, args=(sale_id, language), daemon=True).start())
@@ -0,0 +1,58 @@
+"""
+PDF rendering of sale receipts.
+
+Stylesheets are parsed once per process and share a single
+FontConfiguration, so each receipt only pays for its own layout. Every PDF
+path (the receipt view, the on-disk receipt store and print_receipt.py)
+goes through render_receipt().
+"""
+import os
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.template.loader import get_template
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+
+from core import company as company_settings
+from .models import SaleDetail
+
+RECEIPT_TEMPLATE = 'sales/sales_receipt_pdf.html'
+RECEIPT_STYLESHEET = os.path.join(settings.BASE_DIR, 'sales/static/css/receipt_pdf/receipt.css')
+
+# WeasyPrint documents sharing a FontConfiguration must not be laid out
+# concurrently
+_render_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def font_config():
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def stylesheet(path):
+    """
+    The parsed stylesheet at path, shared by every document in this process.
+    """
+    return CSS(filename=path, font_config=font_config())
+
+
+def render_receipt(sale, details=None, company=None):
+    """
+    Render the PDF receipt of a sale and return its bytes. details and
+    company are loaded when not given.
+    """
+    if details is None:
+        details = SaleDetail.objects.filter(sale=sale).select_related('product').order_by('id')
+    if company is None:
+        company = company_settings.get_company()
+    html = get_template(RECEIPT_TEMPLATE).render({
+        "sale": sale,
+        "details": details,
+        "company": company,
+    })
+    with _render_lock:
+        return HTML(string=html).write_pdf(stylesheets=[stylesheet(RECEIPT_STYLESHEET)],
+                                           font_config=font_config())
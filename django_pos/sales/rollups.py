@@ -0,0 +1,207 @@
+"""
+Maintenance of DailySalesRollup.
+
+Sale commits, sale edits, credit payments and deletions apply their
+increments with apply_deltas() inside their own transaction, as its last
+write, so the rollup commits or rolls back with the change. The day's totals
+row is shared by every register; it is incremented without being read first
+and only locked from that last write to the commit. rebuild_rollups()
+recomputes any date range from scratch with the same rounding.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.apps import apps as global_apps
+from django.db import connection, transaction
+from django.db.models import Q, Sum, Count
+from django.utils import timezone
+
+ROLLUP_FIELDS = ('sales_count', 'units', 'total_usd', 'total_ves', 'igtf_amount',
+                 'credit_sales_usd', 'credit_collected_usd')
+CENT = Decimal('0.01')
+
+
+def _add(deltas, key, **increments):
+    row = deltas.setdefault(key, {})
+    for field, value in increments.items():
+        row[field] = row.get(field, 0) + value
+
+
+def local_date(value):
+    """
+    The business day a datetime belongs to, in the configured TIME_ZONE.
+    """
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value
+
+
+def line_ves(total_detail, rate):
+    """
+    A sale line in VES, rounded on its own: the one rounding rule of the
+    product rows, live and rebuilt.
+    """
+    return (Decimal(total_detail) * Decimal(rate or 0)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def sale_deltas(sale, lines, sign=1, deltas=None):
+    """
+    Add the contribution of a sale to deltas, keyed by (date, product_id).
+    lines is an iterable of (product_id, quantity, total_detail); use sign=-1
+    to remove a previously recorded sale.
+    """
+    deltas = {} if deltas is None else deltas
+    day = local_date(sale.date_added)
+    rate = sale.exchange_rate.rate_usd_ves if sale.exchange_rate_id else Decimal(0)
+    _add(deltas, (day, None),
+         sales_count=sign,
+         total_usd=sign * Decimal(sale.grand_total),
+         total_ves=sign * Decimal(sale.total_ves),
+         igtf_amount=sign * Decimal(sale.igtf_amount),
+         credit_sales_usd=sign * (Decimal(sale.grand_total) if sale.is_credit else Decimal(0)))
+    for product_id, quantity, total_detail in lines:
+        total_detail = Decimal(total_detail)
+        _add(deltas, (day, product_id),
+             units=sign * int(quantity),
+             total_usd=sign * total_detail,
+             total_ves=sign * line_ves(total_detail, rate))
+    return deltas
+
+
+def credit_payment_deltas(payment_date, amount_usd, igtf_amount, sign=1, deltas=None):
+    deltas = {} if deltas is None else deltas
+    _add(deltas, (local_date(payment_date), None),
+         credit_collected_usd=sign * Decimal(amount_usd).quantize(CENT),
+         igtf_amount=sign * Decimal(igtf_amount).quantize(CENT))
+    return deltas
+
+
+def removal_deltas(sales, deltas=None):
+    """
+    Add what deleting sales takes out of the rollup: each sale on its day and
+    the credit payments deleted with it on the days they were collected.
+    """
+    from .models import CreditPayment, SaleDetail
+
+    deltas = {} if deltas is None else deltas
+    sales = list(sales)
+    lines = {}
+    for sale_id, product_id, quantity, total_detail in SaleDetail.objects.filter(sale__in=sales).values_list(
+            'sale_id', 'product_id', 'quantity', 'total_detail'):
+        lines.setdefault(sale_id, []).append((product_id, quantity, total_detail))
+    later_igtf = {}
+    for payment in CreditPayment.objects.filter(sale__in=sales):
+        credit_payment_deltas(payment.payment_date, payment.amount_usd, payment.igtf_amount, sign=-1, deltas=deltas)
+        later_igtf[payment.sale_id] = later_igtf.get(payment.sale_id, 0) + payment.igtf_amount
+    for sale in sales:
+        # Sale.igtf_amount also holds the IGTF of its credit payments, which
+        # were counted on the days they were collected
+        sale.igtf_amount -= later_igtf.get(sale.id, 0)
+        sale_deltas(sale, lines.get(sale.id, []), sign=-1, deltas=deltas)
+    return deltas
+
+
+def _upsert(cursor, rows, conflict):
+    from .models import DailySalesRollup
+
+    table = DailySalesRollup._meta.db_table
+    fields = [DailySalesRollup._meta.get_field(name) for name in ('date', 'product') + ROLLUP_FIELDS]
+    row_placeholder = f"({', '.join(['%s'] * len(fields))})"
+    increments = ', '.join(f'{field} = {table}.{field} + excluded.{field}' for field in ROLLUP_FIELDS)
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(field.column for field in fields)}) "
+        f"VALUES {', '.join([row_placeholder] * len(rows))} "
+        f"ON CONFLICT {conflict} DO UPDATE SET {increments}",
+        [field.get_db_prep_save(value, connection) for row in rows for field, value in zip(fields, row)])
+
+
+def apply_deltas(deltas):
+    """
+    Increment the rollup rows by deltas ({(date, product_id): {field: value}})
+    with one INSERT ... ON CONFLICT DO UPDATE for the totals rows and one for
+    the product rows, so no row is read and locked ahead of its update. Rows
+    are written in (date, product_id) order, which keeps concurrent calls
+    from deadlocking. Call it as the last write of the transaction that made
+    the change, so the rows stay locked only until that commits.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+
+    totals = []
+    products = []
+    for (day, product_id), delta in sorted(deltas.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+        row = (day, product_id, *(delta.get(field, 0) for field in ROLLUP_FIELDS))
+        (products if product_id is not None else totals).append(row)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if totals:
+            _upsert(cursor, totals, '(date) WHERE product_id IS NULL')
+        if products:
+            _upsert(cursor, products, '(date, product_id)')
+
+
+def rebuild_rollups(start, end, apps=global_apps, batch_size=2000, progress=None):
+    """
+    Recompute the rollup rows of every day from start to end (inclusive).
+    Each day is rebuilt in its own transaction. The day's sale lines are
+    streamed with iterator() and rounded one by one with line_ves(), as the
+    live path does; the totals come from grouped queries. Memory use depends
+    on the number of products sold in a day, not on the size of the range or
+    of the sales tables.
+    """
+    Sale = apps.get_model('sales', 'Sale')
+    SaleDetail = apps.get_model('sales', 'SaleDetail')
+    CreditPayment = apps.get_model('sales', 'CreditPayment')
+    DailySalesRollup = apps.get_model('sales', 'DailySalesRollup')
+
+    day = start
+    while day <= end:
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+        day_end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+        with transaction.atomic():
+            DailySalesRollup.objects.filter(date=day).delete()
+
+            products = {}
+            for product_id, quantity, total_detail, rate in (
+                    SaleDetail.objects
+                    .filter(sale__date_added__gte=day_start, sale__date_added__lt=day_end)
+                    .values_list('product_id', 'quantity', 'total_detail', 'sale__exchange_rate__rate_usd_ves')
+                    .order_by()
+                    .iterator(chunk_size=batch_size)):
+                _add(products, product_id, units=quantity, total_usd=total_detail,
+                     total_ves=line_ves(total_detail, rate))
+            rows = [DailySalesRollup(date=day, product_id=product_id, **totals)
+                    for product_id, totals in products.items()]
+
+            day_sales = Sale.objects.filter(date_added__gte=day_start, date_added__lt=day_end)
+            totals = day_sales.aggregate(
+                sales_count=Count('id'),
+                total_usd=Sum('grand_total'),
+                total_ves=Sum('total_ves'),
+                igtf_amount=Sum('igtf_amount'),
+                credit_sales_usd=Sum('grand_total', filter=Q(is_credit=True)),
+            )
+            # Sale.igtf_amount also accumulates the IGTF of later credit
+            # payments, which are counted on the day they were collected
+            credit_igtf_of_day_sales = CreditPayment.objects.filter(
+                sale__date_added__gte=day_start, sale__date_added__lt=day_end).aggregate(igtf=Sum('igtf_amount'))['igtf']
+            collected = CreditPayment.objects.filter(payment_date__gte=day_start, payment_date__lt=day_end).aggregate(
+                amount_usd=Sum('amount_usd'), igtf=Sum('igtf_amount'))
+
+            igtf_amount = ((totals['igtf_amount'] or 0) - (credit_igtf_of_day_sales or 0) + (collected['igtf'] or 0))
+            if totals['sales_count'] or collected['amount_usd']:
+                rows.append(DailySalesRollup(
+                    date=day,
+                    sales_count=totals['sales_count'],
+                    total_usd=totals['total_usd'] or 0,
+                    total_ves=totals['total_ves'] or 0,
+                    igtf_amount=igtf_amount,
+                    credit_sales_usd=totals['credit_sales_usd'] or 0,
+                    credit_collected_usd=collected['amount_usd'] or 0,
+                ))
+            DailySalesRollup.objects.bulk_create(rows, batch_size=batch_size)
+
+        if progress:
+            progress(day)
+        day += timedelta(days=1)
@@ -1,3 +1,436 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone, translation
 
-# Create your tests here.
+from core.models import Company, ExchangeRate, PaymentMethod
+from customers.models import Customer
+from pos.views import _process_sale_data
+from products.models import Product, Category
+from . import cash_close, escpos, receipts, rollups
+from .models import CashClose, DailySalesRollup, CreditPayment, Payment, Sale, SaleDetail
+
+
+class DailySalesRollupTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.exchange_rate = ExchangeRate.objects.create(date=timezone.now().date(), rate_usd_ves=Decimal('40'))
+        self.payment_method = PaymentMethod.objects.create(name='Cash', is_foreign_currency=True)
+        self.category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE', prefix='TC')
+        self.customer = Customer.objects.create(first_name='Test', last_name='Customer')
+        self.product = Product.objects.create(
+            name='Test Product', description='', status='ACTIVE', category=self.category,
+            price_usd=Decimal('10.00'), stock=100)
+
+    def _sell(self, quantity, is_credit=False, sale_id=None, price=Decimal('10.00')):
+        total = str(price * quantity)
+        request = self.factory.post('/pos/')
+        request.user = self.user
+        _process_sale_data(request, {
+            'customer': self.customer.id, 'sub_total': total, 'grand_total': total, 'tax_amount': '0',
+            'tax_percentage': '0', 'amount_change': '0', 'total_ves': str(Decimal(total) * 40),
+            'igtf_amount': '0', 'is_credit': is_credit,
+            'payments': [] if is_credit else [{'payment_method_id': self.payment_method.id, 'amount': total}],
+            'products': [{'id': self.product.id, 'quantity': quantity, 'price': str(price), 'total_product': total}],
+        }, sale_id=sale_id)
+
+    def _pay(self, sale, amount_usd, igtf_amount):
+        # What pay_credit_sale_view records, without going through its form
+        CreditPayment.objects.create(sale=sale, amount_usd=amount_usd, amount_ves=amount_usd * 40,
+                                     igtf_amount=igtf_amount, exchange_rate=self.exchange_rate,
+                                     payment_method=self.payment_method)
+        Sale.objects.filter(id=sale.id).update(amount_paid=F('amount_paid') + amount_usd,
+                                               igtf_amount=F('igtf_amount') + igtf_amount, status='partially_paid')
+        rollups.apply_deltas(rollups.credit_payment_deltas(timezone.now(), amount_usd, igtf_amount))
+
+    def _assert_matches_a_rebuild(self):
+        today = timezone.localdate()
+        incremental = self._snapshot()
+        call_command('rebuild_rollups', start=str(today - timedelta(days=1)), end=str(today), stdout=StringIO())
+        self.assertEqual(self._snapshot(), incremental)
+
+    def _snapshot(self):
+        return sorted(DailySalesRollup.objects.values_list(
+            'date', 'product_id', 'sales_count', 'units', 'total_usd', 'total_ves', 'igtf_amount',
+            'credit_sales_usd', 'credit_collected_usd'), key=str)
+
+    def test_commits_and_edits_keep_rollups_in_sync_with_a_rebuild(self):
+        self._sell(2)
+        self._sell(3, is_credit=True)
+        credit_sale = Sale.objects.get(is_credit=True)
+        self._sell(1, is_credit=True, sale_id=credit_sale.id)
+
+        today = timezone.localdate()
+        product_row = DailySalesRollup.objects.get(date=today, product=self.product)
+        self.assertEqual(product_row.units, 3)
+        self.assertEqual(product_row.total_ves, Decimal('1200.00'))
+        totals_row = DailySalesRollup.objects.get(date=today, product__isnull=True)
+        self.assertEqual(totals_row.sales_count, 2)
+        self.assertEqual(totals_row.credit_sales_usd, Decimal('10.00'))
+
+        incremental = self._snapshot()
+        call_command('rebuild_rollups', start=str(today - timedelta(days=1)), end=str(today), stdout=StringIO())
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_rollup_commits_or_rolls_back_with_the_sale(self):
+        with CaptureQueriesContext(connection) as queries:
+            self._sell(1)
+        rollup_writes = [i for i, q in enumerate(queries.captured_queries)
+                         if q['sql'].startswith('INSERT INTO ' + DailySalesRollup._meta.db_table)]
+        self.assertTrue(rollup_writes)
+        # Written last, just before the sale's transaction is released
+        self.assertFalse([q for q in queries.captured_queries[rollup_writes[-1] + 1:]
+                          if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
+        with self.assertRaises(Exception):
+            self._sell(1000)
+        self.assertEqual(DailySalesRollup.objects.get(product__isnull=True).sales_count, 1)
+
+    def test_editing_a_partly_paid_credit_sale_matches_a_rebuild(self):
+        self._sell(3, is_credit=True)
+        sale = Sale.objects.get()
+        self._pay(sale, Decimal('10.00'), Decimal('0.30'))
+        self._sell(2, is_credit=True, sale_id=sale.id)
+
+        totals_row = DailySalesRollup.objects.get(date=timezone.localdate(), product__isnull=True)
+        self.assertEqual((totals_row.credit_sales_usd, totals_row.igtf_amount), (Decimal('20.00'), Decimal('0.30')))
+        self._assert_matches_a_rebuild()
+
+    def test_lines_are_rounded_alike_live_and_rebuilt(self):
+        self.exchange_rate.rate_usd_ves = Decimal('40.50')
+        self.exchange_rate.save()
+        self._sell(1, price=Decimal('10.01'))
+        self._sell(1, price=Decimal('10.01'))
+
+        # 405.405 rounds to 405.41 on each line
+        product_row = DailySalesRollup.objects.get(product=self.product)
+        self.assertEqual(product_row.total_ves, Decimal('810.82'))
+        self._assert_matches_a_rebuild()
+
+    def test_admin_deletion_takes_sales_out_of_the_rollup(self):
+        self._sell(2)
+        self._sell(3, is_credit=True)
+        credit_sale = Sale.objects.get(is_credit=True)
+        CreditPayment.objects.create(sale=credit_sale, amount_usd=Decimal('10.00'), amount_ves=Decimal('400.00'),
+                                     igtf_amount=Decimal('0.30'), exchange_rate=self.exchange_rate,
+                                     payment_method=self.payment_method)
+        Sale.objects.filter(id=credit_sale.id).update(igtf_amount=Decimal('0.30'))
+        # Brings the credit payment into the rollup
+        today = timezone.localdate()
+        call_command('rebuild_rollups', start=str(today), end=str(today), stdout=StringIO())
+
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.client.post(reverse('admin:sales_sale_changelist'),
+                         {'action': 'delete_selected', '_selected_action': [credit_sale.id], 'post': 'yes'})
+        self.assertEqual(Sale.objects.count(), 1)
+
+        incremental = self._snapshot()
+        call_command('rebuild_rollups', start=str(today), end=str(today), stdout=StringIO())
+        self.assertEqual(self._snapshot(), incremental)
+        totals_row = DailySalesRollup.objects.get(date=today, product__isnull=True)
+        self.assertEqual((totals_row.sales_count, totals_row.credit_collected_usd), (1, Decimal('0.00')))
+
+    def test_admin_deletion_takes_credit_payments_out_of_the_rollup(self):
+        self._sell(3, is_credit=True)
+        sale = Sale.objects.get()
+        self._pay(sale, Decimal('10.00'), Decimal('0.30'))
+        self._pay(sale, Decimal('5.00'), Decimal('0.15'))
+
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        first = CreditPayment.objects.order_by('id').first()
+        self.client.post(reverse('admin:sales_creditpayment_changelist'),
+                         {'action': 'delete_selected', '_selected_action': [first.id], 'post': 'yes'})
+        self.assertEqual(CreditPayment.objects.count(), 1)
+
+        totals_row = DailySalesRollup.objects.get(date=timezone.localdate(), product__isnull=True)
+        self.assertEqual((totals_row.credit_collected_usd, totals_row.igtf_amount), (Decimal('5.00'), Decimal('0.15')))
+        self._assert_matches_a_rebuild()
+
+    def test_deleted_sales_do_not_keep_their_product_from_being_deleted(self):
+        self._sell(2)
+        Sale.objects.get().delete()
+        self.product.delete()
+        self.assertFalse(DailySalesRollup.objects.filter(product__isnull=False).exists())
+
+    def test_rebuild_counts_credit_payments_on_the_day_they_were_collected(self):
+        self._sell(3, is_credit=True)
+        sale = Sale.objects.get()
+        yesterday = timezone.localdate() - timedelta(days=1)
+        Sale.objects.filter(id=sale.id).update(date_added=timezone.now() - timedelta(days=1))
+        CreditPayment.objects.create(sale=sale, amount_usd=Decimal('30.00'), amount_ves=Decimal('1200.00'),
+                                     igtf_amount=Decimal('0.90'), exchange_rate=self.exchange_rate,
+                                     payment_method=self.payment_method)
+        Sale.objects.filter(id=sale.id).update(igtf_amount=Decimal('0.90'))
+
+        call_command('rebuild_rollups', start=str(yesterday), end=str(timezone.localdate()), stdout=StringIO())
+
+        sale_day = DailySalesRollup.objects.get(date=yesterday, product__isnull=True)
+        self.assertEqual(sale_day.credit_sales_usd, Decimal('30.00'))
+        self.assertEqual(sale_day.igtf_amount, Decimal('0.00'))
+        collection_day = DailySalesRollup.objects.get(date=timezone.localdate(), product__isnull=True)
+        self.assertEqual(collection_day.credit_collected_usd, Decimal('30.00'))
+        self.assertEqual(collection_day.igtf_amount, Decimal('0.90'))
+
+
+class SalesListApiTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(self.user)
+        self.customer = Customer.objects.create(first_name='Ana', last_name='Perez')
+        category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE', prefix='TC')
+        product = Product.objects.create(name='Test Product', description='', status='ACTIVE', category=category)
+        now = timezone.now()
+        self.sales = []
+        for i in range(5):
+            sale = Sale.objects.create(customer=self.customer, user=self.user, grand_total=Decimal('10.00'),
+                                       status='completed' if i % 2 else 'pending_credit',
+                                       date_added=now - timedelta(hours=i))
+            SaleDetail.objects.create(sale=sale, product=product, price=Decimal('5.00'), quantity=i + 1,
+                                      total_detail=Decimal('10.00'))
+            self.sales.append(sale)
+
+    def test_pages_follow_the_keyset_cursor(self):
+        url = reverse('sales:sales_list_api')
+        first = self.client.get(url, {'limit': 3}).json()
+        self.assertTrue(first['has_next'])
+        self.assertEqual([s['id'] for s in first['sales']], [s.id for s in self.sales[:3]])
+        self.assertEqual(first['sales'][0]['customer_name'], 'Ana Perez')
+        self.assertEqual(first['sales'][2]['items'], 3)
+
+        with self.assertNumQueries(3):  # session, user and the page itself
+            second = self.client.get(url, {'limit': 3, 'cursor': first['next_cursor']}).json()
+        self.assertFalse(second['has_next'])
+        self.assertEqual([s['id'] for s in second['sales']], [s.id for s in self.sales[3:]])
+
+    def test_filters_by_status(self):
+        data = self.client.get(reverse('sales:sales_list_api'), {'status': 'completed'}).json()
+        self.assertEqual({s['status'] for s in data['sales']}, {'completed'})
+        self.assertEqual(len(data['sales']), 2)
+
+
+class ReceiptStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        user = User.objects.create_superuser(username='admin', password='password')
+        self.client.force_login(user)
+        customer = Customer.objects.create(first_name='Ana', last_name='Perez')
+        self.sale = Sale.objects.create(customer=customer, user=user, grand_total=Decimal('10.00'))
+
+    def test_receipt_is_rendered_once_and_rerendered_when_the_sale_changes(self):
+        with override_settings(RECEIPT_CACHE_DIR=self.cache_dir):
+            response = self.client.get(reverse('sales:sales_receipt_pdf', args=[self.sale.id]))
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            path = receipts.get_receipt(self.sale.id)
+            mtime = os.stat(path).st_mtime_ns
+            self.assertEqual(receipts.get_receipt(self.sale.id), path)
+            self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+            Sale.objects.filter(id=self.sale.id).update(grand_total=Decimal('12.00'))
+            new_path = receipts.get_receipt(self.sale.id)
+            self.assertNotEqual(new_path, path)
+            self.assertEqual(os.listdir(os.path.dirname(new_path)), [os.path.basename(new_path)])
+
+    def test_export_writes_one_pdf_per_sale_into_a_zip(self):
+        output = os.path.join(self.cache_dir, 'receipts.zip')
+        with override_settings(RECEIPT_CACHE_DIR=self.cache_dir):
+            call_command('export_receipts', output, ids=str(self.sale.id), workers=1, stdout=StringIO())
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), [f'receipt-{self.sale.id}.pdf'])
+
+    def test_admin_download_is_capped(self):
+        other = Sale.objects.create(customer=self.sale.customer, user=self.sale.user, grand_total=Decimal('5.00'))
+        action = {'action': 'download_receipts', '_selected_action': [self.sale.id, other.id]}
+        with override_settings(RECEIPT_CACHE_DIR=self.cache_dir, RECEIPT_ADMIN_DOWNLOAD_LIMIT=1):
+            response = self.client.post(reverse('admin:sales_sale_changelist'), action, follow=True)
+            self.assertIn('export_receipts', response.content.decode())
+            action['_selected_action'] = [other.id]
+            response = self.client.post(reverse('admin:sales_sale_changelist'), action)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="receipts.zip"')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), [f'receipt-{other.id}.pdf'])
+
+    def test_failed_prerender_is_logged(self):
+        # Run on its own thread and connection, as prerender_on_commit() does
+        with override_settings(RECEIPT_CACHE_DIR=self.cache_dir), self.assertLogs('sales.receipts', 'ERROR') as logs:
+            thread = threading.Thread(target=receipts._prerender, args=(self.sale.id + 1, 'en'))
+            thread.start()
+            thread.join()
+        self.assertIn(f'sale {self.sale.id + 1}', logs.output[0])
+
+    def test_missing_sale_is_a_404(self):
+        with override_settings(RECEIPT_CACHE_DIR=self.cache_dir):
+            response = self.client.get(reverse('sales:sales_receipt_pdf', args=[self.sale.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ParallelReceiptExportTestCase(TransactionTestCase):
+
+    def setUp(self):
+        # Only known once the test database exists
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Worker processes cannot open an in-memory test database")
+
+    def test_workers_render_from_the_parents_database_and_store(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        customer = Customer.objects.create(first_name='Ana', last_name='Perez')
+        sale_ids = [Sale.objects.create(customer=customer, grand_total=Decimal(i)).id for i in range(1, 6)]
+        output = os.path.join(cache_dir, 'receipts.zip')
+        with override_settings(RECEIPT_CACHE_DIR=cache_dir):
+            call_command('export_receipts', output, ids=','.join(map(str, sale_ids)), workers=2, stdout=StringIO())
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), [f'receipt-{sale_id}.pdf' for sale_id in sale_ids])
+            self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in archive.namelist()))
+        self.assertEqual(sorted(os.listdir(cache_dir)), sorted([*map(str, sale_ids), 'receipts.zip']))
+
+
+@override_settings(RECEIPT_PRINTERS={
+    'default': {},
+    '58mm': {'width': 32, 'qty_width': 3, 'price_width': 0, 'total_width': 9},
+})
+class ThermalReceiptTestCase(TestCase):
+    """
+    Compares the thermal receipts against the golden files in sales/testdata.
+    After an intentional layout change, regenerate them with
+    UPDATE_GOLDEN_RECEIPTS=1 and review the diff.
+    """
+    golden_dir = os.path.join(os.path.dirname(__file__), 'testdata')
+
+    def setUp(self):
+        user = User.objects.create_superuser(username='cashier1', password='password')
+        self.client.force_login(user)
+        customer = Customer.objects.create(first_name='Ana', last_name='Pérez')
+        category = Category.objects.create(name='Test Category', description='Desc', status='ACTIVE', prefix='TC')
+        rate = ExchangeRate.objects.create(date=datetime(2024, 3, 5).date(), rate_usd_ves=Decimal('36.50'))
+        self.sale = Sale.objects.create(
+            id=1001, customer=customer, user=user, exchange_rate=rate,
+            date_added=timezone.make_aware(datetime(2024, 3, 5, 14, 30)),
+            sub_total=Decimal('25.00'), tax_percentage=Decimal('16.00'), tax_amount=Decimal('3.45'),
+            grand_total=Decimal('25.00'), igtf_amount=Decimal('0.60'), total_ves=Decimal('934.40'),
+            amount_paid=Decimal('25.60'), amount_change=Decimal('0.00'))
+        for name, quantity, price in [('Harina de maíz precocida 1kg', 2, '5.00'),
+                                      ('Café molido', 1, '15.00')]:
+            product = Product.objects.create(name=name, description='', status='ACTIVE', category=category)
+            SaleDetail.objects.create(sale=self.sale, product=product, price=Decimal(price), quantity=quantity,
+                                      total_detail=Decimal(price) * quantity)
+        Payment.objects.create(sale=self.sale, amount=Decimal('20.00'), reference='8841',
+                               payment_method=PaymentMethod.objects.create(name='Zelle', is_foreign_currency=True))
+        Payment.objects.create(sale=self.sale, amount=Decimal('5.60'),
+                               payment_method=PaymentMethod.objects.create(name='Efectivo USD'))
+        self.company = Company(name='Comercial Ñandú, C.A.', tax_id='J-12345678-9',
+                               address='Av. Principal, Local 4, Caracas')
+
+    def assertGolden(self, name, data):
+        path = os.path.join(self.golden_dir, name)
+        if os.environ.get('UPDATE_GOLDEN_RECEIPTS'):
+            with open(path, 'wb') as f:
+                f.write(data)
+        with open(path, 'rb') as f:
+            self.assertEqual(data, f.read())
+
+    def test_escpos_80mm(self):
+        with translation.override('en'):
+            data = escpos.render_escpos(self.sale, company=self.company)
+        self.assertGolden('receipt_80mm.bin', data)
+
+    def test_text_58mm(self):
+        with translation.override('en'):
+            text = escpos.render_text(self.sale, escpos.printer_profile('58mm'), company=self.company)
+        self.assertGolden('receipt_58mm.txt', text.encode())
+
+    def test_view_rejects_unknown_printers(self):
+        url = reverse('sales:sales_receipt_escpos', args=[self.sale.id])
+        self.assertEqual(self.client.get(url, {'printer': 'laser'}).status_code, 400)
+        response = self.client.get(url, {'format': 'text'})
+        self.assertContains(response, 'Café molido')
+
+
+class CashCloseTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='admin', password='password')
+        self.customer = Customer.objects.create(first_name='Ana', last_name='Perez')
+        self.rate = ExchangeRate.objects.create(date=timezone.localdate(), rate_usd_ves=Decimal('40.00'))
+        self.cash = PaymentMethod.objects.create(name='Cash USD', is_foreign_currency=True)
+        self.mobile = PaymentMethod.objects.create(name='Pago Movil')
+        self.day = timezone.localdate()
+
+    def sale(self, total, when=None, **kwargs):
+        return Sale.objects.create(customer=self.customer, user=self.user, exchange_rate=self.rate,
+                                   grand_total=Decimal(total), total_ves=Decimal(total) * 40,
+                                   date_added=when or timezone.now(), **kwargs)
+
+    def test_totals_come_from_payments_and_credit_payments_in_a_fixed_number_of_queries(self):
+        for _ in range(5):
+            Payment.objects.create(sale=self.sale('10.00'), payment_method=self.cash, amount=Decimal('10.00'))
+        sale = self.sale('4.00', igtf_amount=Decimal('0.12'))
+        Payment.objects.create(sale=sale, payment_method=self.mobile, amount=Decimal('4.00'))
+        # A credit sale from yesterday, partly collected today with IGTF, and
+        # one from today collected right away
+        old_credit = self.sale('20.00', when=timezone.now() - timedelta(days=1), is_credit=True,
+                               status='pending_credit')
+        CreditPayment.objects.create(sale=old_credit, amount_usd=Decimal('8.00'), amount_ves=Decimal('320.00'),
+                                     igtf_amount=Decimal('0.24'), exchange_rate=self.rate, payment_method=self.cash)
+        new_credit = self.sale('6.00', is_credit=True, status='partially_paid', igtf_amount=Decimal('0.06'))
+        CreditPayment.objects.create(sale=new_credit, amount_usd=Decimal('2.00'), amount_ves=Decimal('80.00'),
+                                     igtf_amount=Decimal('0.06'), exchange_rate=self.rate, payment_method=self.mobile)
+
+        with self.assertNumQueries(3):
+            close = cash_close.compute_cash_close(self.day)
+
+        self.assertEqual(close['sales_count'], 7)
+        self.assertEqual(close['total_usd'], Decimal('60.00'))
+        self.assertEqual(close['credit_sales_usd'], Decimal('6.00'))
+        self.assertEqual(close['credit_collected_usd'], Decimal('10.00'))
+        # 0.12 charged on a sale plus the 0.30 collected with credit payments
+        self.assertEqual(close['sales_igtf'], Decimal('0.12'))
+        self.assertEqual(close['igtf_total'], Decimal('0.42'))
+        by_name = {entry['name']: entry for entry in close['payment_methods']}
+        self.assertEqual(by_name['Cash USD']['total_usd'], Decimal('58.00'))
+        self.assertEqual(by_name['Cash USD']['sales_ves'], Decimal('2000.00'))
+        self.assertEqual(by_name['Pago Movil']['total_ves'], Decimal('240.00'))
+        self.assertEqual(close['collected_usd'], Decimal('64.00'))
+
+    def test_closed_day_keeps_its_totals_and_feeds_the_history(self):
+        self.client.force_login(self.user)
+        sale = self.sale('10.00')
+        url = reverse('sales:close_cash')
+        self.client.post(url, {'date': self.day.isoformat()})
+        self.client.post(url, {'date': self.day.isoformat()})
+        self.assertEqual(CashClose.objects.count(), 1)
+
+        Sale.objects.filter(id=sale.id).update(grand_total=Decimal('99.00'))
+        response = self.client.get(reverse('sales:daily_cash_close_report'), {'date': self.day.isoformat()})
+        self.assertEqual(response.context['cash_close'].total_usd, Decimal('10.00'))
+
+        with self.assertNumQueries(4):  # session, user and the two snapshot reads
+            response = self.client.get(reverse('sales:cash_close_history'), {'period': 'week'})
+        self.assertEqual(response.context['summary'][0]['total_usd'], Decimal('10.00'))
+
+    def test_report_lists_the_days_sales_with_their_items(self):
+        self.client.force_login(self.user)
+        self.sale('10.00')
+        response = self.client.get(reverse('sales:daily_cash_close_report'), {'date': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cash_close']['sales_count'], 1)
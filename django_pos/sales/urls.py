@@ -6,16 +6,23 @@ app_name = "sales"
 urlpatterns = [
     # List sales
     path('', views.sales_list_view, name='sales_list'),
+    path('api/list/', views.sales_list_api, name='sales_list_api'),
     # Details sale
     path('details/<int:sale_id>/',
          views.sales_details_view, name='sales_details'),
     # Sale receipt PDF
     path("pdf/<str:sale_id>",
          views.receipt_pdf_view, name="sales_receipt_pdf"),
+    # Sale receipt for thermal printers (ESC/POS or plain text)
+    path("escpos/<int:sale_id>/",
+         views.receipt_escpos_view, name="sales_receipt_escpos"),
     # Pending sales
     path('pending/', views.pending_sales_list_view, name='pending_sales_list'),
     # Pay credit sale
     path('pay_credit/<str:sale_id>/', views.pay_credit_sale_view, name='pay_credit_sale'),
     # Daily cash close report
     path('daily_cash_close_report/', views.daily_cash_close_report_view, name='daily_cash_close_report'),
+    # Cash close snapshots
+    path('cash_close/close/', views.close_cash_view, name='close_cash'),
+    path('cash_close/history/', views.cash_close_history_view, name='cash_close_history'),
 ]
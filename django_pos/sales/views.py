@@ -1,38 +1,118 @@
-import os
 import json
-from datetime import date, datetime, time
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.db.models import Sum, F
-from django.db.models.functions import Coalesce
-from django.http import HttpResponse
+from django.contrib.auth.models import User
+from django.db.models import Sum, F, Q, OuterRef, Subquery, Value, IntegerField
+from django.db.models.functions import Coalesce, Concat
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, redirect
-from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.translation import gettext as _
-from django_pos import settings
-from weasyprint import HTML, CSS
+from django.views.decorators.http import require_POST
 
 from authentication.decorators import role_required, admin_required
-from core.models import PaymentMethod, Company, ExchangeRate
-from .models import Sale, SaleDetail, CreditPayment
+from core import company as company_settings, rates
+from core.models import PaymentMethod, ExchangeRate
+from . import cash_close, escpos, receipts, rollups
+from .models import Sale, SaleDetail, CreditPayment, CashClose
 
 
 def is_ajax(request):
     return request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest'
 
+def items_count():
+    """
+    Annotation with the number of items of each sale, computed by the
+    database only for the rows being returned.
+    """
+    return Coalesce(Subquery(
+        SaleDetail.objects.filter(sale=OuterRef('pk')).order_by().values('sale')
+        .annotate(total=Sum('quantity')).values('total')
+    ), 0, output_field=IntegerField())
+
+
+def _local_day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
 @role_required(allowed_roles=['admin', 'cashier'])
 @login_required(login_url="/accounts/login/")
 def sales_list_view(request):
     context = {
         "active_icon": "sales",
-        "sales": Sale.objects.all().order_by('-date_added')
+        "sales_list_api_url": reverse('sales:sales_list_api'),
+        "status_choices": Sale.SALE_STATUS_CHOICES,
+        "cashiers": User.objects.filter(is_active=True).order_by('username'),
     }
     return render(request, "sales/sales.html", context=context)
 
 
+@role_required(allowed_roles=['admin', 'cashier'])
+@login_required(login_url="/accounts/login/")
+def sales_list_api(request):
+    """
+    Sales newest first, paginated by keyset on (date_added, id).
+    Filters: start, end (YYYY-MM-DD, inclusive), status, customer, user.
+    Pass the returned next_cursor as cursor to get the following page.
+    """
+    sales = Sale.objects.order_by('-date_added', '-id')
+    try:
+        if request.GET.get('start'):
+            sales = sales.filter(date_added__gte=_local_day_start(date.fromisoformat(request.GET['start'])))
+        if request.GET.get('end'):
+            end = date.fromisoformat(request.GET['end']) + timedelta(days=1)
+            sales = sales.filter(date_added__lt=_local_day_start(end))
+        if request.GET.get('status'):
+            sales = sales.filter(status=request.GET['status'])
+        if request.GET.get('customer'):
+            sales = sales.filter(customer_id=int(request.GET['customer']))
+        if request.GET.get('user'):
+            sales = sales.filter(user_id=int(request.GET['user']))
+        if request.GET.get('cursor'):
+            cursor_date, cursor_id = request.GET['cursor'].rsplit('_', 1)
+            cursor_date = parse_datetime(cursor_date)
+            if cursor_date is None:
+                raise ValueError('Invalid cursor')
+            sales = sales.filter(Q(date_added__lt=cursor_date) | Q(date_added=cursor_date, id__lt=int(cursor_id)))
+        limit = max(1, min(int(request.GET.get('limit', 50)), 200))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    rows = list(sales.annotate(
+        items=items_count(),
+        customer_name=Concat('customer__first_name', Value(' '), 'customer__last_name'),
+    ).values('id', 'date_added', 'grand_total', 'status', 'items', 'customer_id', 'customer_name',
+             'user__username')[:limit + 1])
+
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    status_display = dict(Sale.SALE_STATUS_CHOICES)
+    data = [{
+        'id': row['id'],
+        'date_added': row['date_added'].isoformat(),
+        'date_display': timezone.localtime(row['date_added']).strftime('%Y-%m-%d %H:%M'),
+        'customer_id': row['customer_id'],
+        'customer_name': row['customer_name'],
+        'cashier': row['user__username'],
+        'grand_total': str(row['grand_total']),
+        'items': row['items'],
+        'status': row['status'],
+        'status_display': str(status_display.get(row['status'], row['status'])),
+    } for row in rows]
+
+    return JsonResponse({
+        'sales': data,
+        'has_next': has_next,
+        'next_cursor': f"{rows[-1]['date_added'].isoformat()}_{rows[-1]['id']}" if has_next else None,
+    })
+
+
 @role_required(allowed_roles=['admin', 'cashier'])
 @login_required(login_url="/accounts/login/")
 def sales_details_view(request, sale_id):
@@ -59,50 +139,127 @@ def sales_details_view(request, sale_id):
 @role_required(allowed_roles=['admin', 'cashier'])
 @login_required(login_url="/accounts/login/")
 def receipt_pdf_view(request, sale_id):
-    sale = Sale.objects.get(id=sale_id)
-    details = SaleDetail.objects.filter(sale=sale)
-    template = get_template("sales/sales_receipt_pdf.html")
+    try:
+        path = receipts.get_receipt(sale_id)
+    except Sale.DoesNotExist:
+        raise Http404
+    return FileResponse(open(path, 'rb'), content_type="application/pdf")
+
+
+@role_required(allowed_roles=['admin', 'cashier'])
+@login_required(login_url="/accounts/login/")
+def receipt_escpos_view(request, sale_id):
+    """
+    The receipt for a thermal printer: raw ESC/POS bytes, or the plain-text
+    layout with ?format=text. ?printer= picks a RECEIPT_PRINTERS profile.
+    """
+    try:
+        sale = Sale.objects.select_related('customer', 'user', 'exchange_rate').get(id=sale_id)
+        profile = escpos.printer_profile(request.GET.get('printer', 'default'))
+    except Sale.DoesNotExist:
+        raise Http404
+    except escpos.UnknownPrinter as e:
+        return HttpResponseBadRequest(_('Unknown printer: %s') % e)
+    if request.GET.get('format') == 'text':
+        return HttpResponse(escpos.render_text(sale, profile), content_type="text/plain; charset=utf-8")
+    response = HttpResponse(escpos.render_escpos(sale, profile), content_type="application/octet-stream")
+    response['Content-Disposition'] = f'attachment; filename="receipt-{sale.id}.bin"'
+    return response
+
+
+@login_required(login_url="/accounts/login/")
+def daily_cash_close_report_view(request):
+    try:
+        day = date.fromisoformat(request.GET['date']) if request.GET.get('date') else timezone.localdate()
+    except ValueError:
+        day = timezone.localdate()
+    start, end = cash_close.day_bounds(day)
+    sales_today = (Sale.objects.filter(date_added__gte=start, date_added__lt=end)
+                   .select_related('customer').annotate(items=items_count()).order_by('date_added'))
+    # A closed day shows its frozen totals
+    snapshot = CashClose.objects.filter(day=day, cashier__isnull=True).select_related('closed_by').first()
+
     context = {
-        "sale": sale,
-        "details": details
+        'today': day,
+        'cash_close': snapshot or cash_close.compute_cash_close(day),
+        'snapshot': snapshot,
+        'shift_closes': CashClose.objects.filter(day=day, cashier__isnull=False).select_related('cashier'),
+        'cashiers': User.objects.filter(is_active=True).order_by('username'),
+        'sales_today': sales_today,
+        'active_icon': 'sales'
     }
-    html_template = template.render(context)
-    css_url = os.path.join(settings.BASE_DIR, 'sales/static/css/receipt_pdf/bootstrap.min.css')
-    pdf = HTML(string=html_template).write_pdf(stylesheets=[CSS(css_url)])
-    return HttpResponse(pdf, content_type="application/pdf")
+    return render(request, "sales/daily_cash_close_report.html", context)
 
 
+@role_required(allowed_roles=['admin', 'cashier'])
 @login_required(login_url="/accounts/login/")
-def daily_cash_close_report_view(request):
-    today = date.today()
-    start_of_day = datetime.combine(today, time.min)
-    end_of_day = datetime.combine(today, time.max)
+@require_POST
+def close_cash_view(request):
+    """
+    Freeze the cash close of a day, or of one cashier's shift. Cashiers can
+    only close their own shift.
+    """
+    try:
+        day = date.fromisoformat(request.POST.get('date', ''))
+    except ValueError:
+        messages.error(request, _('Invalid date.'), extra_tags='danger')
+        return redirect('sales:daily_cash_close_report')
+    redirect_url = f"{reverse('sales:daily_cash_close_report')}?date={day.isoformat()}"
+    if day > timezone.localdate():
+        messages.error(request, _('A future day cannot be closed.'), extra_tags='danger')
+        return redirect(redirect_url)
+
+    cashier = None
+    if request.POST.get('cashier'):
+        cashier = User.objects.filter(id=request.POST['cashier']).first()
+        if cashier is None:
+            messages.error(request, _('Cashier not found.'), extra_tags='danger')
+            return redirect(redirect_url)
+    is_admin = request.user.is_superuser or request.user.profile.role == 'admin'
+    if not is_admin and cashier != request.user:
+        messages.error(request, _('You can only close your own shift.'), extra_tags='danger')
+        return redirect(redirect_url)
 
-    sales_today = Sale.objects.filter(date_added__range=(start_of_day, end_of_day), status='completed')
+    try:
+        cash_close.close_day(day, cashier=cashier, closed_by=request.user)
+    except cash_close.AlreadyClosed:
+        messages.error(request, _('This cash close was already done.'), extra_tags='danger')
+    else:
+        messages.success(request, _('Cash close saved.'), extra_tags='success')
+    return redirect(redirect_url)
 
-    total_sales_usd = sales_today.aggregate(Sum('grand_total'))['grand_total__sum'] or 0
-    total_sales_ves = sales_today.aggregate(Sum('total_ves'))['total_ves__sum'] or 0
-    
-    sales_by_payment_method = sales_today.values('payment_method__name').annotate(total=Sum('grand_total')).order_by('payment_method__name')
 
-    credit_sales = sales_today.filter(is_credit=True)
-    total_credit_sales = credit_sales.aggregate(Sum('grand_total'))['grand_total__sum'] or 0
+@role_required(allowed_roles=['admin', 'cashier'])
+@login_required(login_url="/accounts/login/")
+def cash_close_history_view(request):
+    """
+    Closed days and shifts in a date range, with their totals per week or
+    month. Reads only CashClose snapshots.
+    """
+    closes = CashClose.objects.all()
+    try:
+        if request.GET.get('start'):
+            closes = closes.filter(day__gte=date.fromisoformat(request.GET['start']))
+        if request.GET.get('end'):
+            closes = closes.filter(day__lte=date.fromisoformat(request.GET['end']))
+    except ValueError:
+        messages.error(request, _('Invalid date.'), extra_tags='danger')
+    period = request.GET.get('period') if request.GET.get('period') in cash_close.PERIODS else 'month'
 
     context = {
-        'today': today,
-        'total_sales_usd': total_sales_usd,
-        'total_sales_ves': total_sales_ves,
-        'sales_by_payment_method': sales_by_payment_method,
-        'total_credit_sales': total_credit_sales,
-        'sales_today': sales_today,
+        'closes': closes.select_related('cashier', 'closed_by').order_by('-day', 'cashier__username')[:200],
+        'summary': cash_close.summarize(closes, period),
+        'period': period,
         'active_icon': 'sales'
     }
-    return render(request, "sales/daily_cash_close_report.html", context)
+    return render(request, "sales/cash_close_history.html", context)
+
 
 @role_required(allowed_roles=['admin', 'cashier'])
 @login_required(login_url="/accounts/login/")
 def pending_sales_list_view(request):
-    pending_sales = Sale.objects.filter(is_credit=True, grand_total__gt=F('amount_paid')).order_by('-date_added')
+    pending_sales = (Sale.objects.filter(is_credit=True, grand_total__gt=F('amount_paid'))
+                     .select_related('customer').annotate(items=items_count()).order_by('-date_added'))
     context = {
         "active_icon": "sales",
         "pending_sales": pending_sales
@@ -134,8 +291,9 @@ def pay_credit_sale_view(request, sale_id):
             with transaction.atomic():
                 total_paid_in_usd = Decimal(0)
                 total_igtf = Decimal(0)
+                rollup_deltas = {}
                 
-                igtf_percentage = Company.objects.first().igtf_percentage
+                igtf_percentage = company_settings.get_igtf_percentage()
 
                 for payment_data in payments:
                     amount = Decimal(payment_data['amount'])
@@ -163,7 +321,7 @@ def pay_credit_sale_view(request, sale_id):
                     
                     total_paid_in_usd += amount_usd
 
-                    CreditPayment.objects.create(
+                    credit_payment = CreditPayment.objects.create(
                         sale=sale,
                         amount_usd=amount_usd,
                         amount_ves=amount_ves,
@@ -173,6 +331,9 @@ def pay_credit_sale_view(request, sale_id):
                         reference=payment_data.get('reference', ''),
                         payment_date=payment_data.get('payment_date')
                     )
+                    # payment_date arrives as a string from the form
+                    payment_date = CreditPayment._meta.get_field('payment_date').to_python(credit_payment.payment_date)
+                    rollups.credit_payment_deltas(payment_date, amount_usd, igtf_for_payment, deltas=rollup_deltas)
 
                 # Update Sale object
                 sale.amount_paid += total_paid_in_usd
@@ -194,6 +355,8 @@ def pay_credit_sale_view(request, sale_id):
                     customer.outstanding_balance = 0
                 customer.save()
 
+                rollups.apply_deltas(rollup_deltas)
+
             messages.success(request, _('Payment of ${amount} (+ ${igtf} IGTF) registered successfully!').format(
                 amount=f'{total_paid_in_usd:.2f}',
                 igtf=f'{total_igtf:.2f}'
@@ -207,10 +370,9 @@ def pay_credit_sale_view(request, sale_id):
     payment_methods = PaymentMethod.objects.all()
     credit_payments = CreditPayment.objects.filter(sale=sale).order_by('-payment_date')
     
-    company = Company.objects.first()
-    igtf_percentage = company.igtf_percentage if company else 0
+    igtf_percentage = company_settings.get_igtf_percentage()
     
-    latest_rate = ExchangeRate.objects.latest('date')
+    latest_rate = rates.get_latest_rate()
     exchange_rate = latest_rate.rate_usd_ves if latest_rate else 0
 
     context = {